@@ -79,11 +79,13 @@ class ApiClient {
     }
 
     // Get trend data for charts
-    async getTrends(pincode?: string, days: number = 7) {
+    // maxPoints caps the series length; the server downsamples longer ranges
+    async getTrends(pincode?: string, days: number = 7, maxPoints: number = 500) {
         try {
             const params = new URLSearchParams();
             if (pincode) params.append('pincode', pincode);
             params.append('days', days.toString());
+            params.append('max_points', maxPoints.toString());
 
             const response = await this.client.get(`/api/trends?${params.toString()}`);
             return response.data;
@@ -94,9 +96,10 @@ class ApiClient {
     }
 
     // Get heatmap data for alerts
-    async getHeatmap() {
+    // level: 'pincode' | 'district' | 'state' (districts/states come with per-capita rates)
+    async getHeatmap(level: string = 'pincode') {
         try {
-            const response = await this.client.get('/api/heatmap');
+            const response = await this.client.get(`/api/heatmap?level=${level}`);
             return response.data;
         } catch (error) {
             console.error('Failed to fetch heatmap:', error);
@@ -117,5 +117,24 @@ def check_and_generate_data():
     else:
         logger.info("Found census_data.csv")
 
+    # 5. Generate Pincode Directory (pincode -> district -> state, districts as in census_data.csv)
+    if not (RAW_DIR / "pincode_directory.csv").exists():
+        logger.info("Generating pincode_directory.csv...")
+        offices = [
+            (400001, 'Mumbai GPO', 'Mumbai City'), (400002, 'Kalbadevi', 'Mumbai City'),
+            (400003, 'Masjid', 'Mumbai City'), (400004, 'Girgaon', 'Mumbai City'),
+            (400005, 'Colaba', 'Mumbai City'), (400008, 'Mumbai Central', 'Mumbai City'),
+            (400050, 'Bandra West', 'Mumbai Suburban'), (400053, 'Andheri West', 'Mumbai Suburban'),
+            (400069, 'Andheri East', 'Mumbai Suburban'), (400070, 'Kurla', 'Mumbai Suburban'),
+            (400080, 'Mulund West', 'Mumbai Suburban'), (400601, 'Thane West', 'Thane'),
+            (400603, 'Thane East', 'Thane'), (400614, 'CBD Belapur', 'Thane'),
+            (421201, 'Dombivli', 'Thane'),
+        ]
+        directory = [{'pincode': p, 'office': o, 'district': d, 'state': 'Maharashtra'} for p, o, d in offices]
+        pd.DataFrame(directory).to_csv(RAW_DIR / "pincode_directory.csv", index=False)
+        logger.info("Generated pincode_directory.csv")
+    else:
+        logger.info("Found pincode_directory.csv")
+
 if __name__ == "__main__":
     check_and_generate_data()
@@ -1,13 +1,20 @@
 """
 Data Cleaning Pipeline
 Loads raw datasets, handles missing values, standardizes formats, and filters data.
+
+Each dataset is a data_quality.Stage: its rules are declared below and checked
+over streamed chunks. Rows that fail are written to datasets/quarantine/<stage>.csv
+with the rules they broke, and per-rule counts/timings to quality_report.json.
 """
 
-import pandas as pd
-import numpy as np
+import sys
 from pathlib import Path
 import logging
 
+from data_quality import (Stage, Required, Typed, InRange, Member, Unique, MaxNullRate,
+                          DataQualityError, write_report)
+from regions import RegionIndex
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -23,80 +30,109 @@ BASE_DIR = Path(__file__).parent.parent
 RAW_DIR = BASE_DIR / "datasets" / "raw"
 PROCESSED_DIR = BASE_DIR / "datasets" / "processed"
 
-def clean_pharmacy_sales():
-    logger.info("Cleaning pharmacy_sales.csv...")
-    try:
-        df = pd.read_csv(RAW_DIR / "pharmacy_sales.csv")
-        logger.info(f"Loaded {len(df)} rows")
+SYMPTOM_KEYWORDS = ['fever', 'cough', 'cold', 'pain', 'paracetamol', 'azithromycin', 'cetirizine', 'dolo']
+
+def standardize_columns(df):
+    df.columns = [c.lower().strip().replace(' ', '_') for c in df.columns]
+    return df
+
+def tag_symptomatic(df):
+    # Search in name and composition
+    pattern = '|'.join(SYMPTOM_KEYWORDS)
+    return df.assign(is_symptomatic=df['name'].str.lower().str.contains(pattern, na=False) |
+                                    df['composition'].str.lower().str.contains(pattern, na=False))
 
-        # Standardize columns
-        df.columns = [c.lower().replace(' ', '_') for c in df.columns]
-        
-        # Date parsing
-        date_col = 'date' if 'date' in df.columns else 'date_time' # Adjust based on actual col
-        if date_col in df.columns:
-            df['date'] = pd.to_datetime(df[date_col], errors='coerce')
-        
-        # Filter 2022-2024
-        df = df[df['date'].dt.year.isin([2022, 2023, 2024])]
-        
-        # Remove duplicates
-        df.drop_duplicates(inplace=True)
-        
-        # Handle invalid quantities
-        if 'quantity' in df.columns:
-            df = df[df['quantity'] > 0]
-            
-        output_path = PROCESSED_DIR / "cleaned_sales.csv"
-        df.to_csv(output_path, index=False)
-        logger.info(f"Saved {len(df)} rows to {output_path}")
-        return df
-    except Exception as e:
-        logger.error(f"Error cleaning pharmacy sales: {e}")
-        return None
+def known_pincodes():
+    return RegionIndex.load().pincode_district.keys()
 
-def clean_medicines():
-    logger.info("Cleaning indian_medicines.csv...")
-    try:
-        df = pd.read_csv(RAW_DIR / "indian_medicines.csv")
-        df.columns = [c.lower().strip().replace(' ', '_') for c in df.columns]
-        
-        # Tag symptomatic
-        keywords = ['fever', 'cough', 'cold', 'pain', 'paracetamol', 'azithromycin', 'cetirizine', 'dolo']
-        pattern = '|'.join(keywords)
-        
-        # Search in name and composition
-        df['is_symptomatic'] = df['name'].str.lower().str.contains(pattern, na=False) | \
-                               df['composition'].str.lower().str.contains(pattern, na=False)
-        
-        output_path = PROCESSED_DIR / "symptomatic_medicines.csv"
-        df.to_csv(output_path, index=False)
-        logger.info(f"Tagged {df['is_symptomatic'].sum()} symptomatic medicines")
-        return df
-    except Exception as e:
-        logger.error(f"Error cleaning medicines: {e}")
-        return None
+STAGES = [
+    Stage(
+        "pharmacy_sales", RAW_DIR / "pharmacy_sales.csv", PROCESSED_DIR / "cleaned_sales.csv",
+        columns=['date', 'product', 'boxes_shipped'],
+        prepare=standardize_columns,
+        rules=[
+            Required('date', 'product'),
+            Typed('date', 'datetime'),
+            InRange('date', '2022-01-01', '2024-12-31 23:59:59'),
+            Typed('boxes_shipped', 'numeric'),
+            InRange('boxes_shipped', lo=1),
+            Unique(),
+        ],
+        dataset_rules=[MaxNullRate('product', 0.01)],
+    ),
+    Stage(
+        "indian_medicines", RAW_DIR / "indian_medicines.csv", PROCESSED_DIR / "symptomatic_medicines.csv",
+        columns=['name', 'composition'],
+        prepare=standardize_columns,
+        rules=[
+            Required('name'),
+            Typed('mrp', 'numeric'),
+            InRange('mrp', lo=0),
+        ],
+        dataset_rules=[MaxNullRate('composition', 0.05)],
+        transform=tag_symptomatic,
+    ),
+    Stage(
+        "weather_data", RAW_DIR / "weather_data.csv", PROCESSED_DIR / "cleaned_weather.csv",
+        columns=['date', 'pincode', 'temperature', 'humidity', 'rainfall'],
+        rules=[
+            Required('date', 'pincode', 'temperature'),
+            Typed('date', 'datetime', fmt='%Y-%m-%d'),
+            # Numeric first: one stray text cell would otherwise leave the column as strings
+            Typed('pincode', 'numeric'),
+            Typed('temperature', 'numeric'),
+            Typed('humidity', 'numeric'),
+            Typed('rainfall', 'numeric'),
+            InRange('temperature', 15, 45),
+            InRange('humidity', 0, 100),
+            InRange('rainfall', lo=0),
+            Member('pincode', known_pincodes, 'pincode_directory'),
+            Unique(['date', 'pincode']),
+        ],
+        dataset_rules=[MaxNullRate('humidity', 0.05)],
+    ),
+]
 
-def clean_weather():
-    logger.info("Cleaning weather_data.csv...")
-    try:
-        df = pd.read_csv(RAW_DIR / "weather_data.csv")
-        df['date'] = pd.to_datetime(df['date'])
-        
-        # Temp validation
-        df = df[(df['temperature'] >= 15) & (df['temperature'] <= 45)]
-        
-        PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-        df.to_csv(PROCESSED_DIR / "cleaned_weather.csv", index=False)
-        logger.info("Saved cleaned weather data")
-    except Exception as e:
-        logger.error(f"Error cleaning weather: {e}")
+def log_report(report):
+    logger.info(f"{report['stage']}: {report['rows']} rows, {report['kept']} kept, "
+                f"{report['quarantined']} quarantined (parse {report['parse_seconds']:.3f}s, "
+                f"rules {report['rule_seconds']:.3f}s)")
+    for name, result in report['rules'].items():
+        if result['failed']:
+            logger.warning(f"  {name}: {result['failed']} rows")
+    for name, result in report['dataset_rules'].items():
+        if not result['passed']:
+            logger.error(f"  {name}: observed {result['observed']}")
 
 def main():
     PROCESSED_DIR.mkdir(parents=True, exist_ok=True)
-    clean_pharmacy_sales()
-    clean_medicines()
-    clean_weather()
+    reports, failed = [], []
+    for stage in STAGES:
+        logger.info(f"Cleaning {stage.source.name}...")
+        try:
+            report = stage.run()
+        except (DataQualityError, FileNotFoundError) as e:
+            # The previous output stays in place for downstream steps
+            logger.error(f"Stage {stage.name} failed, keeping previous {stage.output.name}: {e}")
+            failed.append(stage.name)
+            reports.append({'stage': stage.name, 'error': str(e)})
+            continue
+        except Exception as e:
+            # A bug in one stage's rules shouldn't stop the others
+            logger.exception(f"Stage {stage.name} crashed, keeping previous {stage.output.name}: {e}")
+            failed.append(stage.name)
+            reports.append({'stage': stage.name, 'error': f"{type(e).__name__}: {e}"})
+            continue
+        log_report(report)
+        reports.append(report)
+        if not report['passed']:
+            logger.error(f"Stage {stage.name} kept {report['kept']} rows or failed a dataset rule; "
+                         f"keeping previous {stage.output.name}")
+            failed.append(stage.name)
+    write_report(reports)
+    if failed:
+        logger.error(f"Data cleaning finished with failed stages: {failed}")
+        sys.exit(1)
     logger.info("Data cleaning complete.")
 
 if __name__ == "__main__":
@@ -8,6 +8,9 @@ import numpy as np
 from pathlib import Path
 import logging
 
+from codebook import load_codebooks, save_codebooks
+from weather_lookup import WeatherLookup, METRICS as WEATHER_METRICS
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 logger = logging.getLogger(__name__)
 
@@ -42,23 +45,28 @@ def create_features():
     if 'pincode' not in sales.columns:
         sales['pincode'] = np.random.choice(['400001', '400002', '400003'], len(sales))
     
-    daily_sales = sales.groupby(['date', 'pincode']).size().reset_index(name='transaction_count')
+    # Pincodes travel as dense int32 codes from here on
+    books = load_codebooks()
+    sales['pincode_id'] = books['pincode'].encode(sales['pincode'], add=True)
+    daily_sales = sales.groupby(['date', 'pincode_id']).size().reset_index(name='transaction_count')
     
     # Rolling 30-day baseline
-    daily_sales['baseline_30d'] = daily_sales.groupby('pincode')['transaction_count'].transform(
+    daily_sales['baseline_30d'] = daily_sales.groupby('pincode_id')['transaction_count'].transform(
         lambda x: x.rolling(window=30, min_periods=1).mean()
     )
     
     # 3. Anomaly Indicators
     daily_sales['purchase_spike'] = (daily_sales['transaction_count'] > 2 * daily_sales['baseline_30d']).astype(int)
     
-    # 4. Merge Weather
-    weather['date'] = pd.to_datetime(weather['date'])
-    # Ensure pincode type match
-    weather['pincode'] = weather['pincode'].astype(str)
-    daily_sales['pincode'] = daily_sales['pincode'].astype(str)
+    # 4. Weather, as of each sales day
+    # Days dropped by cleaning carry the last observation forward instead of becoming NaN -> 0°C
+    weather['pincode_id'] = books['pincode'].encode(weather.pop('pincode'), add=True)
+    save_codebooks(books)
+    lookup = WeatherLookup.build(weather)
+    lookup.save()
     
-    final_df = pd.merge(daily_sales, weather, on=['date', 'pincode'], how='left')
+    final_df = daily_sales.copy()
+    final_df[WEATHER_METRICS] = lookup.lookup(final_df['pincode_id'], final_df['date'])
     
     # Save
     final_df.to_csv(FINAL_DIR / "training_data.csv", index=False)
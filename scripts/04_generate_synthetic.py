@@ -10,6 +10,9 @@ from datetime import datetime, timedelta
 from pathlib import Path
 import logging
 
+from codebook import load_codebooks, save_codebooks, encode_columns
+from synthetic_scenario import PINCODES, OUTBREAK_PINCODE, OUTBREAK_DAYS
+
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -23,7 +26,7 @@ def generate_synthetic_data():
     logger.info("Generating normal transactions...")
     # 1. Normal Transactions
     dates = pd.date_range(end=datetime.now(), periods=90)
-    pincodes = ['400001', '400002', '400003']
+    pincodes = PINCODES
     symptoms = ['fever', 'cough', 'cold', 'pain', 'vitamin']
     
     data = []
@@ -45,8 +48,8 @@ def generate_synthetic_data():
         
     # 2. Outbreak Transactions
     logger.info("Injecting outbreak patterns...")
-    outbreak_pincode = '400001'
-    outbreak_days = dates[-5:] # Last 5 days
+    outbreak_pincode = OUTBREAK_PINCODE
+    outbreak_days = dates[-OUTBREAK_DAYS:] # Last 5 days
     
     for day in outbreak_days:
         # Spike of 100 transactions per day
@@ -64,6 +67,12 @@ def generate_synthetic_data():
             })
             
     df = pd.DataFrame(data)
+    
+    # Store pincode / medicine / category as int32 codes
+    books = load_codebooks()
+    df = encode_columns(df, books, add=True)
+    save_codebooks(books)
+    
     df.to_csv(PROCESSED_DIR / "synthetic_transactions.csv", index=False)
     logger.info(f"Generated {len(df)} transactions. Outbreak injected in {outbreak_pincode}")
 
@@ -1,51 +1,316 @@
 """
 Database Upload Script
 Uploads processed data to Supabase.
+
+Rows are streamed from disk in chunks and posted to the Supabase REST
+(PostgREST) endpoint with up to UPLOAD_IN_FLIGHT batches in flight over one
+pooled HTTP/1.1 connection pool. Batches are upserted on transaction_id, so a
+retried or replayed batch never duplicates rows, and a checkpoint of the
+contiguous committed prefix lets an interrupted upload resume where it stopped.
+The checkpoint records the source file's size, mtime and leading bytes; if
+the CSV has been regenerated since, it is discarded and the upload starts over.
+
+    python scripts/05_upload_to_db.py              # upload synthetic_transactions.csv
+    python scripts/05_upload_to_db.py --benchmark  # async vs sequential on a local stand-in server
 """
 
 import os
+import asyncio
+import hashlib
+import json
+import random
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Optional
 import pandas as pd
+import httpx
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from pathlib import Path
-from supabase import create_client, Client
 from dotenv import load_dotenv
 import logging
 
+from codebook import load_codebooks, decode_columns
+
 load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 BASE_DIR = Path(__file__).parent.parent
 PROCESSED_DIR = BASE_DIR / "datasets" / "processed"
+CHECKPOINT_DIR = PROCESSED_DIR / ".upload_checkpoints"
 
 # Placeholder credentials - User needs to fill .env
 SUPABASE_URL = os.getenv("SUPABASE_URL", "https://your-project.supabase.co")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY", "your-anon-key")
 
+BATCH_SIZE = int(os.getenv("UPLOAD_BATCH_SIZE", 1000))
+IN_FLIGHT = int(os.getenv("UPLOAD_IN_FLIGHT", 4))
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.5  # seconds, doubled per attempt
+RETRY_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+FINGERPRINT_BYTES = 1 << 20  # leading bytes hashed into the source fingerprint
+
+def source_fingerprint(path: Path) -> dict:
+    """Cheap identity of a source file: a regenerated CSV changes at least one of these"""
+    stat = path.stat()
+    with open(path, 'rb') as f:
+        head = hashlib.sha1(f.read(FINGERPRINT_BYTES)).hexdigest()
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'head_sha1': head}
+
+class Checkpoint:
+    """
+    Persists how many leading rows of a file are committed; batches may finish out of order.
+    A checkpoint written for a different version of the source file is ignored.
+    """
+
+    def __init__(self, path: Path, source: Optional[Path] = None):
+        self.path = path
+        self.rows_done = 0
+        self.fingerprint = source_fingerprint(source) if source is not None else None
+        if path.exists():
+            saved = json.loads(path.read_text())
+            if saved.get('source') == self.fingerprint:
+                self.rows_done = saved.get('rows_done', 0)
+            else:
+                logger.warning(f"{source.name if source else path.name} changed since the last "
+                               f"checkpoint; starting over from row 0")
+        self._pending = {}  # first row of a finished batch -> its row count
+
+    def commit(self, first_row: int, n_rows: int):
+        self._pending[first_row] = n_rows
+        advanced = False
+        while self.rows_done in self._pending:
+            self.rows_done += self._pending.pop(self.rows_done)
+            advanced = True
+        if advanced:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps({'rows_done': self.rows_done, 'source': self.fingerprint}))
+            os.replace(tmp, self.path)
+
+    def clear(self):
+        self.path.unlink(missing_ok=True)
+
+def rest_headers(api_key: str) -> dict:
+    return {
+        'apikey': api_key,
+        'Authorization': f"Bearer {api_key}",
+        'Content-Type': "application/json",
+        # Upsert on the conflict column so replays are idempotent
+        'Prefer': "resolution=merge-duplicates,return=minimal",
+    }
+
+def retry_after_seconds(value: Optional[str]) -> Optional[float]:
+    """Retry-After as delay-seconds or an HTTP-date; None if absent or unparseable"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+async def post_with_retry(client: httpx.AsyncClient, url: str, body: str, params: dict):
+    """POST one batch, retrying transient failures with exponential backoff and jitter"""
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            response = await client.post(url, content=body, params=params)
+            if response.status_code < 300:
+                return
+            if response.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+                response.raise_for_status()
+            delay = retry_after_seconds(response.headers.get('Retry-After'))
+            if delay is None:
+                delay = BACKOFF_BASE * 2 ** attempt
+        except httpx.TransportError:
+            if attempt == MAX_RETRIES:
+                raise
+            delay = BACKOFF_BASE * 2 ** attempt
+        await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+async def upload_async(csv_path: Path, table: str, base_url: str, api_key: str,
+                       batch_size: int = BATCH_SIZE, in_flight: int = IN_FLIGHT,
+                       conflict_column: str = 'transaction_id', resume: bool = True,
+                       checkpoint_dir: Optional[Path] = None) -> dict:
+    """Stream csv_path into table, keeping in_flight batches outstanding"""
+    checkpoint = Checkpoint((checkpoint_dir or CHECKPOINT_DIR) / f"{table}__{csv_path.stem}.json", csv_path)
+    if not resume:
+        checkpoint.clear()
+        checkpoint = Checkpoint(checkpoint.path, csv_path)
+    start_row = checkpoint.rows_done
+    if start_row:
+        logger.info(f"Resuming {csv_path.name} at row {start_row:,}")
+
+    reader = pd.read_csv(csv_path, chunksize=batch_size, skiprows=range(1, start_row + 1))
+    books = load_codebooks()
+    url = f"/rest/v1/{table}"
+    params = {'on_conflict': conflict_column}
+    limits = httpx.Limits(max_connections=in_flight, max_keepalive_connections=in_flight)
+
+    slots = asyncio.Semaphore(in_flight)
+    errors = []
+    pending = set()
+    uploaded = 0
+    started = time.perf_counter()
+
+    async def send(first_row: int, body: str, n_rows: int):
+        nonlocal uploaded
+        try:
+            await post_with_retry(client, url, body, params)
+            checkpoint.commit(first_row, n_rows)
+            uploaded += n_rows
+        except Exception as e:
+            errors.append(e)
+        finally:
+            slots.release()
+
+    async with httpx.AsyncClient(base_url=base_url, headers=rest_headers(api_key),
+                                 limits=limits, timeout=30.0) as client:
+        row = start_row
+        while not errors:
+            # Parse the next chunk off the event loop so it overlaps with in-flight posts
+            chunk = await asyncio.to_thread(next, reader, None)
+            if chunk is None:
+                break
+            # The database keeps the readable names; codes are a pipeline-internal encoding
+            body = decode_columns(chunk, books).to_json(orient='records', date_format='iso')
+            await slots.acquire()
+            if errors:
+                slots.release()
+                break
+            task = asyncio.create_task(send(row, body, len(chunk)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+            row += len(chunk)
+        await asyncio.gather(*pending)
+
+    if errors:
+        logger.error(f"Upload stopped at row {checkpoint.rows_done:,}; rerun to resume")
+        raise errors[0]
+
+    checkpoint.clear()
+    elapsed = time.perf_counter() - started
+    return {'rows': uploaded, 'seconds': elapsed, 'rows_per_sec': uploaded / elapsed if elapsed else 0.0}
+
+def upload_sequential(csv_path: Path, table: str, base_url: str, api_key: str,
+                      batch_size: int = BATCH_SIZE) -> dict:
+    """One batch at a time over one client (the original loop); kept as the benchmark baseline"""
+    df = decode_columns(pd.read_csv(csv_path), load_codebooks())
+    started = time.perf_counter()
+    with httpx.Client(base_url=base_url, headers=rest_headers(api_key), timeout=30.0) as client:
+        for i in range(0, len(df), batch_size):
+            batch = df.iloc[i:i + batch_size].to_dict('records')
+            client.post(f"/rest/v1/{table}", json=batch,
+                        params={'on_conflict': 'transaction_id'}).raise_for_status()
+    elapsed = time.perf_counter() - started
+    return {'rows': len(df), 'seconds': elapsed, 'rows_per_sec': len(df) / elapsed if elapsed else 0.0}
+
 def upload_to_supabase():
     try:
-        supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        
-        # Load data
-        df = pd.read_csv(PROCESSED_DIR / "synthetic_transactions.csv")
-        
-        # Upload in batches
-        batch_size = 1000
-        total = len(df)
-        
-        logger.info(f"Uploading {total} rows to 'transactions' table...")
-        
-        # Note: Table must exist. Assuming 'transactions' table schema.
+        csv_path = PROCESSED_DIR / "synthetic_transactions.csv"
+
         # This is a demonstration. Real upload requires valid credentials.
-        
-        # for i in range(0, total, batch_size):
-        #     batch = df.iloc[i:i+batch_size].to_dict('records')
-        #     supabase.table('transactions').insert(batch).execute()
-        #     logger.info(f"Uploaded batch {i//batch_size + 1}")
-            
-        logger.info("Upload logic ready. Uncomment execute lines with valid credentials.")
-        
+        if "your-project" in SUPABASE_URL:
+            logger.info("Upload logic ready. Set SUPABASE_URL / SUPABASE_KEY in .env to upload.")
+            return
+
+        # Note: Table must exist. Assuming 'transactions' table schema with a
+        # unique constraint on transaction_id.
+        logger.info(f"Uploading {csv_path.name} to 'transactions' table...")
+        stats = asyncio.run(upload_async(csv_path, 'transactions', SUPABASE_URL, SUPABASE_KEY))
+        logger.info(f"✓ Uploaded {stats['rows']:,} rows in {stats['seconds']:.1f}s "
+                    f"({stats['rows_per_sec']:,.0f} rows/s)")
+
     except Exception as e:
         logger.error(f"Upload failed: {e}")
 
+class StandInRestServer:
+    """
+    Minimal local PostgREST stand-in for exercising the uploader: upserts on
+    on_conflict, adds fixed latency per request and fails a share of them with 503.
+    """
+
+    def __init__(self, latency: float = 0.02, fail_rate: float = 0.0):
+        self.rows = {}
+        self.requests = 0
+        self.failures = 0
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                time.sleep(latency)
+                with lock:
+                    server.requests += 1
+                    fail = random.random() < fail_rate
+                    if fail:
+                        server.failures += 1
+                if fail:
+                    self.send_response(503)
+                    # Both Retry-After forms: delay-seconds and an (already passed) HTTP-date
+                    self.send_header('Retry-After', "0.05" if server.failures % 2 else
+                                     "Wed, 21 Oct 2015 07:28:00 GMT")
+                else:
+                    key = self.path.split('on_conflict=')[-1] if 'on_conflict=' in self.path else None
+                    batch = json.loads(body)
+                    with lock:
+                        for i, r in enumerate(batch):
+                            server.rows[r[key] if key else (server.requests, i)] = r
+                    self.send_response(201)
+                self.send_header('Content-Length', "0")
+                self.end_headers()
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}"
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+def benchmark(csv_path: Path = PROCESSED_DIR / "synthetic_transactions.csv"):
+    """Time sequential and pipelined uploads against the stand-in (behaviour is covered in tests/test_uploader.py)"""
+    batch_size = 500
+
+    with StandInRestServer() as server:
+        seq = upload_sequential(csv_path, 'transactions', server.url, "test", batch_size=batch_size)
+    logger.info(f"sequential        : {seq['rows_per_sec']:>9,.0f} rows/s ({seq['seconds']:.2f}s)")
+
+    # Scratch checkpoints, so a benchmark never clears or fakes the progress of a real upload
+    with tempfile.TemporaryDirectory() as scratch:
+        for k in (2, 4, 8):
+            with StandInRestServer() as server:
+                stats = asyncio.run(upload_async(csv_path, 'transactions', server.url, "test",
+                                                 batch_size=batch_size, in_flight=k, resume=False,
+                                                 checkpoint_dir=Path(scratch)))
+            logger.info(f"async in_flight={k} : {stats['rows_per_sec']:>9,.0f} rows/s ({stats['seconds']:.2f}s) "
+                        f"x{stats['rows_per_sec'] / seq['rows_per_sec']:.1f}")
+
 if __name__ == "__main__":
-    upload_to_supabase()
+    import argparse
+    parser = argparse.ArgumentParser(description="Upload processed data to Supabase")
+    parser.add_argument("--benchmark", action="store_true",
+                        help="Compare async and sequential uploads against a local stand-in server")
+    if parser.parse_args().benchmark:
+        benchmark()
+    else:
+        upload_to_supabase()
@@ -7,14 +7,20 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from datetime import datetime, timedelta
+import hashlib
+import json
 import joblib
 import logging
+import os
 
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import classification_report, confusion_matrix
-from prophet import Prophet
+
+from model_registry import DETECTOR_FEATURES, CLASSIFIER_FEATURES
+from codebook import load_codebooks, save_codebooks, encode_columns
+from anomaly_store import AnomalyStore, anomaly_severity
 
 # Setup logging
 logging.basicConfig(
@@ -28,15 +34,94 @@ BASE_DIR = Path(__file__).parent.parent
 DATA_DIR = BASE_DIR / "datasets" / "final"
 MODEL_DIR = BASE_DIR / "models"
 MODEL_DIR.mkdir(exist_ok=True)
+CACHE_DIR = DATA_DIR / "cache"
+CACHE_KEEP = int(os.getenv("FEATURE_CACHE_KEEP", 4))  # Most recently used feature matrices kept on disk
+SWEEP_RESULTS = MODEL_DIR / "sweep_results.json"
+
+# Union of the detector and classifier inputs, in cache column order
+FEATURE_COLUMNS = list(dict.fromkeys(DETECTOR_FEATURES + CLASSIFIER_FEATURES))
+
+def data_hash(df: pd.DataFrame) -> str:
+    """Content hash of the columns the models read"""
+    cols = [c for c in FEATURE_COLUMNS + ['purchase_spike'] if c in df.columns]
+    digest = hashlib.sha1(','.join(cols).encode())
+    digest.update(pd.util.hash_pandas_object(df[cols], index=False).to_numpy().tobytes())
+    return digest.hexdigest()[:16]
+
+def _save_atomic(path: Path, arr: np.ndarray):
+    tmp = path.with_name(f".{path.name}")
+    with open(tmp, 'wb') as f:
+        np.save(f, arr)
+    os.replace(tmp, path)
+
+def prune_cache(cache_dir: Path, keep: int = CACHE_KEEP):
+    """Drop all but the `keep` most recently used feature/label pairs"""
+    entries = sorted(cache_dir.glob("features_*.npy"), key=lambda p: p.stat().st_mtime_ns, reverse=True)
+    for x_path in entries[keep:]:
+        key = x_path.stem.removeprefix("features_")
+        x_path.unlink(missing_ok=True)
+        (cache_dir / f"labels_{key}.npy").unlink(missing_ok=True)
+        logger.info(f"Evicted cached feature matrix {x_path.name}")
+
+def build_feature_matrix(df: pd.DataFrame, cache_dir: Path = CACHE_DIR, keep: int = CACHE_KEEP) -> tuple:
+    """
+    Select and fillna the model features once and cache them on disk, keyed by data hash.
+    Only the `keep` most recently used entries are kept, so retrains on new data don't
+    grow the cache without bound. Returns (features_path, labels_path); labels_path is
+    None when purchase_spike is absent.
+    """
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    key = data_hash(df)
+    x_path = cache_dir / f"features_{key}.npy"
+    y_path = cache_dir / f"labels_{key}.npy" if 'purchase_spike' in df.columns else None
+
+    if not x_path.exists():
+        _save_atomic(x_path, df[FEATURE_COLUMNS].fillna(0).to_numpy(dtype=np.float64))
+        logger.info(f"Cached feature matrix {x_path.name} ({len(df):,} rows)")
+    else:
+        x_path.touch()  # Mark as used for eviction
+    if y_path is not None and not y_path.exists():
+        _save_atomic(y_path, df['purchase_spike'].fillna(0).to_numpy(dtype=np.int8))
+    prune_cache(cache_dir, keep)
+    return x_path, y_path
+
+def load_feature_matrix(x_path: Path, y_path: Path = None) -> tuple:
+    """Memory-map a cached matrix; worker processes share the same page cache"""
+    X = np.load(x_path, mmap_mode='r')
+    y = np.load(y_path, mmap_mode='r') if y_path is not None else None
+    return X, y
+
+def feature_frame(X: np.ndarray, features: list) -> pd.DataFrame:
+    """Column subset of the cached matrix in the order a model expects"""
+    idx = [FEATURE_COLUMNS.index(f) for f in features]
+    return pd.DataFrame(X[:, idx], columns=features)
+
+def load_best_params() -> dict:
+    """Best configuration found by 09_sweep_hyperparameters.py, if it has been run and found one"""
+    if not SWEEP_RESULTS.exists():
+        return {}
+    results = json.loads(SWEEP_RESULTS.read_text())
+    params = {}
+    for name, r in results.items():
+        best = r.get('best')
+        # Older results files recorded a "best" even when every config scored 0
+        if not best or best.get('score', 0) <= 0:
+            logger.info(f"No sweep winner for {name} ({r.get('no_best_reason') or 'score 0'}); using defaults")
+            continue
+        logger.info(f"Applying sweep params for {name} from {SWEEP_RESULTS.name}: {best['params']} "
+                    f"(holdout F1 {best['score']:.3f})")
+        params[name] = best['params']
+    return params
 
 class OutbreakDetector:
     """Anomaly detection for outbreak identification"""
     
-    def __init__(self, contamination=0.05):
+    def __init__(self, contamination=0.05, n_estimators=100, max_samples='auto'):
         self.model = IsolationForest(
             contamination=contamination,
             random_state=42,
-            n_estimators=100
+            n_estimators=n_estimators,
+            max_samples=max_samples
         )
         self.scaler = StandardScaler()
         
@@ -44,10 +129,9 @@ class OutbreakDetector:
         """Train on normal purchase patterns"""
         logger.info("Training Isolation Forest for anomaly detection...")
         
-        # Select features
-        features = ['transaction_count', 'day_of_week', 'temperature', 'humidity', 'baseline_30d']
-        
-        X = df[features].fillna(0)
+        # Select features (shared with the classifier through the on-disk cache)
+        X_all, _ = load_feature_matrix(*build_feature_matrix(df))
+        X = feature_frame(X_all, DETECTOR_FEATURES)
         
         # Scale features
         X_scaled = self.scaler.fit_transform(X)
@@ -71,6 +155,19 @@ class OutbreakDetector:
             'anomaly_rate': anomaly_rate
         }
     
+    def anomaly_frame(self, df: pd.DataFrame, books: dict) -> pd.DataFrame:
+        """Rows flagged by train(), in the anomaly store's layout"""
+        flagged = df[df['is_anomaly'] == -1]
+        return pd.DataFrame({
+            'ts': flagged['date'].to_numpy(dtype='datetime64[s]').astype(np.int64),
+            'pincode': books['pincode'].decode(flagged['pincode_id'].to_numpy()).astype(np.int64),
+            'severity': [anomaly_severity(c, b) for c, b in
+                         zip(flagged['transaction_count'], flagged['baseline_30d'])],
+            'score': flagged['anomaly_score'].to_numpy(),
+            'transaction_count': flagged['transaction_count'].to_numpy(dtype=np.float64),
+            'baseline': flagged['baseline_30d'].to_numpy(dtype=np.float64),
+        })
+
     def save(self, path: Path):
         """Save model and scaler"""
         joblib.dump(self.model, path / "anomaly_detector.pkl")
@@ -84,20 +181,21 @@ class OutbreakPredictor:
         self.models = {}  # Store one model per pincode
         
     def train(self, df: pd.DataFrame, pincodes: list = None) -> dict:
-        """Train Prophet models for each pincode"""
+        """Train Prophet models for each pincode (pincodes are pincode_id codes)"""
+        # Imported here so the detector/classifier can be reused without prophet installed
+        from prophet import Prophet
+
         logger.info("Training Prophet models for time-series forecasting...")
         
         if pincodes is None:
-            if df['pincode'].dtype != 'O':
-                 df['pincode'] = df['pincode'].astype(str)
-            pincodes = df['pincode'].unique()[:5]  # Train on top 5 pincodes
+            pincodes = df['pincode_id'].unique()[:5]  # Train on top 5 pincodes
         
         results = {}
         
         for pincode in pincodes:
             logger.info(f"  Training model for pincode {pincode}...")
             
-            pincode_data = df[df['pincode'] == pincode].copy()
+            pincode_data = df[df['pincode_id'] == pincode].copy()
             if len(pincode_data) < 10:
                 logger.warning(f"  Skipping {pincode}: Not enough data")
                 continue
@@ -120,18 +218,20 @@ class OutbreakPredictor:
     
     def save(self, path: Path):
         """Save all models"""
+        pincode_book = load_codebooks()['pincode']
         for pincode, model in self.models.items():
-            model_path = path / f"prophet_{pincode}.pkl"
+            # Filenames carry the real pincode so they stay meaningful outside the pipeline
+            model_path = path / f"prophet_{pincode_book.value(int(pincode))}.pkl"
             joblib.dump(model, model_path)
         logger.info(f"✓ Saved {len(self.models)} Prophet models to {path}")
 
 class OutbreakClassifier:
     """Supervised classifier for severe vs warning vs normal"""
     
-    def __init__(self):
+    def __init__(self, n_estimators=100, max_depth=10):
         self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=10,
+            n_estimators=n_estimators,
+            max_depth=max_depth,
             random_state=42
         )
         self.scaler = StandardScaler()
@@ -152,9 +252,9 @@ class OutbreakClassifier:
                 return 1 # Anomaly/Outbreak
             return 0 # Normal
             
-        y = df['purchase_spike']
-        features = ['transaction_count', 'baseline_30d', 'day_of_week', 'temperature', 'humidity']
-        X = df[features].fillna(0)
+        y = df['purchase_spike'].reset_index(drop=True)
+        X_all, _ = load_feature_matrix(*build_feature_matrix(df))
+        X = feature_frame(X_all, CLASSIFIER_FEATURES)
         
         if len(y.unique()) < 2:
             logger.warning("Single class in targets. Creating synthetic heavy-outbreak class for demo training.")
@@ -188,23 +288,35 @@ def main():
         return
     
     df = pd.read_csv(data_path, parse_dates=['date'])
-    df['pincode'] = df['pincode'].astype(str)
+    books = load_codebooks()
+    df = encode_columns(df, books, add=True)
+    save_codebooks(books)
     
     # Feature Engineering on the fly
     df['day_of_week'] = df['date'].dt.dayofweek
     
+    # Hyperparameters from the last sweep, if any (see 09_sweep_hyperparameters.py)
+    best = load_best_params()
+    
     # 1. Anomaly Detector
-    detector = OutbreakDetector(contamination=0.05)
+    detector = OutbreakDetector(**best.get('detector', {'contamination': 0.05}))
     detector.train(df)
     detector.save(MODEL_DIR)
     
+    # Keep the scored anomalies for /api/anomalies, replacing the previous run's
+    flagged = detector.anomaly_frame(df, books)
+    store = AnomalyStore()
+    store.replace_source('train', flagged)
+    store.close()
+    logger.info(f"✓ Stored {len(flagged):,} scored anomalies in {store.path.name}")
+    
     # 2. Forecaster
     predictor = OutbreakPredictor()
     predictor.train(df)
     predictor.save(MODEL_DIR)
     
     # 3. Classifier
-    clf = OutbreakClassifier()
+    clf = OutbreakClassifier(**best.get('classifier', {}))
     clf.train(df)
     clf.save(MODEL_DIR)
     
@@ -0,0 +1,174 @@
+"""
+Parallel Hyperparameter Sweep
+Grid-searches the anomaly detector and severity classifier across cores.
+The feature matrix is built once, cached on disk and memory-mapped into each
+worker, so no process re-reads the CSV or re-selects columns.
+
+Both models are scored on the same held-out 20% split. The best configuration
+is written to models/sweep_results.json and picked up by 07_train_models.py on
+its next run, but only when it actually beats the rest: if every config
+scores zero or the top two tie, no best is recorded and 07 keeps its defaults.
+"""
+
+import os
+
+# One thread per worker process; parallelism comes from the pool
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+
+from model_registry import DETECTOR_FEATURES, CLASSIFIER_FEATURES
+from stages import load_stage
+
+train_models = load_stage("07_train_models")
+
+logger = logging.getLogger(__name__)
+
+SWEEP_JOBS = int(os.getenv("SWEEP_JOBS", os.cpu_count() or 1))
+SCORE_TIE = 1e-3  # F1 differences below this are noise, not a winner
+
+# max_samples bounds the isolation tree depth at ceil(log2(max_samples))
+DETECTOR_GRID = {
+    'contamination': [0.02, 0.05, 0.1],
+    'n_estimators': [50, 100, 200],
+    'max_samples': [0.25, 0.5, 1.0],
+}
+CLASSIFIER_GRID = {
+    'n_estimators': [50, 100, 200],
+    'max_depth': [5, 10, None],
+}
+
+# Set per worker by _init_worker
+_X = None
+_y = None
+
+def _init_worker(x_path: Path, y_path: Path):
+    global _X, _y
+    _X, _y = train_models.load_feature_matrix(x_path, y_path)
+
+# Tree ensembles are invariant to per-feature affine scaling, so the sweep scores
+# on the raw cached matrix and skips StandardScaler; the final fit in
+# 07_train_models.py still scales so serving inputs match.
+
+def _fit_detector(params: dict) -> dict:
+    start = time.perf_counter()
+    X = train_models.feature_frame(_X, DETECTOR_FEATURES)
+    # Unsupervised fit, but scored on the same holdout as the classifier, not the rows it was fit on
+    X_train, X_test, _, y_test = train_test_split(X, np.asarray(_y), test_size=0.2, random_state=42)
+    model = IsolationForest(random_state=42, n_jobs=1, **params).fit(X_train)
+    flagged = (model.predict(X_test) == -1).astype(int)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'params': params,
+        'score': float(f1_score(y_test, flagged, zero_division=0)),
+        'anomaly_rate': float(flagged.mean()),
+        'seconds': elapsed,
+    }
+
+def _fit_classifier(params: dict) -> dict:
+    start = time.perf_counter()
+    X = train_models.feature_frame(_X, CLASSIFIER_FEATURES)
+    X_train, X_test, y_train, y_test = train_test_split(X, np.asarray(_y), test_size=0.2, random_state=42)
+    model = RandomForestClassifier(random_state=42, n_jobs=1, **params).fit(X_train, y_train)
+    pred = model.predict(X_test)
+    elapsed = time.perf_counter() - start
+
+    return {
+        'params': params,
+        'score': float(f1_score(y_test, pred, zero_division=0)),
+        'accuracy': float(accuracy_score(y_test, pred)),
+        'seconds': elapsed,
+    }
+
+def expand_grid(grid: dict) -> list:
+    keys = list(grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*grid.values())]
+
+def pick_best(runs: list) -> tuple:
+    """(best run, None) for ranked runs, or (None, reason) when there's no real winner"""
+    if not runs:
+        return None, "no runs"
+    if runs[0]['score'] <= 0:
+        return None, "every config scored 0"
+    if len(runs) > 1 and runs[0]['score'] - runs[1]['score'] < SCORE_TIE:
+        return None, f"top configs tie at {runs[0]['score']:.3f}"
+    return runs[0], None
+
+def run_sweep(x_path: Path, y_path: Path, n_jobs: int = SWEEP_JOBS) -> dict:
+    """Run both grids on one process pool and return the ranked results per model"""
+    tasks = [('detector', _fit_detector, p) for p in expand_grid(DETECTOR_GRID)]
+    tasks += [('classifier', _fit_classifier, p) for p in expand_grid(CLASSIFIER_GRID)]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker,
+                             initargs=(x_path, y_path)) as pool:
+        futures = [(name, pool.submit(fn, params)) for name, fn, params in tasks]
+        results = {'detector': [], 'classifier': []}
+        for name, future in futures:
+            results[name].append(future.result())
+    wall = time.perf_counter() - start
+
+    summary = {}
+    for name, runs in results.items():
+        runs.sort(key=lambda r: (-r['score'], r['seconds']))
+        best, reason = pick_best(runs)
+        summary[name] = {
+            'best': best,
+            'no_best_reason': reason,
+            'runs': runs,
+            'cpu_seconds': sum(r['seconds'] for r in runs),
+            'wall_seconds': wall,
+            'n_jobs': n_jobs,
+        }
+    return summary
+
+def main():
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger.info("=" * 60)
+    logger.info("HYPERPARAMETER SWEEP")
+    logger.info("=" * 60)
+
+    data_path = train_models.DATA_DIR / "training_data.csv"
+    if not data_path.exists():
+        logger.error(f"❌ Training data not found: {data_path}")
+        return
+
+    df = pd.read_csv(data_path, parse_dates=['date'])
+    df['day_of_week'] = df['date'].dt.dayofweek
+    if 'purchase_spike' not in df.columns:
+        logger.error("❌ purchase_spike column missing; nothing to score against")
+        return
+
+    start = time.perf_counter()
+    x_path, y_path = train_models.build_feature_matrix(df)
+    logger.info(f"Feature matrix ready in {time.perf_counter() - start:.3f}s ({x_path.name})")
+
+    summary = run_sweep(x_path, y_path)
+
+    for name, result in summary.items():
+        best = result['best']
+        logger.info(f"{name}: {len(result['runs'])} configs, {result['cpu_seconds']:.2f}s CPU "
+                    f"in {result['wall_seconds']:.2f}s wall on {result['n_jobs']} workers")
+        if best is None:
+            logger.warning(f"  no best ({result['no_best_reason']}); 07_train_models.py keeps its defaults")
+        else:
+            logger.info(f"  best {best['params']} -> holdout F1 {best['score']:.3f} ({best['seconds']:.3f}s fit)")
+
+    train_models.SWEEP_RESULTS.write_text(json.dumps(summary, indent=2))
+    logger.info(f"✓ Saved sweep results to {train_models.SWEEP_RESULTS}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+COVID Cube Builder
+Normalizes covid_india.csv, covid_testing.csv and covid_vaccine.csv into a dense
+date x state x metric int32 array, saved as a memory-mappable .npy plus a JSON
+index (dates, states, metrics). The all-India rows are saved beside it as a
+date x metric national series rather than as a state. Read both back with
+covid_cube.CovidCube.
+"""
+
+import pandas as pd
+import numpy as np
+from pathlib import Path
+import json
+import logging
+import os
+from datetime import datetime
+
+from covid_cube import (
+    CUBE_DIR, CUBE_FILE, INDEX_FILE, NATIONAL_FILE, CUBE_DTYPE, MISSING, METRICS, NON_STATES, NATIONAL,
+    MERGED_TERRITORIES, spell_state
+)
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent
+RAW_DIR = BASE_DIR / "datasets" / "raw"
+
+SOURCES = {
+    'covid_india.csv': {'date_col': 'Date', 'state_col': 'State/UnionTerritory', 'date_format': '%Y-%m-%d'},
+    'covid_testing.csv': {'date_col': 'Date', 'state_col': 'State', 'date_format': '%Y-%m-%d'},
+    'covid_vaccine.csv': {'date_col': 'Updated On', 'state_col': 'State', 'date_format': '%d/%m/%Y'},
+}
+
+def load_source(filename: str, spec: dict) -> tuple:
+    """Read one CSV and return (raw frame, tidy frame indexed by date/state with metric columns)"""
+    raw = pd.read_csv(RAW_DIR / filename)
+    raw.columns = raw.columns.str.strip()
+
+    metrics = {name: col for name, (src, col) in METRICS.items() if src == filename}
+    tidy = pd.DataFrame({
+        'date': pd.to_datetime(raw[spec['date_col']], format=spec['date_format'], errors='coerce'),
+        'state': raw[spec['state_col']].map(spell_state),
+    })
+    for name, col in metrics.items():
+        # '-' and ' ' placeholders become NaN
+        tidy[name] = pd.to_numeric(raw[col], errors='coerce')
+
+    tidy = tidy[tidy['date'].notna() & ~tidy['state'].isin(NON_STATES)]
+    # One state reported twice on a day (e.g. under a misspelling); the sources are cumulative so keep the max
+    tidy = tidy.groupby(['date', 'state'], sort=False).max().reset_index()
+    # Territories reported apart on a day add up to the merged one (all-NaN stays NaN)
+    tidy['state'] = tidy['state'].replace(MERGED_TERRITORIES)
+    tidy = tidy.groupby(['date', 'state'], sort=False).sum(min_count=1)
+    return raw, tidy
+
+def fill(table: np.ndarray, tidy: pd.DataFrame, start: pd.Timestamp, metrics: list, s_idx=None):
+    """Write a tidy frame's values into a [date, (state,) metric] table"""
+    limit = np.iinfo(CUBE_DTYPE).max
+    d_idx = (tidy.index.get_level_values('date') - start).days.to_numpy()
+    for name in tidy.columns:
+        values = tidy[name].to_numpy(dtype=np.float64)
+        ok = ~np.isnan(values)
+        cell = (d_idx[ok], metrics.index(name)) if s_idx is None else (d_idx[ok], s_idx[ok], metrics.index(name))
+        table[cell] = np.clip(np.rint(values[ok]), 0, limit)
+
+def forward_fill(cube: np.ndarray) -> np.ndarray:
+    """Carry the last reported value forward along the date axis"""
+    days = np.arange(cube.shape[0]).reshape(-1, 1, 1)
+    last = np.where(cube != MISSING, days, 0)
+    np.maximum.accumulate(last, axis=0, out=last)
+    return np.take_along_axis(cube, last, axis=0)
+
+def build_cube():
+    CUBE_DIR.mkdir(parents=True, exist_ok=True)
+
+    raw_bytes = 0
+    tidy_frames = []
+    for filename, spec in SOURCES.items():
+        raw, tidy = load_source(filename, spec)
+        raw_bytes += raw.memory_usage(deep=True).sum()
+        tidy_frames.append(tidy)
+        logger.info(f"Loaded {filename}: {len(raw):,} rows -> {len(tidy):,} date/state cells")
+
+    dates = [f.index.get_level_values('date') for f in tidy_frames]
+    start = min(d.min() for d in dates).normalize()
+    end = max(d.max() for d in dates).normalize()
+    states = sorted(set().union(*(f.index.get_level_values('state').unique() for f in tidy_frames)) - {NATIONAL})
+    metrics = list(METRICS)
+
+    n_days = (end - start).days + 1
+    cube = np.full((n_days, len(states), len(metrics)), MISSING, dtype=CUBE_DTYPE)
+    national = np.full((n_days, len(metrics)), MISSING, dtype=CUBE_DTYPE)
+    state_codes = {s: i for i, s in enumerate(states)}
+
+    for tidy in tidy_frames:
+        is_national = tidy.index.get_level_values('state') == NATIONAL
+        regional = tidy[~is_national]
+        fill(cube, regional, start, metrics, regional.index.get_level_values('state').map(state_codes).to_numpy())
+        fill(national, tidy[is_national], start, metrics)
+
+    cube = forward_fill(cube)
+    national = forward_fill(national[:, None, :])[:, 0, :]
+
+    for filename, table in ((CUBE_FILE, cube), (NATIONAL_FILE, national)):
+        tmp = CUBE_DIR / f".{filename}"
+        with open(tmp, 'wb') as f:
+            np.save(f, table)
+        os.replace(tmp, CUBE_DIR / filename)
+
+    report = {
+        'raw_pandas_bytes': int(raw_bytes),
+        'cube_bytes': int(cube.nbytes),
+        'reduction': round(float(raw_bytes / cube.nbytes), 1),
+    }
+    index = {
+        'start_date': start.date().isoformat(),
+        'end_date': end.date().isoformat(),
+        'shape': list(cube.shape),
+        'dtype': np.dtype(CUBE_DTYPE).name,
+        'missing': MISSING,
+        'states': states,
+        'national': NATIONAL,
+        'metrics': metrics,
+        'sources': list(SOURCES),
+        'memory': report,
+        'built_at': datetime.now().isoformat(),
+    }
+    (CUBE_DIR / INDEX_FILE).write_text(json.dumps(index, indent=2))
+
+    logger.info(f"✓ Cube {cube.shape[0]} days x {cube.shape[1]} states x {cube.shape[2]} metrics "
+                f"saved to {CUBE_DIR / CUBE_FILE}")
+    logger.info(f"Memory: raw pandas frames {raw_bytes / 1e6:.2f} MB (object columns) vs "
+                f"cube {cube.nbytes / 1e6:.2f} MB ({report['reduction']}x smaller)")
+    return index
+
+if __name__ == "__main__":
+    build_cube()
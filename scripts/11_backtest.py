@@ -0,0 +1,297 @@
+"""
+Historical Backtesting
+Replays daily per-pincode series through the detectors with walk-forward
+training windows and reports how early outbreaks would have been flagged
+(lead time) and how many false alarms were raised elsewhere.
+
+A model fitted at day d is reused to score every day until the next refit,
+in one vectorized call, so a multi-year replay costs one fit per
+`retrain_every` days per pincode instead of one per day. Refits are
+incremental: each grows only the trees for the newest window and drops those
+whose window has rolled out, so a refit costs N_ESTIMATORS * retrain_every /
+train_window trees instead of N_ESTIMATORS (the default grid replays 242 days
+x 3 pincodes in ~36s on one core, against ~117s with full refits). Pincodes run in
+parallel on a process pool. Both sources are reindexed to a complete daily
+calendar, so windows and refit intervals are calendar days, not rows.
+
+Alarms before an onset count as early detection only when they form one
+unbroken run into the outbreak; those days are reported as early alarms,
+not false alarms. Any other alarm on an unlabelled day is a false alarm.
+
+    python scripts/11_backtest.py                      # training_data.csv, purchase_spike as ground truth
+    python scripts/11_backtest.py --source synthetic   # synthetic_transactions.csv, injected outbreak as ground truth
+"""
+
+import os
+
+# One thread per worker process; parallelism comes from the pool
+for _var in ("OMP_NUM_THREADS", "OPENBLAS_NUM_THREADS", "MKL_NUM_THREADS"):
+    os.environ.setdefault(_var, "1")
+
+import argparse
+import itertools
+import json
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+
+from codebook import load_codebooks, encode_columns
+from model_registry import DETECTOR_FEATURES
+from synthetic_scenario import OUTBREAK_PINCODE, OUTBREAK_DAYS
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent
+FINAL_DIR = BASE_DIR / "datasets" / "final"
+PROCESSED_DIR = BASE_DIR / "datasets" / "processed"
+MODEL_DIR = BASE_DIR / "models"
+RESULTS_PATH = MODEL_DIR / "backtest_results.json"
+
+BACKTEST_JOBS = int(os.getenv("BACKTEST_JOBS", os.cpu_count() or 1))
+MIN_TRAIN_DAYS = 14   # Days of history needed before the first score
+N_ESTIMATORS = 100    # Trees in the walk-forward ensemble once it has filled
+PRE_ONSET_DAYS = 7    # Longest unbroken alarm run before an onset that counts as early detection
+SOURCES = ['training', 'synthetic']
+
+def config_grid(source: str = "training") -> list:
+    """
+    Detector configs to replay. purchase_spike in training_data.csv is itself
+    count > 2 x baseline_30d, so ratio rules would be graded against their own
+    definition there; they only run against the synthetic outbreak.
+    """
+    configs = []
+    for contamination, window, every in itertools.product([0.05, 0.1], [30, 60], [7, 14]):
+        configs.append({
+            'name': f"iforest_c{contamination}_w{window}_r{every}",
+            'detector': 'iforest', 'contamination': contamination,
+            'train_window': window, 'retrain_every': every,
+        })
+    if source == "training":
+        return configs
+    for multiplier in [1.5, 2.0, 3.0]:
+        configs.append({'name': f"ratio_{multiplier}x", 'detector': 'ratio', 'multiplier': multiplier})
+    return configs
+
+# --- Data ---
+
+def complete_calendar(daily: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reindex (pincode_id, date)-indexed daily rows to every day of the range for
+    every pincode: quiet days count as zero, weather carries forward, and
+    baseline_30d is recomputed as a 30-calendar-day mean
+    """
+    dates = daily.index.get_level_values('date')
+    days = pd.date_range(dates.min(), dates.max(), freq='D')
+    full = pd.MultiIndex.from_product([daily.index.get_level_values('pincode_id').unique(), days],
+                                      names=['pincode_id', 'date'])
+    daily = daily.reindex(full).reset_index()
+    daily['transaction_count'] = daily['transaction_count'].fillna(0)
+    daily[['temperature', 'humidity']] = daily.groupby('pincode_id')[['temperature', 'humidity']].ffill().fillna(0)
+
+    daily['baseline_30d'] = daily.groupby('pincode_id')['transaction_count'].transform(
+        lambda x: x.rolling(window=30, min_periods=1).mean()
+    )
+    daily['day_of_week'] = daily['date'].dt.dayofweek
+    return daily
+
+def load_training_days() -> pd.DataFrame:
+    df = pd.read_csv(FINAL_DIR / "training_data.csv", parse_dates=['date'])
+    df = encode_columns(df, load_codebooks())
+    daily = complete_calendar(df.set_index(['pincode_id', 'date'])[
+        ['transaction_count', 'temperature', 'humidity', 'purchase_spike']])
+    # Days missing from the file had no transactions, so no spike
+    daily['label'] = daily['purchase_spike'].fillna(0).astype(bool)
+    return daily
+
+def load_synthetic_days() -> pd.DataFrame:
+    """Aggregate synthetic transactions to daily pincode series; the injected outbreak is the truth"""
+    books = load_codebooks()
+    txns = encode_columns(pd.read_csv(PROCESSED_DIR / "synthetic_transactions.csv",
+                                      parse_dates=['timestamp']), books)
+    txns['date'] = txns['timestamp'].dt.normalize()
+
+    daily = txns.groupby(['pincode_id', 'date']).agg(
+        transaction_count=('quantity', 'size'),
+        temperature=('weather_temp', 'mean'),
+        humidity=('weather_humidity', 'mean'),
+    )
+    daily = complete_calendar(daily)
+
+    outbreak = books['pincode'].code(OUTBREAK_PINCODE)
+    onset = daily['date'].max() - pd.Timedelta(days=OUTBREAK_DAYS - 1)
+    daily['label'] = (daily['pincode_id'] == outbreak) & (daily['date'] >= onset)
+    return daily
+
+# --- Replay (runs in worker processes) ---
+
+def replay_pincode(config: dict, X: np.ndarray, counts: np.ndarray, baselines: np.ndarray) -> np.ndarray:
+    """
+    Walk forward over one pincode's days. Returns alarms per day:
+    1 = alarm, 0 = quiet, -1 = not scored (warm-up).
+    """
+    n = len(X)
+    alarms = np.full(n, -1, dtype=np.int8)
+
+    if config['detector'] == 'ratio':
+        alarms[:] = counts > config['multiplier'] * baselines
+        return alarms
+
+    # No StandardScaler: isolation trees are invariant to per-feature affine scaling.
+    # Each refit adds one generation of trees fitted on the current window and retires
+    # generations fitted more than a window ago, so the ensemble holds ~N_ESTIMATORS
+    # trees while a refit only grows N_ESTIMATORS / generations of them
+    window, every = config['train_window'], config['retrain_every']
+    generations = -(-window // every)
+    per_refit = -(-N_ESTIMATORS // generations)
+    pool = []  # (day fitted, forest)
+    for start in range(MIN_TRAIN_DAYS, n, every):
+        lo, block = max(0, start - window), slice(start, min(start + every, n))
+        pool = [(fitted, forest) for fitted, forest in pool if start - fitted < window]
+        pool.append((start, IsolationForest(n_estimators=per_refit if pool else N_ESTIMATORS,
+                                            random_state=42 + start, n_jobs=1).fit(X[lo:start])))
+        depth = pooled_depth(pool, X[lo:block.stop])
+        # Same threshold IsolationForest.fit derives from contamination, over the pooled trees
+        offset = np.percentile(depth[:start - lo], 100 * config['contamination'])
+        alarms[block] = depth[start - lo:] < offset
+    return alarms
+
+def pooled_depth(pool: list, X: np.ndarray) -> np.ndarray:
+    """
+    Tree-weighted mean normalized path length across forests. score_samples is
+    -2 ** -depth, so depth orders rows like the scores do: lower is more anomalous
+    """
+    return np.average([-np.log2(-forest.score_samples(X)) for _, forest in pool],
+                      axis=0, weights=[forest.n_estimators for _, forest in pool])
+
+def _replay_task(args):
+    config, pincode, X, counts, baselines = args
+    started = time.perf_counter()
+    alarms = replay_pincode(config, X, counts, baselines)
+    return config['name'], pincode, alarms, time.perf_counter() - started
+
+# --- Scoring ---
+
+def outbreak_events(labels: np.ndarray) -> list:
+    """(start, end) index pairs of contiguous labelled runs"""
+    edges = np.diff(np.concatenate([[0], labels.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1) - 1))
+
+def score(per_pincode: dict) -> dict:
+    """per_pincode: pincode -> (alarms, labels)"""
+    tp = fp = fn = 0
+    leads, detected, missed, early_total = [], 0, 0, 0
+    false_alarms = {}
+
+    for pincode, (alarms, labels) in per_pincode.items():
+        scored = alarms >= 0
+        alarm = alarms == 1
+        early = np.zeros(len(alarm), dtype=bool)  # pre-onset days of a run that carries into an outbreak
+
+        prev_end = -1
+        for start, end in outbreak_events(labels):
+            lo = max(start - PRE_ONSET_DAYS, prev_end + 1)
+            prev_end = end
+            if not scored[start]:
+                continue  # Onset fell in the warm-up period
+            hits = np.flatnonzero(alarm[start:end + 1])
+            if not len(hits):
+                missed += 1
+                continue
+            detected += 1
+            lead = -int(hits[0])  # <= 0: days after onset until the first alarm
+            if hits[0] == 0:
+                # Alarmed on the onset day: the lead is the unbroken run of alarms right before it
+                first = start
+                while first > lo and alarm[first - 1]:
+                    first -= 1
+                early[first:start] = True
+                lead = int(start - first)
+            leads.append(lead)
+
+        tp += int((alarm & labels).sum())
+        fp += int((alarm & ~labels & scored & ~early).sum())
+        fn += int((~alarm & labels & scored).sum())
+        false_alarms[pincode] = int((alarm & ~labels & ~early).sum())
+        early_total += int(early.sum())
+
+    return {
+        'precision': tp / (tp + fp) if tp + fp else None,
+        'recall': tp / (tp + fn) if tp + fn else None,
+        'events_detected': detected,
+        'events_missed': missed,
+        'mean_lead_days': float(np.mean(leads)) if leads else None,
+        'lead_days': leads,
+        'early_alarms': early_total,
+        'false_alarms': int(sum(false_alarms.values())),
+        'false_alarms_by_pincode': false_alarms,
+    }
+
+def run_backtest(daily: pd.DataFrame, configs: list, n_jobs: int = BACKTEST_JOBS) -> dict:
+    books = load_codebooks()
+    daily = daily.sort_values(['pincode_id', 'date'])
+
+    series = {}
+    for pincode, group in daily.groupby('pincode_id'):
+        series[books['pincode'].value(int(pincode)) or str(pincode)] = (
+            group[DETECTOR_FEATURES].fillna(0).to_numpy(dtype=np.float64),
+            group['transaction_count'].to_numpy(dtype=np.float64),
+            group['baseline_30d'].to_numpy(dtype=np.float64),
+            group['label'].to_numpy(dtype=bool),
+        )
+
+    tasks = [(config, pincode, X, counts, baselines)
+             for config in configs for pincode, (X, counts, baselines, _) in series.items()]
+
+    started = time.perf_counter()
+    alarms = {config['name']: {} for config in configs}
+    cpu = {config['name']: 0.0 for config in configs}
+    with ProcessPoolExecutor(max_workers=n_jobs) as pool:
+        for name, pincode, result, seconds in pool.map(_replay_task, tasks):
+            alarms[name][pincode] = (result, series[pincode][3])
+            cpu[name] += seconds
+    wall = time.perf_counter() - started
+
+    results = {}
+    for config in configs:
+        results[config['name']] = {'config': config, 'cpu_seconds': cpu[config['name']],
+                                   **score(alarms[config['name']])}
+    return {'results': results, 'wall_seconds': wall, 'n_jobs': n_jobs,
+            'days': int(daily['date'].nunique()), 'pincodes': len(series)}
+
+def _fmt(value, spec):
+    return "   -" if value is None else format(value, spec)
+
+def main(source: str = "training"):
+    logger.info("=" * 60)
+    logger.info(f"BACKTEST ({source})")
+    logger.info("=" * 60)
+
+    daily = load_synthetic_days() if source == "synthetic" else load_training_days()
+    if source == "training":
+        logger.info("Ratio rules skipped: purchase_spike is itself count > 2 x baseline_30d")
+    report = run_backtest(daily, config_grid(source))
+
+    logger.info(f"{report['days']} days x {report['pincodes']} pincodes, "
+                f"{report['wall_seconds']:.2f}s wall on {report['n_jobs']} workers")
+    logger.info(f"{'config':<28}{'prec':>6}{'recall':>8}{'events':>9}{'lead':>7}{'early':>7}{'false':>7}{'cpu s':>8}")
+    for name, r in report['results'].items():
+        logger.info(f"{name:<28}{_fmt(r['precision'], '6.2f')}{_fmt(r['recall'], '8.2f')}"
+                    f"{r['events_detected']:>5}/{r['events_detected'] + r['events_missed']:<3}"
+                    f"{_fmt(r['mean_lead_days'], '7.1f')}{r['early_alarms']:>7}{r['false_alarms']:>7}"
+                    f"{r['cpu_seconds']:>8.2f}")
+
+    RESULTS_PATH.write_text(json.dumps({'source': source, **report}, indent=2))
+    logger.info(f"✓ Saved backtest results to {RESULTS_PATH}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the outbreak detectors")
+    parser.add_argument("--source", choices=SOURCES, default="training",
+                        help="training: training_data.csv with purchase_spike; "
+                             "synthetic: synthetic_transactions.csv with the injected outbreak")
+    main(parser.parse_args().source)
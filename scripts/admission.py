@@ -0,0 +1,259 @@
+"""
+Ingest Admission Control
+Bounds the work bulk ingest can put on an API worker. Requests are admitted
+into a bounded queue and scored by a single worker that drains it in
+micro-batches (one detector call per batch, on a dedicated thread), so a
+burst costs a few vectorized predictions instead of one sklearn call per
+request competing with dashboard reads for the interpreter. The handler
+returns one result per item; an exception in an item's place fails that
+request only, so one bad row doesn't take the rest of its batch down.
+
+Load is shed with Overloaded (the API answers 429 + Retry-After) when the
+queue is full on arrival, or when a request has waited longer than
+`queue_timeout` by the time it would be scored; stale work is dropped
+rather than done late. A 429 decided before the body is read is held for up
+to INGEST_SHED_HOLD seconds first, so clients that ignore Retry-After can't
+turn shedding itself into a busy loop on the worker.
+
+Reads get a reserved lane. ReadPriority counts the GET requests in flight on
+the worker. Admitted writes wait for them to finish before their body is
+parsed, and the scoring worker waits before starting a batch. Both waits are
+capped at INGEST_READ_YIELD seconds so a steady read load can't starve ingest.
+"""
+
+import asyncio
+import json
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+INGEST_MAX_QUEUE = int(os.getenv("INGEST_MAX_QUEUE", 64))
+INGEST_MAX_BATCH = int(os.getenv("INGEST_MAX_BATCH", 64))
+INGEST_QUEUE_TIMEOUT = float(os.getenv("INGEST_QUEUE_TIMEOUT", 1.0))  # seconds
+INGEST_READ_YIELD = float(os.getenv("INGEST_READ_YIELD", 0.05))  # longest wait for reads, per batch/request
+INGEST_SHED_HOLD = float(os.getenv("INGEST_SHED_HOLD", 0.5))  # seconds a shed 429 is held (<= Retry-After)
+
+SERVICE_ALPHA = 0.1  # EWMA weight for the per-item service time behind Retry-After
+
+class Overloaded(Exception):
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class ReadLane:
+    """Reads in flight on this worker's event loop; ingest work yields to them"""
+
+    def __init__(self, max_wait: float = INGEST_READ_YIELD):
+        self.max_wait = max_wait
+        self.active = 0
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self.yields = 0
+        self.yield_seconds = 0.0
+
+    def enter(self):
+        self.active += 1
+        self._idle.clear()
+
+    def leave(self):
+        self.active -= 1
+        if not self.active:
+            self._idle.set()
+
+    async def wait_idle(self):
+        """Return once no read is in flight, or after max_wait"""
+        if not self.active:
+            return
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(self._idle.wait(), self.max_wait)
+        except asyncio.TimeoutError:
+            pass
+        self.yields += 1
+        self.yield_seconds += time.monotonic() - started
+
+    def metrics(self) -> dict:
+        return {"reads_in_flight": self.active, "yields": self.yields,
+                "yield_ms": round(self.yield_seconds * 1000, 1)}
+
+class AdmissionController:
+    """
+    Per-process bounded queue in front of a batch handler.
+    handler(items) -> list of results (same order) runs on the controller's thread;
+    all bookkeeping happens on the event loop thread.
+    """
+
+    def __init__(self, name: str, handler: Callable[[list], list], max_queue: int = INGEST_MAX_QUEUE,
+                 max_batch: int = INGEST_MAX_BATCH, queue_timeout: float = INGEST_QUEUE_TIMEOUT,
+                 reads: Optional[ReadLane] = None):
+        self.name = name
+        self.handler = handler
+        self.reads = reads
+        self.max_queue = max_queue
+        self.max_batch = max_batch
+        self.queue_timeout = queue_timeout
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._executor = ThreadPoolExecutor(1, thread_name_prefix=name)
+        self._worker: Optional[asyncio.Task] = None
+
+        self.in_flight = 0
+        self.admitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.max_queue_depth_seen = 0
+        self.item_seconds = 0.001  # initial guess, refined as batches complete
+
+    def start(self):
+        self._worker = asyncio.create_task(self._drain())
+
+    def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def saturated(self) -> bool:
+        return self._queue.full()
+
+    def retry_after(self) -> int:
+        """Seconds until the current backlog should have drained (HTTP wants whole seconds)"""
+        return max(1, math.ceil((self._queue.qsize() + self.in_flight) * self.item_seconds))
+
+    def reject(self) -> Overloaded:
+        self.rejected_queue_full += 1
+        return Overloaded("ingest queue full", self.retry_after())
+
+    async def submit(self, item):
+        """Queue item for the handler and wait for its result, or raise Overloaded"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((time.monotonic(), item, future))
+        except asyncio.QueueFull:
+            raise self.reject()
+        self.admitted += 1
+        self.max_queue_depth_seen = max(self.max_queue_depth_seen, self._queue.qsize())
+        return await future
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+
+            # Shed what has already waited too long; its client is better off retrying later
+            deadline = time.monotonic() - self.queue_timeout
+            live = []
+            for enqueued, item, future in batch:
+                if future.cancelled():
+                    continue
+                if enqueued < deadline:
+                    self.rejected_timeout += 1
+                    future.set_exception(Overloaded("timed out in the ingest queue", self.retry_after()))
+                else:
+                    live.append((item, future))
+            if not live:
+                continue
+            if self.reads is not None:
+                # Scoring competes with reads for the interpreter; let the ones in flight finish
+                await self.reads.wait_idle()
+
+            self.in_flight = len(live)
+            started = time.perf_counter()
+            try:
+                results = await loop.run_in_executor(self._executor, self.handler, [i for i, _ in live])
+            except Exception as e:
+                self.failed += len(live)
+                for _, future in live:
+                    if not future.done():
+                        future.set_exception(e)
+            else:
+                for (_, future), result in zip(live, results):
+                    failed = isinstance(result, Exception)
+                    self.failed += failed
+                    self.completed += not failed
+                    if future.done():
+                        continue
+                    if failed:
+                        future.set_exception(result)
+                    else:
+                        future.set_result(result)
+            finally:
+                per_item = (time.perf_counter() - started) / len(live)
+                self.item_seconds += SERVICE_ALPHA * (per_item - self.item_seconds)
+                self.batches += 1
+                self.in_flight = 0
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize(),
+            "in_flight": self.in_flight,
+            "max_queue": self.max_queue,
+            "max_queue_depth_seen": self.max_queue_depth_seen,
+            "max_batch": self.max_batch,
+            "admitted": self.admitted,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "batches": self.batches,
+            "mean_batch": round(self.completed / self.batches, 2) if self.batches else 0.0,
+            "item_ms": round(self.item_seconds * 1000, 3),
+        }
+
+class ReadPriority:
+    """ASGI middleware counting GET/HEAD requests into the worker's read lane"""
+
+    def __init__(self, app, lane: Callable[[], Optional[ReadLane]]):
+        self.app = app
+        self.lane = lane
+
+    async def __call__(self, scope, receive, send):
+        lane = self.lane() if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD') else None
+        if lane is None:
+            await self.app(scope, receive, send)
+            return
+        lane.enter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            lane.leave()
+
+class ShedWhenSaturated:
+    """
+    ASGI middleware answering 429 for requests to `path` while the gate's queue
+    is full, before the body is read or validated, so shed load costs the
+    event loop next to nothing and reads keep their share of it. Admitted
+    requests wait for the read lane before they are parsed.
+    """
+
+    def __init__(self, app, path: str, gate: Callable[[], Optional[AdmissionController]],
+                 hold: float = INGEST_SHED_HOLD):
+        self.app = app
+        self.path = path
+        self.gate = gate
+        self.hold = hold
+
+    async def __call__(self, scope, receive, send):
+        gate = self.gate() if scope['type'] == 'http' and scope['path'] == self.path else None
+        if gate is not None and gate.saturated():
+            e = gate.reject()
+            if self.hold > 0:
+                # Costs a timer, not CPU; a client ignoring Retry-After can't spin faster than this
+                await asyncio.sleep(min(self.hold, e.retry_after))
+            body = json.dumps({"detail": e.reason}).encode()
+            await send({'type': 'http.response.start', 'status': 429, 'headers': [
+                (b'content-type', b'application/json'),
+                (b'content-length', str(len(body)).encode()),
+                (b'retry-after', str(e.retry_after).encode()),
+            ]})
+            await send({'type': 'http.response.body', 'body': body})
+            return
+        if gate is not None and gate.reads is not None:
+            await gate.reads.wait_idle()
+        await self.app(scope, receive, send)
@@ -0,0 +1,212 @@
+"""
+Anomaly Store
+Scored anomalies from training (07_train_models.py) and live ingest, kept in
+SQLite and indexed by (ts, id) and (pincode, ts, id) so history pages are
+keyset range scans: each page costs O(page size) no matter how deep it is.
+
+Counts per (pincode, severity) live in their own table and are updated in
+the same transaction as the inserts, so stats are exact and never need a
+scan of the anomaly rows. The feature attributions of each pincode's latest
+live alert are kept beside it, one row per pincode, for outbreak-status.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+from regions import ratio_severity, SEVERITY_RATIOS
+from rollup_cube import epoch_seconds
+
+BASE_DIR = Path(__file__).parent.parent
+# Live state (anomalies, idempotency keys); each shard of a local cluster gets its own
+STATE_DIR_ENV = "FLU_RADAR_STATE_DIR"
+STATE_DIR = Path(os.getenv(STATE_DIR_ENV, BASE_DIR / "datasets" / "final"))
+STORE_PATH = STATE_DIR / "anomalies.db"
+
+SEVERITIES = ['yellow', 'orange', 'red']
+MAX_PAGE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS anomalies (
+    id INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,            -- epoch seconds, naive timestamps taken as UTC
+    pincode INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    score REAL,                     -- IsolationForest score_samples (lower = more anomalous)
+    transaction_count REAL,
+    baseline REAL,
+    source TEXT NOT NULL            -- 'train' or 'live'
+);
+CREATE INDEX IF NOT EXISTS idx_anomalies_ts ON anomalies (ts, id);
+CREATE INDEX IF NOT EXISTS idx_anomalies_pincode_ts ON anomalies (pincode, ts, id);
+CREATE TABLE IF NOT EXISTS anomaly_counts (
+    pincode INTEGER NOT NULL,
+    severity TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (pincode, severity)
+);
+CREATE TABLE IF NOT EXISTS alert_explanations (
+    pincode INTEGER PRIMARY KEY,
+    ts INTEGER NOT NULL,            -- the alert's epoch seconds; an older alert never replaces a newer one
+    explanation TEXT NOT NULL       -- JSON, see main.explain_alerts
+);
+"""
+
+COLUMNS = ['ts', 'pincode', 'severity', 'score', 'transaction_count', 'baseline', 'source']
+
+def anomaly_severity(transaction_count: float, baseline: float) -> str:
+    """Severity of a flagged day: by how far it exceeds baseline, at least yellow"""
+    severity = ratio_severity(transaction_count, baseline)
+    return 'yellow' if severity == 'green' else severity
+
+def anomaly_severities(transaction_counts: np.ndarray, baselines: np.ndarray) -> np.ndarray:
+    """anomaly_severity over arrays"""
+    severities = np.full(len(transaction_counts), 'yellow', dtype=object)
+    for ratio, severity in reversed(SEVERITY_RATIOS):  # mildest first, so the highest ratio wins
+        severities[(baselines > 0) & (transaction_counts > ratio * baselines)] = severity
+    return severities
+
+def _tally(rows: list) -> dict:
+    counts = {}
+    for row in rows:
+        counts[(row[1], row[2])] = counts.get((row[1], row[2]), 0) + 1
+    return counts
+
+def encode_cursor(ts: int, row_id: int) -> str:
+    return base64.urlsafe_b64encode(f"{ts}:{row_id}".encode()).decode()
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        ts, row_id = base64.urlsafe_b64decode(cursor.encode()).decode().split(':')
+        return int(ts), int(row_id)
+    except Exception:
+        raise ValueError(f"Invalid cursor: {cursor}")
+
+class AnomalyStore:
+    """One connection per process; safe to share between that process's threads"""
+
+    def __init__(self, path: Path = STORE_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    # --- writes ---
+
+    def add(self, rows: Iterable[tuple], explanations: Iterable[tuple] = ()):
+        """
+        Append (ts, pincode, severity, score, transaction_count, baseline, source) rows
+        and, in the same transaction, (pincode, ts, explanation dict) for their alerts
+        """
+        rows = list(rows)
+        if not rows:
+            return
+        counts = _tally(rows)
+        explanations = [(p, ts, json.dumps(e)) for p, ts, e in explanations]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(f"INSERT INTO anomalies ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._bump(counts, +1)
+                self._conn.executemany(
+                    "INSERT INTO alert_explanations (pincode, ts, explanation) VALUES (?, ?, ?) "
+                    "ON CONFLICT (pincode) DO UPDATE SET ts = excluded.ts, explanation = excluded.explanation "
+                    "WHERE excluded.ts >= alert_explanations.ts", explanations)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def replace_source(self, source: str, frame: pd.DataFrame):
+        """Swap all rows of one source (e.g. a retrained batch) for frame's, counters included"""
+        rows = list(frame[COLUMNS[:-1]].assign(source=source).itertuples(index=False, name=None))
+        counts = _tally(rows)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                old = self._conn.execute(
+                    "SELECT pincode, severity, COUNT(*) FROM anomalies WHERE source = ? GROUP BY pincode, severity",
+                    (source,)).fetchall()
+                self._bump({(p, s): c for p, s, c in old}, -1)
+                self._conn.execute("DELETE FROM anomalies WHERE source = ?", (source,))
+                self._conn.executemany(f"INSERT INTO anomalies ({', '.join(COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+                self._bump(counts, +1)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _bump(self, counts: dict, sign: int):
+        self._conn.executemany(
+            "INSERT INTO anomaly_counts (pincode, severity, count) VALUES (?, ?, ?) "
+            "ON CONFLICT (pincode, severity) DO UPDATE SET count = count + excluded.count",
+            [(p, s, sign * c) for (p, s), c in counts.items()])
+
+    # --- reads ---
+
+    def page(self, start: Optional[datetime] = None, end: Optional[datetime] = None,
+             pincode: Optional[int] = None, severities: Optional[list] = None,
+             limit: int = 50, cursor: Optional[str] = None) -> tuple:
+        """Newest-first page of anomalies and the cursor for the next one (None at the end)"""
+        where, params = [], []
+        if pincode is not None:
+            where.append("pincode = ?")
+            params.append(pincode)
+        if start is not None:
+            where.append("ts >= ?")
+            params.append(epoch_seconds(start))
+        if end is not None:
+            where.append("ts <= ?")
+            params.append(epoch_seconds(end))
+        if severities:
+            where.append(f"severity IN ({', '.join('?' * len(severities))})")
+            params.extend(severities)
+        if cursor:
+            where.append("(ts, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+
+        limit = max(1, min(limit, MAX_PAGE))
+        sql = (f"SELECT id, {', '.join(COLUMNS)} FROM anomalies"
+               f"{' WHERE ' + ' AND '.join(where) if where else ''} ORDER BY ts DESC, id DESC LIMIT ?")
+        with self._lock:
+            rows = self._conn.execute(sql, (*params, limit + 1)).fetchall()
+
+        more = len(rows) > limit
+        rows = rows[:limit]
+        items = [dict(zip(['id', *COLUMNS], row)) for row in rows]
+        next_cursor = encode_cursor(rows[-1][1], rows[-1][0]) if more else None
+        return items, next_cursor
+
+    def explanation(self, pincode: int) -> Optional[dict]:
+        """Attributions cached with the pincode's latest live alert, if any"""
+        with self._lock:
+            row = self._conn.execute("SELECT explanation FROM alert_explanations WHERE pincode = ?",
+                                     (pincode,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def counts(self, include: Optional[Callable[[int], bool]] = None) -> dict:
+        """Exact anomaly totals: overall, per severity and per pincode (only pincodes include() accepts)"""
+        with self._lock:
+            rows = self._conn.execute("SELECT pincode, severity, count FROM anomaly_counts WHERE count > 0").fetchall()
+        by_severity = {s: 0 for s in SEVERITIES}
+        by_pincode = {}
+        for pincode, severity, count in rows:
+            if include is not None and not include(pincode):
+                continue
+            by_severity[severity] = by_severity.get(severity, 0) + count
+            by_pincode[pincode] = by_pincode.get(pincode, 0) + count
+        return {'total': sum(by_severity.values()), 'by_severity': by_severity, 'by_pincode': by_pincode}
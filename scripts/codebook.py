@@ -0,0 +1,126 @@
+"""
+Persistent Code Books
+Interning dictionaries that map pincodes, medicine names and categories to
+dense int32 codes. Pipeline stages store and join on the codes; strings are
+only restored at the edges (API responses, database upload, model filenames).
+
+Codes are append-only: a value keeps its code for the life of the dictionary,
+so files written by earlier runs stay decodable.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+CODEBOOK_DIR = BASE_DIR / "datasets" / "dictionaries"
+
+UNKNOWN = -1
+CODE_DTYPE = np.int32
+
+# string column -> (code column, code book name)
+ENCODED_COLUMNS = {
+    'pincode': ('pincode_id', 'pincode'),
+    'medicine_name': ('medicine_id', 'medicine'),
+    'category': ('category_id', 'category'),
+}
+
+def _normalize(values) -> pd.Series:
+    """Canonical string form; pincodes read from CSV arrive as ints"""
+    s = pd.Series(values)
+    if pd.api.types.is_numeric_dtype(s):
+        s = s.astype('Int64')
+    return s.astype(str).str.strip()
+
+class CodeBook:
+    """Append-only value <-> int32 code mapping, persisted as a JSON list"""
+
+    def __init__(self, name: str, values: Optional[list] = None, directory: Path = CODEBOOK_DIR):
+        self.name = name
+        self.path = directory / f"{name}.json"
+        self.values = list(values or [])
+        self._index = {v: i for i, v in enumerate(self.values)}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, name: str, directory: Path = CODEBOOK_DIR) -> "CodeBook":
+        path = directory / f"{name}.json"
+        values = json.loads(path.read_text()) if path.exists() else []
+        return cls(name, values, directory)
+
+    def save(self):
+        if not self._dirty:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(self.values, indent=0))
+        os.replace(tmp, self.path)
+        self._dirty = False
+
+    def __len__(self):
+        return len(self.values)
+
+    def encode(self, values: Iterable, add: bool = False) -> np.ndarray:
+        """Vectorized encode; unseen values get new codes if add, else UNKNOWN"""
+        s = _normalize(values)
+        if add:
+            for v in pd.unique(s):
+                if v not in self._index:
+                    self._index[v] = len(self.values)
+                    self.values.append(v)
+                    self._dirty = True
+        # get_indexer marks misses with -1, which is UNKNOWN
+        return pd.Index(self.values, dtype=object).get_indexer(s).astype(CODE_DTYPE)
+
+    def code(self, value, add: bool = False) -> int:
+        """Scalar encode (dict lookup, for the per-request path)"""
+        v = str(int(value)) if isinstance(value, (int, np.integer)) else str(value).strip()
+        code = self._index.get(v)
+        if code is None:
+            if not add:
+                return UNKNOWN
+            code = self._index[v] = len(self.values)
+            self.values.append(v)
+            self._dirty = True
+        return code
+
+    def decode(self, codes) -> np.ndarray:
+        """Vectorized decode; UNKNOWN becomes None"""
+        codes = np.asarray(codes)
+        table = np.asarray(self.values + [None], dtype=object)
+        return table[np.where(codes == UNKNOWN, len(self.values), codes)]
+
+    def value(self, code: int) -> Optional[str]:
+        return self.values[code] if 0 <= code < len(self.values) else None
+
+def load_codebooks(directory: Path = CODEBOOK_DIR) -> dict:
+    return {book: CodeBook.load(book, directory) for _, book in ENCODED_COLUMNS.values()}
+
+def save_codebooks(books: dict):
+    for book in books.values():
+        book.save()
+
+def encode_columns(df: pd.DataFrame, books: dict, add: bool = False) -> pd.DataFrame:
+    """
+    Replace string id columns with their int32 code columns in place.
+    Already-encoded frames (e.g. read back from CSV as int64) are just downcast.
+    """
+    for col, (code_col, book) in ENCODED_COLUMNS.items():
+        if code_col in df.columns:
+            df[code_col] = df[code_col].astype(CODE_DTYPE)
+        elif col in df.columns:
+            df.insert(df.columns.get_loc(col), code_col, books[book].encode(df[col].to_numpy(), add=add))
+            df.drop(columns=col, inplace=True)
+    return df
+
+def decode_columns(df: pd.DataFrame, books: dict) -> pd.DataFrame:
+    """Inverse of encode_columns (in place), for boundaries that need the original strings"""
+    for col, (code_col, book) in ENCODED_COLUMNS.items():
+        if code_col in df.columns:
+            df.insert(df.columns.get_loc(code_col), col, books[book].decode(df[code_col].to_numpy()))
+            df.drop(columns=code_col, inplace=True)
+    return df
@@ -0,0 +1,155 @@
+"""
+Columnar Ingest
+Transaction batches sent as an Arrow IPC stream (one or more record batches,
+Transaction schema). Columns are validated as whole arrays and handed to
+scoring as numpy buffers: fixed-width columns without nulls are viewed
+without copying, and string columns are dictionary-encoded so each distinct
+medicine/category/customer becomes one Python string, not every row.
+
+pyarrow is optional; without it COLUMNAR_AVAILABLE is False and the API
+answers 501 on the Arrow endpoint.
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+
+from pincode_state import PINCODE_MIN, PINCODE_MAX
+from rollup_cube import future_horizon, MAX_FUTURE
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # JSON ingest still works
+    pa = pc = None
+
+COLUMNAR_AVAILABLE = pa is not None
+ARROW_MEDIA_TYPE = "application/vnd.apache.arrow.stream"
+ARROW_MAX_ROWS = int(os.getenv("ARROW_MAX_ROWS", 200_000))
+ARROW_MAX_QUEUE = int(os.getenv("ARROW_MAX_QUEUE", 8))  # batches waiting to be scored per worker
+
+REQUIRED_COLUMNS = ['timestamp', 'pincode', 'medicine_name', 'category', 'quantity']
+OPTIONAL_COLUMNS = ['customer_age', 'customer_id']
+MAX_BAD_ROWS = 5  # row numbers listed per failed check
+
+class BatchError(ValueError):
+    def __init__(self, errors: list):
+        super().__init__("; ".join(e['message'] for e in errors))
+        self.errors = errors
+
+def _check(errors: list, column: str, bad, message: str):
+    """Record a failed check with the first few offending row numbers"""
+    bad = np.asarray(bad)
+    if bad.any():
+        rows = np.flatnonzero(bad)
+        errors.append({'column': column, 'message': f"{column}: {message}", 'count': int(len(rows)),
+                       'rows': rows[:MAX_BAD_ROWS].tolist()})
+
+def _nulls(column) -> np.ndarray:
+    return column.is_null().to_numpy(zero_copy_only=False)
+
+def _categorical(column, lower: bool = False) -> pd.Categorical:
+    if lower:
+        column = pc.utf8_lower(column)
+    encoded = column.dictionary_encode().combine_chunks()
+    codes = encoded.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+    return pd.Categorical.from_codes(codes, categories=pd.Index(encoded.dictionary.to_pylist()))
+
+def read_batch(body: bytes) -> pd.DataFrame:
+    """
+    Parse and validate an Arrow IPC stream into a frame with timestamp (naive UTC
+    datetime64), pincode (int64), medicine_name/category/customer_id (categorical),
+    quantity (int64) and customer_age (float, NaN when missing). Raises BatchError.
+    """
+    try:
+        table = pa.ipc.open_stream(pa.py_buffer(body)).read_all()
+    except (pa.ArrowInvalid, OSError) as e:
+        raise BatchError([{'column': None, 'message': f"Not an Arrow IPC stream: {e}", 'count': 0, 'rows': []}])
+
+    missing = [c for c in REQUIRED_COLUMNS if c not in table.column_names]
+    if missing:
+        raise BatchError([{'column': c, 'message': f"{c}: missing column", 'count': 0, 'rows': []} for c in missing])
+    if table.num_rows > ARROW_MAX_ROWS:
+        raise BatchError([{'column': None, 'message': f"{table.num_rows} rows exceeds ARROW_MAX_ROWS={ARROW_MAX_ROWS}",
+                           'count': table.num_rows, 'rows': []}])
+    table = table.combine_chunks()
+
+    errors = []
+    columns = {}
+    for name in REQUIRED_COLUMNS:
+        _check(errors, name, _nulls(table[name]), "must not be null")
+
+    # timestamp: Arrow timestamps (aware ones converted to UTC) or ISO 8601 strings
+    ts = table['timestamp']
+    try:
+        if pa.types.is_string(ts.type) or pa.types.is_large_string(ts.type):
+            ts = pc.cast(ts, pa.timestamp('us'))
+        elif not pa.types.is_timestamp(ts.type):
+            raise pa.ArrowInvalid(f"unsupported type {ts.type}")
+        ts = pc.cast(ts, pa.timestamp('us', tz=ts.type.tz)).cast(pa.int64())
+        columns['timestamp'] = ts.fill_null(0).to_numpy(zero_copy_only=False).astype('datetime64[us]')
+        _check(errors, 'timestamp', columns['timestamp'] > np.datetime64(future_horizon(), 's'),
+               f"must not be more than {MAX_FUTURE} ahead of the clock")
+    except (pa.ArrowInvalid, pa.ArrowNotImplementedError) as e:
+        errors.append({'column': 'timestamp', 'message': f"timestamp: {e}", 'count': table.num_rows, 'rows': []})
+
+    # pincode: integers or digit strings, six digits like the JSON endpoint
+    pin = table['pincode']
+    digits = True
+    if pa.types.is_string(pin.type) or pa.types.is_large_string(pin.type):
+        digits = pc.match_substring_regex(pin, r"^\s*[0-9]+\s*$").fill_null(True).to_numpy(zero_copy_only=False)
+        _check(errors, 'pincode', ~digits, "must be digits")
+        pin = pc.cast(pc.if_else(digits, pc.utf8_trim_whitespace(pin), "1"), pa.int64())
+    elif pa.types.is_integer(pin.type):
+        pin = pin.cast(pa.int64())
+    else:
+        errors.append({'column': 'pincode', 'message': f"pincode: unsupported type {pin.type}",
+                       'count': table.num_rows, 'rows': []})
+        pin = None
+    if pin is not None:
+        pincodes = pin.fill_null(PINCODE_MIN).to_numpy(zero_copy_only=False)
+        _check(errors, 'pincode', (pincodes < PINCODE_MIN) | (pincodes > PINCODE_MAX), "must be a six-digit pincode")
+        columns['pincode'] = pincodes
+
+    quantity = table['quantity']
+    if pa.types.is_integer(quantity.type):
+        quantities = quantity.cast(pa.int64()).fill_null(1).to_numpy(zero_copy_only=False)
+        _check(errors, 'quantity', quantities < 1, "must be at least 1")
+        columns['quantity'] = quantities
+    else:
+        errors.append({'column': 'quantity', 'message': f"quantity: unsupported type {quantity.type}",
+                       'count': table.num_rows, 'rows': []})
+
+    if 'customer_age' in table.column_names:
+        age = table['customer_age']
+        if pa.types.is_integer(age.type) or pa.types.is_floating(age.type):
+            ages = age.cast(pa.float64()).fill_null(np.nan).to_numpy(zero_copy_only=False)
+            _check(errors, 'customer_age', (ages < 0) | (ages > 120), "must be between 0 and 120")
+            columns['customer_age'] = ages
+        else:
+            errors.append({'column': 'customer_age', 'message': f"customer_age: unsupported type {age.type}",
+                           'count': table.num_rows, 'rows': []})
+    else:
+        columns['customer_age'] = np.full(table.num_rows, np.nan)
+
+    for name, lower in [('medicine_name', False), ('category', True), ('customer_id', False)]:
+        if name not in table.column_names:
+            continue
+        if not (pa.types.is_string(table[name].type) or pa.types.is_large_string(table[name].type)):
+            errors.append({'column': name, 'message': f"{name}: unsupported type {table[name].type}",
+                           'count': table.num_rows, 'rows': []})
+            continue
+        columns[name] = _categorical(table[name], lower)
+
+    if errors:
+        raise BatchError(errors)
+    return pd.DataFrame(columns)
+
+def write_batch(frame: pd.DataFrame) -> bytes:
+    """Arrow IPC stream of a transactions frame (client side / benchmarks)"""
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue().to_pybytes()
@@ -0,0 +1,149 @@
+"""
+State-Level COVID Cube
+Dense date x state x metric array built from the raw COVID datasets by
+10_build_covid_cube.py and read back memory-mapped, so any cell or slice is an
+index computation instead of a CSV scan.
+
+All source metrics are cumulative, so the builder forward-fills each state's
+series: a cell holds the latest value reported on or before that day, and
+MISSING only before the state's first report.
+
+The vaccine file also carries an all-India row. It is not the sum of the
+states (it includes doses not yet assigned to one), so it is kept out of the
+state axis, where it would double count any sum over states, and stored as a
+separate date x metric national series.
+"""
+
+import json
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+
+BASE_DIR = Path(__file__).parent.parent
+CUBE_DIR = BASE_DIR / "datasets" / "cube"
+CUBE_FILE = "covid_cube.npy"
+INDEX_FILE = "covid_cube_index.json"
+NATIONAL_FILE = "covid_national.npy"
+
+# Counts are integral and stay below 2**31, so int32 with a sentinel is exact
+# and half the size of float64
+CUBE_DTYPE = np.int32
+MISSING = -1
+
+# metric name -> (source file, source column)
+METRICS = {
+    'confirmed': ('covid_india.csv', 'Confirmed'),
+    'cured': ('covid_india.csv', 'Cured'),
+    'deaths': ('covid_india.csv', 'Deaths'),
+    'total_samples': ('covid_testing.csv', 'TotalSamples'),
+    'negative': ('covid_testing.csv', 'Negative'),
+    'positive': ('covid_testing.csv', 'Positive'),
+    'total_doses': ('covid_vaccine.csv', 'Total Doses Administered'),
+    'first_dose': ('covid_vaccine.csv', 'First Dose Administered'),
+    'second_dose': ('covid_vaccine.csv', 'Second Dose Administered'),
+    'sessions': ('covid_vaccine.csv', 'Sessions'),
+    'sites': ('covid_vaccine.csv', 'Sites'),
+    'individuals_vaccinated': ('covid_vaccine.csv', 'Total Individuals Vaccinated'),
+}
+
+# Misspellings and footnote markers seen in the raw state columns
+STATE_ALIASES = {
+    'Telengana': 'Telangana',
+    'Himanchal Pradesh': 'Himachal Pradesh',
+    'Karanataka': 'Karnataka',
+    'Bihar****': 'Bihar',
+    'Madhya Pradesh***': 'Madhya Pradesh',
+    'Maharashtra***': 'Maharashtra',
+}
+# Territories reported separately before their 2020 merger; their counts add up
+MERGED_TERRITORIES = {
+    'Daman & Diu': 'Dadra and Nagar Haveli and Daman and Diu',
+    'Dadra and Nagar Haveli': 'Dadra and Nagar Haveli and Daman and Diu',
+}
+# Rows that aren't a region
+NON_STATES = {'Unassigned', 'Cases being reassigned to states'}
+NATIONAL = 'India'
+
+def spell_state(name: str) -> str:
+    """Canonical spelling of a reported name (a constituent territory keeps its own)"""
+    name = str(name).strip()
+    return STATE_ALIASES.get(name, name)
+
+def normalize_state(name: str) -> str:
+    name = spell_state(name)
+    return MERGED_TERRITORIES.get(name, name)
+
+class CovidCube:
+    """Read-only view over the memory-mapped cube"""
+
+    def __init__(self, data: np.ndarray, index: dict, national: Optional[np.ndarray] = None):
+        self.data = data
+        self.national = national  # [date, metric] all-India series, if the sources had one
+        self.start = date.fromisoformat(index['start_date'])
+        self.states = index['states']
+        self.metrics = index['metrics']
+        self._state_idx = {s: i for i, s in enumerate(self.states)}
+        self._metric_idx = {m: i for i, m in enumerate(self.metrics)}
+
+    @classmethod
+    def open(cls, cube_dir: Path = CUBE_DIR) -> Optional["CovidCube"]:
+        """Memory-map the cube; returns None if 10_build_covid_cube.py hasn't been run"""
+        if not (cube_dir / CUBE_FILE).exists():
+            return None
+        index = json.loads((cube_dir / INDEX_FILE).read_text())
+        national = cube_dir / NATIONAL_FILE
+        return cls(np.load(cube_dir / CUBE_FILE, mmap_mode='r'), index,
+                   np.load(national, mmap_mode='r') if national.exists() else None)
+
+    @property
+    def end(self) -> date:
+        return date.fromordinal(self.start.toordinal() + self.data.shape[0] - 1)
+
+    def date_index(self, when: Union[date, datetime, str]) -> int:
+        if isinstance(when, str):
+            when = date.fromisoformat(when[:10])
+        elif isinstance(when, datetime):
+            when = when.date()
+        return when.toordinal() - self.start.toordinal()
+
+    def state_index(self, state: str) -> int:
+        return self._state_idx[normalize_state(state)]
+
+    def state_name(self, state: str) -> str:
+        """Canonical name of a state (or NATIONAL); KeyError if the cube doesn't have it"""
+        name = normalize_state(state)
+        if name == NATIONAL and self.national is not None:
+            return name
+        return self.states[self.state_index(name)]
+
+    def region(self, state: str) -> np.ndarray:
+        """[date, metric] view for one state, or the national series"""
+        if normalize_state(state) == NATIONAL and self.national is not None:
+            return self.national
+        return self.data[:, self.state_index(state)]
+
+    def metric_index(self, metric: str) -> int:
+        return self._metric_idx[metric]
+
+    def value(self, when, state: str, metric: str) -> Optional[int]:
+        """Single cell, or None if unreported / out of range"""
+        d = self.date_index(when)
+        if not 0 <= d < self.data.shape[0]:
+            return None
+        v = int(self.region(state)[d, self.metric_index(metric)])
+        return None if v == MISSING else v
+
+    def series(self, state: str, metric: str, start=None, end=None) -> np.ndarray:
+        """Daily values for one state and metric between start and end (inclusive)"""
+        lo = 0 if start is None else max(self.date_index(start), 0)
+        hi = self.data.shape[0] if end is None else min(self.date_index(end) + 1, self.data.shape[0])
+        return self.region(state)[lo:hi, self.metric_index(metric)]
+
+    def snapshot(self, state: str, when=None) -> dict:
+        """All metrics for a state as of one day (clamped to the cube's date range)"""
+        d = self.data.shape[0] - 1 if when is None else self.date_index(when)
+        d = min(max(d, 0), self.data.shape[0] - 1)
+        row = self.region(state)[d]
+        return {metric: None if v == MISSING else int(v) for metric, v in zip(self.metrics, row)}
@@ -0,0 +1,257 @@
+"""
+Data Quality
+Declarative rules checked over CSV chunks as they stream in. Every rule is a
+vectorized mask over the chunk, so validation costs a few array passes per
+chunk next to the CSV parse itself.
+
+Rows failing any row rule are quarantined (with the names of the rules they
+broke) instead of silently dropped; dataset rules (null rates) are evaluated
+over the whole stream. Per-rule counts and timings go to the stage report.
+A file that doesn't match its schema fails the stage with DataQualityError
+and leaves the previous output in place; so does a run whose dataset rules
+fail or that keeps no rows (the report then has promoted=False).
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Callable, Iterable, Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+QUARANTINE_DIR = BASE_DIR / "datasets" / "quarantine"
+CHUNK_ROWS = int(os.getenv("CLEANING_CHUNK_ROWS", 100_000))
+
+class DataQualityError(Exception):
+    pass
+
+# --- row rules: check(chunk) -> boolean mask of failing rows ---
+
+class Rule:
+    name = "rule"
+
+    def check(self, df: pd.DataFrame) -> np.ndarray:
+        raise NotImplementedError
+
+class Required(Rule):
+    def __init__(self, *columns: str):
+        self.columns = list(columns)
+        self.name = f"required:{','.join(columns)}"
+
+    def check(self, df):
+        return df[self.columns].isna().any(axis=1).to_numpy()
+
+class Typed(Rule):
+    """Coerces the column in place; flags values that were present but didn't parse"""
+
+    def __init__(self, column: str, kind: str, fmt: Optional[str] = None):
+        if kind not in ('datetime', 'numeric'):
+            raise ValueError(f"Unknown type {kind}")
+        self.column, self.kind, self.fmt = column, kind, fmt
+        self.name = f"type:{column}:{kind}"
+
+    def check(self, df):
+        raw = df[self.column]
+        if self.kind == 'datetime':
+            parsed = pd.to_datetime(raw, errors='coerce', format=self.fmt)
+        else:
+            parsed = pd.to_numeric(raw, errors='coerce')
+        df[self.column] = parsed
+        return (parsed.isna() & raw.notna()).to_numpy()
+
+class InRange(Rule):
+    """
+    lo <= value <= hi (either bound optional); missing values pass (see Required).
+    Values are compared as numbers (as datetimes for date bounds); present ones
+    that don't parse fail, so a stray "32C" quarantines its row.
+    """
+
+    def __init__(self, column: str, lo=None, hi=None):
+        self.column = column
+        self.lo = pd.Timestamp(lo) if isinstance(lo, str) else lo
+        self.hi = pd.Timestamp(hi) if isinstance(hi, str) else hi
+        self.name = f"range:{column}"
+
+    def check(self, df):
+        raw = df[self.column]
+        if isinstance(self.lo, pd.Timestamp) or isinstance(self.hi, pd.Timestamp):
+            values = pd.to_datetime(raw, errors='coerce')
+        else:
+            values = pd.to_numeric(raw, errors='coerce')
+        bad = (values.isna() & raw.notna()).to_numpy(copy=True)
+        if self.lo is not None:
+            bad |= (values < self.lo).to_numpy()
+        if self.hi is not None:
+            bad |= (values > self.hi).to_numpy()
+        return bad
+
+class Member(Rule):
+    """Referential check: value must be in a reference set (missing values pass)"""
+
+    def __init__(self, column: str, reference: Callable[[], Iterable], label: str):
+        self.column = column
+        self._reference = reference
+        self._values = None
+        self.name = f"member:{column}:{label}"
+
+    def check(self, df):
+        if self._values is None:
+            self._values = pd.Index(list(self._reference()))
+        values = df[self.column]
+        return (values.notna() & ~values.isin(self._values)).to_numpy()
+
+class Unique(Rule):
+    """No repeated rows (or key columns) across the whole stream; the first copy passes"""
+
+    def __init__(self, columns: Optional[list] = None):
+        self.columns = columns
+        self.name = f"unique:{','.join(columns) if columns else 'row'}"
+        self._seen = set()  # 64-bit row hashes; a hash set keeps the cost linear in rows seen
+
+    def check(self, df):
+        keys = df if self.columns is None else df[self.columns]
+        hashes = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        bad = pd.Series(hashes).duplicated().to_numpy(copy=True)
+        values = hashes.tolist()
+        repeated = self._seen.intersection(values)  # usually empty, so no per-row Python work
+        if repeated:
+            bad |= np.isin(hashes, np.fromiter(repeated, dtype=np.uint64, count=len(repeated)))
+        self._seen.update(values)
+        return bad
+
+# --- dataset rules: evaluated once over the stream ---
+
+class MaxNullRate:
+    def __init__(self, column: str, rate: float):
+        self.column, self.rate = column, rate
+        self.name = f"null_rate:{column}<={rate:g}"
+        self.nulls = self.rows = 0
+
+    def update(self, df: pd.DataFrame):
+        self.nulls += int(df[self.column].isna().sum())
+        self.rows += len(df)
+
+    def result(self) -> dict:
+        observed = self.nulls / self.rows if self.rows else 0.0
+        return {'passed': observed <= self.rate, 'observed': round(observed, 6), 'limit': self.rate}
+
+class Stage:
+    """
+    One dataset: source CSV -> rules -> output CSV + quarantine CSV.
+    prepare(chunk) runs before the rules (renames etc.), transform(chunk) after
+    them on the rows that passed.
+    """
+
+    def __init__(self, name: str, source: Path, output: Path, columns: list, rules: list,
+                 dataset_rules: Optional[list] = None, prepare: Optional[Callable] = None,
+                 transform: Optional[Callable] = None, read_options: Optional[dict] = None):
+        self.name = name
+        self.source, self.output = source, output
+        self.columns = columns
+        self.rules = rules
+        self.dataset_rules = dataset_rules or []
+        self.prepare = prepare
+        self.transform = transform
+        self.read_options = read_options or {}
+
+    def run(self, chunk_rows: int = CHUNK_ROWS) -> dict:
+        QUARANTINE_DIR.mkdir(parents=True, exist_ok=True)
+        self.output.parent.mkdir(parents=True, exist_ok=True)
+        quarantine_path = QUARANTINE_DIR / f"{self.name}.csv"
+        tmp_output = self.output.with_name(self.output.name + ".tmp")
+        tmp_quarantine = quarantine_path.with_name(quarantine_path.name + ".tmp")
+
+        failed = {rule.name: 0 for rule in self.rules}
+        rule_seconds = {rule.name: 0.0 for rule in self.rules}
+        rows = kept = quarantined = 0
+        parse_seconds = write_seconds = 0.0
+        first = True
+
+        reader = pd.read_csv(self.source, chunksize=chunk_rows, **self.read_options)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    chunk = next(reader)
+                except StopIteration:
+                    break
+                if self.prepare is not None:
+                    chunk = self.prepare(chunk)
+                parse_seconds += time.perf_counter() - started
+                if first:
+                    missing = [c for c in self.columns if c not in chunk.columns]
+                    if missing:
+                        raise DataQualityError(f"{self.source.name}: missing columns {missing}")
+                # Typed rules replace columns; quarantined rows keep their raw values
+                raw = chunk.copy(deep=False)
+
+                bad = np.zeros(len(chunk), dtype=bool)
+                masks = []
+                for rule in self.rules:
+                    started = time.perf_counter()
+                    mask = rule.check(chunk)
+                    rule_seconds[rule.name] += time.perf_counter() - started
+                    failed[rule.name] += int(mask.sum())
+                    masks.append(mask)
+                    bad |= mask
+                for rule in self.dataset_rules:
+                    rule.update(chunk)
+
+                started = time.perf_counter()
+                good = chunk[~bad]
+                if self.transform is not None:
+                    good = self.transform(good)
+                good.to_csv(tmp_output, mode='w' if first else 'a', header=first, index=False)
+                if bad.any():
+                    # Names of the broken rules, built for the failing rows only
+                    names = np.array([rule.name for rule in self.rules], dtype=object)
+                    which = np.column_stack(masks)[bad]
+                    rejected = raw[bad].assign(failed_rules=[';'.join(names[row]) for row in which])
+                    rejected.to_csv(tmp_quarantine, mode='a' if quarantined else 'w',
+                                    header=not quarantined, index=False)
+                write_seconds += time.perf_counter() - started
+
+                rows += len(chunk)
+                kept += len(good)
+                quarantined += int(bad.sum())
+                first = False
+        except Exception:
+            for path in (tmp_output, tmp_quarantine):
+                path.unlink(missing_ok=True)
+            raise
+
+        if first:
+            raise DataQualityError(f"{self.source.name}: no rows")
+
+        # Promote only an output that passed; the quarantine is kept either way to show why
+        dataset = {rule.name: rule.result() for rule in self.dataset_rules}
+        passed = kept > 0 and all(r['passed'] for r in dataset.values())
+        if passed:
+            os.replace(tmp_output, self.output)
+        else:
+            tmp_output.unlink(missing_ok=True)
+        if quarantined:
+            os.replace(tmp_quarantine, quarantine_path)
+        else:
+            quarantine_path.unlink(missing_ok=True)
+
+        return {
+            'stage': self.name,
+            'rows': rows,
+            'kept': kept,
+            'quarantined': quarantined,
+            'passed': passed,
+            'promoted': passed,
+            'rules': {name: {'failed': failed[name], 'seconds': round(rule_seconds[name], 4)} for name in failed},
+            'dataset_rules': dataset,
+            'parse_seconds': round(parse_seconds, 4),
+            'rule_seconds': round(sum(rule_seconds.values()), 4),
+            'write_seconds': round(write_seconds, 4),
+        }
+
+def write_report(reports: list, path: Path = QUARANTINE_DIR / "quality_report.json"):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(reports, indent=2))
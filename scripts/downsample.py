@@ -0,0 +1,74 @@
+"""
+Series Downsampling
+Shape-preserving reduction of evenly spaced series to at most n points, for
+trend responses that would otherwise ship thousands of points to the chart.
+
+Both methods return the indices of the points to keep (ascending), so every
+metric of a multi-metric series can be cut with the same selection.
+"""
+
+import numpy as np
+
+METHODS = ['lttb', 'minmax']
+
+def _bucket_edges(length: int, buckets: int) -> np.ndarray:
+    """Edges splitting the interior points 1..length-2 into equal-width, non-empty buckets"""
+    return np.linspace(1, length - 1, buckets + 1).astype(np.int64)
+
+def _first_argmax(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Index of the first maximum of values within each [edges[i], edges[i+1]) bucket"""
+    starts = edges[:-1] - edges[0]
+    bucket = np.repeat(np.arange(len(starts)), np.diff(edges))
+    best = np.maximum.reduceat(values, starts)
+    hits = np.flatnonzero(values == best[bucket])
+    _, first = np.unique(bucket[hits], return_index=True)
+    return hits[first] + edges[0]
+
+def lttb(y: np.ndarray, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets over y sampled at x = 0, 1, 2, ...
+    Keeps the first and last points and, per interior bucket, the point forming
+    the largest triangle with its neighbours. The left neighbour is the previous
+    bucket's mean rather than its selected point, which removes the sequential
+    dependency so all buckets are scored in one vectorized pass.
+    """
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if n >= length or n < 3:
+        return np.arange(length) if n >= length else np.array([0, length - 1])[:max(n, 0)]
+
+    edges = _bucket_edges(length, n - 2)
+    x = np.arange(length, dtype=np.float64)
+    counts = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:-1], edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(y[1:-1], edges[:-1] - 1) / counts
+
+    # Neighbour anchors per bucket: previous mean (first point for bucket 0), next mean (last point at the end)
+    ax = np.concatenate([[x[0]], mean_x[:-1]])
+    ay = np.concatenate([[y[0]], mean_y[:-1]])
+    cx = np.concatenate([mean_x[1:], [x[-1]]])
+    cy = np.concatenate([mean_y[1:], [y[-1]]])
+
+    ax, ay, cx, cy = (np.repeat(v, counts) for v in (ax, ay, cx, cy))
+    px, py = x[1:-1], y[1:-1]
+    area = np.abs((ax - cx) * (py - ay) - (ax - px) * (cy - ay))
+
+    return np.concatenate([[0], _first_argmax(area, edges), [length - 1]])
+
+def minmax(y: np.ndarray, n: int) -> np.ndarray:
+    """Per bucket keep the minimum and the maximum (in time order), plus the end points"""
+    y = np.asarray(y, dtype=np.float64)
+    length = len(y)
+    if n >= length or n < 4:
+        return np.arange(length) if n >= length else lttb(y, n)
+
+    edges = _bucket_edges(length, (n - 2) // 2)
+    lows = _first_argmax(-y[1:-1], edges - 1) + 1
+    highs = _first_argmax(y[1:-1], edges - 1) + 1
+    return np.unique(np.concatenate([[0], lows, highs, [length - 1]]))
+
+def downsample(y: np.ndarray, n: int, method: str = 'lttb') -> np.ndarray:
+    """Indices of at most n points of y chosen by method"""
+    if method not in METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    return lttb(y, n) if method == 'lttb' else minmax(y, n)
@@ -0,0 +1,266 @@
+"""
+Idempotent Ingest
+Client-supplied idempotency keys, so gateway retries are acknowledged
+instead of counted twice.
+
+Every key is checked first against a rotating Bloom filter in process memory:
+a miss means the key is new and costs no I/O. Only hits go to the exact key
+store (SQLite), which tells true duplicates from false positives. Hits are
+claimed in the exact store inside their scoring batch, in one transaction,
+which also catches retries that arrive while the first copy is still queued.
+Misses are only recorded: they join a pending set that get/claim consult and
+that is written behind in bulk every IDEMPOTENCY_FLUSH_SECONDS, so the common
+case never waits on a SQLite write. The filter is warmed from the store at
+startup, so a key from before a restart is still a hit.
+
+A miss is only authoritative when one process sees every key. Workers that
+share a key store (main.py --workers) claim every key exactly, since a retry
+may reach a worker whose filter never saw the first copy.
+
+The filter keeps two generations, each covering half of IDEMPOTENCY_WINDOW_HOURS
+and half of IDEMPOTENCY_BLOOM_MB. Bits and hash count follow from the memory
+budget and IDEMPOTENCY_FP_RATE; a generation also rotates early once it holds
+as many keys as that rate allows, so the false-positive rate stays bounded
+under bursts (the exact store still holds the key for the full window).
+"""
+
+import hashlib
+import math
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+import numpy as np
+
+from anomaly_store import STATE_DIR
+
+BASE_DIR = Path(__file__).parent.parent
+KEY_STORE_PATH = STATE_DIR / "idempotency.db"
+
+IDEMPOTENCY_WINDOW_HOURS = float(os.getenv("IDEMPOTENCY_WINDOW_HOURS", 24))
+IDEMPOTENCY_FP_RATE = float(os.getenv("IDEMPOTENCY_FP_RATE", 0.001))
+IDEMPOTENCY_BLOOM_MB = float(os.getenv("IDEMPOTENCY_BLOOM_MB", 4))
+IDEMPOTENCY_FLUSH_SECONDS = float(os.getenv("IDEMPOTENCY_FLUSH_SECONDS", 1.0))
+IDEMPOTENCY_FLUSH_KEYS = int(os.getenv("IDEMPOTENCY_FLUSH_KEYS", 1024))
+MAX_KEY_LENGTH = 255
+
+_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.int64)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS idempotency_keys (
+    key TEXT PRIMARY KEY,
+    received REAL NOT NULL,         -- epoch seconds of the first copy
+    transaction_id TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_idempotency_received ON idempotency_keys (received);
+"""
+
+class BloomFilter:
+    def __init__(self, bits: int, hashes: int):
+        self.bits = bits
+        self.hashes = hashes
+        # Plain bytearray: per-key probes are a handful of bit tests, cheaper in Python than numpy calls
+        self.array = bytearray((bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key: str) -> list:
+        # Double hashing: k positions from two independent 64-bit halves of one digest
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.bits for i in range(self.hashes)]
+
+    def __contains__(self, key: str) -> bool:
+        array = self.array
+        return all(array[p >> 3] >> (p & 7) & 1 for p in self._positions(key))
+
+    def add(self, key: str):
+        array = self.array
+        for p in self._positions(key):
+            array[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def fill_ratio(self) -> float:
+        return float(_POPCOUNT[np.frombuffer(self.array, dtype=np.uint8)].sum()) / self.bits
+
+class RotatingBloom:
+    """Two-generation Bloom filter remembering keys for between half and all of the window"""
+
+    def __init__(self, window_hours: float = IDEMPOTENCY_WINDOW_HOURS, fp_rate: float = IDEMPOTENCY_FP_RATE,
+                 memory_mb: float = IDEMPOTENCY_BLOOM_MB):
+        if not 0 < fp_rate < 1:
+            raise ValueError(f"IDEMPOTENCY_FP_RATE must be between 0 and 1, got {fp_rate}")
+        self.fp_rate = fp_rate
+        self.generation_seconds = window_hours * 3600 / 2
+        self.bits = max(64, int(memory_mb * 8 * 2 ** 20 / 2))
+        self.hashes = max(1, round(-math.log2(fp_rate)))
+        # Keys one generation holds before its false-positive rate passes fp_rate
+        self.capacity = max(1, int(self.bits * math.log(2) ** 2 / -math.log(fp_rate)))
+
+        self.current = BloomFilter(self.bits, self.hashes)
+        self.previous: Optional[BloomFilter] = None
+        self.started = time.monotonic()
+        self.rotations = 0
+        self.early_rotations = 0
+        self.positives = 0
+        self.confirmed = 0
+
+    def _maybe_rotate(self):
+        aged = time.monotonic() - self.started >= self.generation_seconds
+        full = self.current.count >= self.capacity
+        if aged or full:
+            self.previous, self.current = self.current, BloomFilter(self.bits, self.hashes)
+            self.started = time.monotonic()
+            self.rotations += 1
+            self.early_rotations += int(full and not aged)
+
+    def check_and_add(self, key: str) -> bool:
+        """True if key may have been seen (check the exact store); remembers it either way"""
+        self._maybe_rotate()
+        in_current = key in self.current
+        seen = in_current or (self.previous is not None and key in self.previous)
+        if seen:
+            self.positives += 1
+        if not in_current:
+            self.current.add(key)
+        return seen
+
+    def warm(self, keys: Iterable[str]):
+        """Remember keys already in the exact store (e.g. from before a restart)"""
+        for key in keys:
+            self.current.add(key)
+
+    def metrics(self) -> dict:
+        return {
+            "bits_per_generation": self.bits,
+            "hashes": self.hashes,
+            "capacity_per_generation": self.capacity,
+            "target_fp_rate": self.fp_rate,
+            "keys_current": self.current.count,
+            "fill_current": round(self.current.fill_ratio(), 4),
+            "estimated_fp_rate": round(self.current.fill_ratio() ** self.hashes, 6),
+            "rotations": self.rotations,
+            "early_rotations": self.early_rotations,
+            "bloom_positives": self.positives,
+            "confirmed_duplicates": self.confirmed,
+        }
+
+class KeyStore:
+    """Exact idempotency keys for the window; one connection per process, shared by its threads"""
+
+    def __init__(self, path: Path = KEY_STORE_PATH, window_hours: float = IDEMPOTENCY_WINDOW_HOURS,
+                 flush_seconds: float = IDEMPOTENCY_FLUSH_SECONDS, flush_keys: int = IDEMPOTENCY_FLUSH_KEYS):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.window_seconds = window_hours * 3600
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30.0, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._purged_at = 0.0
+        self.flush_seconds, self.flush_keys = flush_seconds, flush_keys
+        self._pending = {}  # key -> (received, transaction_id), recorded but not written yet
+        self._pending_since = 0.0
+        self.flushes = 0
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def keys(self) -> Iterable[str]:
+        """Keys within the window, for warming a Bloom filter"""
+        with self._lock:
+            rows = self._conn.execute("SELECT key FROM idempotency_keys WHERE received >= ?",
+                                      (time.time() - self.window_seconds,)).fetchall()
+        return [row[0] for row in rows]
+
+    def record(self, rows: list):
+        """
+        Store (key, transaction_id) rows known to be new (Bloom misses) without a
+        conflict check; written in bulk once enough are pending or the oldest is old enough.
+        """
+        now = time.time()
+        with self._lock:
+            if not self._pending:
+                self._pending_since = now
+            for key, transaction_id in rows:
+                self._pending.setdefault(key, (now, transaction_id))
+            due = len(self._pending) >= self.flush_keys or now - self._pending_since >= self.flush_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        """Write pending keys in one transaction"""
+        with self._lock:
+            if not self._pending:
+                return
+            rows = [(key, received, transaction_id, received - self.window_seconds)
+                    for key, (received, transaction_id) in self._pending.items()]
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT INTO idempotency_keys (key, received, transaction_id) VALUES (?, ?, ?) "
+                    "ON CONFLICT (key) DO UPDATE SET received = excluded.received, "
+                    "transaction_id = excluded.transaction_id WHERE received < ?", rows)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending.clear()
+            self.flushes += 1
+
+    def metrics(self) -> dict:
+        return {"pending_keys": len(self._pending), "key_flushes": self.flushes}
+
+    def get(self, key: str) -> Optional[str]:
+        """transaction_id of the first copy of key within the window, if any"""
+        with self._lock:
+            pending = self._pending.get(key)
+            if pending is not None:
+                return pending[1]
+            row = self._conn.execute("SELECT transaction_id FROM idempotency_keys WHERE key = ? AND received >= ?",
+                                     (key, time.time() - self.window_seconds)).fetchone()
+        return row[0] if row else None
+
+    def claim(self, rows: list) -> list:
+        """
+        Claim (key, transaction_id) rows in one transaction.
+        Returns, per row, None if it got the key or the transaction_id that already holds it.
+        """
+        now = time.time()
+        taken = []
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if now - self._purged_at > self.window_seconds / 2:
+                    self._conn.execute("DELETE FROM idempotency_keys WHERE received < ?", (now - self.window_seconds,))
+                    self._purged_at = now
+                for key, transaction_id in rows:
+                    pending = self._pending.get(key)
+                    if pending is not None:
+                        taken.append(pending[1])
+                        continue
+                    # A key whose first copy has left the window (but isn't purged yet) is new again
+                    inserted = self._conn.execute(
+                        "INSERT INTO idempotency_keys (key, received, transaction_id) VALUES (?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET received = excluded.received, "
+                        "transaction_id = excluded.transaction_id WHERE received < ?",
+                        (key, now, transaction_id, now - self.window_seconds)).rowcount
+                    taken.append(None if inserted else self._conn.execute(
+                        "SELECT transaction_id FROM idempotency_keys WHERE key = ?", (key,)).fetchone()[0])
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return taken
+
+    def release(self, rows: list):
+        """Give back (key, transaction_id) claims whose work failed, so a retry is scored rather than a duplicate"""
+        with self._lock:
+            for key, transaction_id in rows:
+                if self._pending.get(key, (None, None))[1] == transaction_id:
+                    del self._pending[key]
+            self._conn.executemany("DELETE FROM idempotency_keys WHERE key = ? AND transaction_id = ?", rows)
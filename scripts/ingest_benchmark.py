@@ -0,0 +1,104 @@
+"""
+Ingest Benchmark
+Starts the API in a subprocess and pushes the same synthetic transactions
+through JSON ingest (one row per request, many concurrent clients) and
+through Arrow ingest (one IPC stream per batch), then prints rows/s for each.
+Requests shed with 429 are retried after a short pause, so both sides count
+only rows that were actually scored.
+
+    python scripts/ingest_benchmark.py
+    python scripts/ingest_benchmark.py --rows 50000 --batch 10000
+    python scripts/ingest_benchmark.py --url http://localhost:8000   # against a running server
+"""
+
+import argparse
+import asyncio
+import time
+
+import httpx
+import numpy as np
+import pandas as pd
+
+from columnar_ingest import write_batch, ARROW_MEDIA_TYPE, COLUMNAR_AVAILABLE
+from stress_test import PINCODES, free_port, start_server, wait_ready
+
+def synthetic_rows(n: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'timestamp': pd.Timestamp.now().normalize() + pd.to_timedelta(np.sort(rng.integers(0, 86400, n)), unit='s'),
+        'pincode': rng.choice(PINCODES, n),
+        'medicine_name': rng.choice([f"Med_{i}" for i in range(50)], n),
+        'category': rng.choice(['fever', 'cold', 'cough', 'vitamin'], n),
+        'quantity': rng.integers(1, 4, n),
+        'customer_age': rng.integers(1, 90, n),
+    })
+
+async def post_until_accepted(client: httpx.AsyncClient, **kwargs) -> httpx.Response:
+    while True:
+        response = await client.post(**kwargs)
+        if response.status_code != 429:
+            response.raise_for_status()
+            return response
+        await asyncio.sleep(0.05)
+
+async def bench_json(client: httpx.AsyncClient, rows: pd.DataFrame, clients: int) -> float:
+    records = rows.assign(timestamp=rows['timestamp'].dt.strftime('%Y-%m-%dT%H:%M:%S')).to_dict('records')
+    records = [{k: (int(v) if isinstance(v, np.integer) else v) for k, v in r.items()} for r in records]
+    queue = asyncio.Queue()
+    for record in records:
+        queue.put_nowait(record)
+
+    async def worker():
+        while not queue.empty():
+            await post_until_accepted(client, url="/api/transactions", json=queue.get_nowait())
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(clients)))
+    return time.perf_counter() - started
+
+async def bench_arrow(client: httpx.AsyncClient, rows: pd.DataFrame, batch: int) -> float:
+    bodies = [write_batch(rows.iloc[i:i + batch]) for i in range(0, len(rows), batch)]
+    started = time.perf_counter()
+    for body in bodies:
+        await post_until_accepted(client, url="/api/transactions/arrow", content=body,
+                                  headers={"content-type": ARROW_MEDIA_TYPE})
+    return time.perf_counter() - started
+
+async def run(args):
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        server = start_server(port, unbounded=False)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        async with httpx.AsyncClient(base_url=url, timeout=120.0) as client:
+            await wait_ready(client)
+            json_rows = synthetic_rows(args.json_rows, seed=1)
+            arrow_rows = synthetic_rows(args.rows, seed=2)
+
+            seconds = await bench_json(client, json_rows, args.clients)
+            print(f"JSON   {len(json_rows):>8,} rows in {seconds:6.2f} s  {len(json_rows) / seconds:>10,.0f} rows/s"
+                  f"  ({args.clients} clients, 1 row/request)")
+            seconds = await bench_arrow(client, arrow_rows, args.batch)
+            print(f"Arrow  {len(arrow_rows):>8,} rows in {seconds:6.2f} s  {len(arrow_rows) / seconds:>10,.0f} rows/s"
+                  f"  ({args.batch:,} rows/batch)")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON vs Arrow ingest throughput")
+    parser.add_argument("--url", help="Benchmark a running server instead of starting one")
+    parser.add_argument("--rows", type=int, default=100_000, help="Rows sent as Arrow")
+    parser.add_argument("--json-rows", type=int, default=2_000, help="Rows sent as JSON")
+    parser.add_argument("--batch", type=int, default=20_000, help="Rows per Arrow batch")
+    parser.add_argument("--clients", type=int, default=32, help="Concurrent JSON clients")
+    args = parser.parse_args()
+    if not COLUMNAR_AVAILABLE:
+        parser.error("pyarrow is required: pip install pyarrow")
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
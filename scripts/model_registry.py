@@ -0,0 +1,174 @@
+"""
+Versioned Model Registry
+Publishes retrained model artifacts and hot-swaps them into the running API.
+
+Layout under models/:
+    versions/<version>/*.pkl + manifest.json   immutable published artifacts
+    CURRENT                                    name of the live version
+The top-level *.pkl files written by 07_train_models.py act as the baseline
+version and fill in any artifact a published version doesn't override.
+"""
+
+import json
+import logging
+import os
+import threading
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import joblib
+import pandas as pd
+
+from attributions import compile_explainers
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = Path(__file__).parent.parent
+MODEL_DIR = BASE_DIR / "models"
+
+MODEL_FILES = {
+    'anomaly_detector': "anomaly_detector.pkl",
+    'scaler': "scaler.pkl",
+    'severity_classifier': "severity_classifier.pkl",
+    'classifier_scaler': "classifier_scaler.pkl",
+}
+
+# Column order the scalers were fitted with (see 07_train_models.py)
+DETECTOR_FEATURES = ['transaction_count', 'day_of_week', 'temperature', 'humidity', 'baseline_30d']
+CLASSIFIER_FEATURES = ['transaction_count', 'baseline_30d', 'day_of_week', 'temperature', 'humidity']
+
+BASELINE_VERSION = "baseline"
+
+@dataclass(frozen=True)
+class ModelBundle:
+    """An immutable, fully loaded set of models. Requests hold one for their whole lifetime."""
+    version: str
+    models: dict = field(default_factory=dict)
+    metrics: dict = field(default_factory=dict)
+    explainers: dict = field(default_factory=dict)  # model name -> CompiledForest (attributions.py)
+    loaded_at: datetime = field(default_factory=datetime.now)
+
+def _write_atomic(path: Path, text: str):
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+def current_version(model_dir: Path = MODEL_DIR) -> str:
+    pointer = model_dir / "CURRENT"
+    if pointer.exists():
+        version = pointer.read_text().strip()
+        if version and (model_dir / "versions" / version).is_dir():
+            return version
+    return BASELINE_VERSION
+
+def publish_version(artifacts: dict, metrics: dict, model_dir: Path = MODEL_DIR) -> str:
+    """
+    Write artifacts to a fresh version directory and flip CURRENT to it.
+    The directory is renamed into place before the pointer moves, so a reader
+    never observes a half-written version.
+    """
+    versions_dir = model_dir / "versions"
+    versions_dir.mkdir(parents=True, exist_ok=True)
+
+    version = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    staging = versions_dir / f".staging_{version}"
+    staging.mkdir()
+
+    for name, obj in artifacts.items():
+        joblib.dump(obj, staging / MODEL_FILES[name])
+
+    manifest = {
+        'version': version,
+        'parent': current_version(model_dir),
+        'artifacts': sorted(artifacts),
+        'metrics': metrics,
+        'published_at': datetime.now().isoformat(),
+    }
+    (staging / "manifest.json").write_text(json.dumps(manifest, indent=2, default=str))
+
+    os.replace(staging, versions_dir / version)
+    _write_atomic(model_dir / "CURRENT", version)
+    logger.info(f"✓ Published model version {version}")
+    return version
+
+def load_bundle(model_dir: Path = MODEL_DIR, version: Optional[str] = None) -> ModelBundle:
+    """Load a version's artifacts, falling back to the baseline files for anything it doesn't override"""
+    version = version or current_version(model_dir)
+    version_dir = model_dir / "versions" / version
+    metrics = {}
+    if version != BASELINE_VERSION:
+        metrics = json.loads((version_dir / "manifest.json").read_text()).get('metrics', {})
+
+    models = {}
+    for name, filename in MODEL_FILES.items():
+        path = version_dir / filename
+        if not path.exists():
+            path = model_dir / filename
+        if path.exists():
+            models[name] = joblib.load(path)
+
+    return ModelBundle(version=version, models=models, metrics=metrics, explainers=compile_explainers(models))
+
+def warm_bundle(bundle: ModelBundle):
+    """Run one prediction through every model so the first live request doesn't pay for lazy init"""
+    row = {'transaction_count': 1.0, 'day_of_week': 0, 'temperature': 30.0,
+           'humidity': 70.0, 'baseline_30d': 1.0}
+    m = bundle.models
+    if 'scaler' in m and 'anomaly_detector' in m:
+        m['anomaly_detector'].predict(m['scaler'].transform(pd.DataFrame([row])[DETECTOR_FEATURES]))
+    if 'classifier_scaler' in m and 'severity_classifier' in m:
+        m['severity_classifier'].predict(
+            m['classifier_scaler'].transform(pd.DataFrame([row])[CLASSIFIER_FEATURES]))
+    for explainer in bundle.explainers.values():
+        explainer.explain([[row[f] for f in DETECTOR_FEATURES]])
+
+class ModelRegistry:
+    """
+    Double-buffered holder for the serving models.
+    A new version is loaded and warmed into the standby slot off the request
+    path, then the slots are swapped with a single reference assignment.
+    In-flight requests keep the bundle they started with.
+    """
+
+    def __init__(self, model_dir: Path = MODEL_DIR):
+        self.model_dir = model_dir
+        self._active: Optional[ModelBundle] = None
+        self._standby: Optional[ModelBundle] = None
+        self._swap_lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+    @property
+    def active(self) -> ModelBundle:
+        bundle = self._active
+        return bundle if bundle is not None else ModelBundle(version="none")
+
+    @property
+    def previous(self) -> Optional[ModelBundle]:
+        return self._standby
+
+    # Dict-style access to the active bundle, for code that only needs one model
+    def __getitem__(self, name):
+        return self.active.models[name]
+
+    def __contains__(self, name):
+        return name in self.active.models
+
+    def __len__(self):
+        return len(self.active.models)
+
+    def reload(self, force: bool = False) -> bool:
+        """Load CURRENT into the standby slot and swap it in. Returns True if a swap happened."""
+        with self._load_lock:
+            version = current_version(self.model_dir)
+            if not force and self._active is not None and self._active.version == version:
+                return False
+
+            staged = load_bundle(self.model_dir, version)
+            warm_bundle(staged)
+
+            with self._swap_lock:
+                self._standby, self._active = self._active, staged
+        logger.info(f"✓ Serving model version {version}")
+        return True
@@ -0,0 +1,321 @@
+"""
+Shared Pincode State
+Per-pincode counters, baselines and severity in one shared-memory segment, so
+every uvicorn worker ingests into and serves from the same numbers.
+
+Layout: a small header followed by a fixed-size array of SLOT_DTYPE records.
+The slots are split into stripes; a pincode always lives in stripe
+(pincode % stripes) and is placed by linear probing inside that stripe's block.
+Each stripe is guarded by a byte-range lock on a shared lock file (fcntl), so
+writers to different stripes never contend and readers take shared locks.
+
+Writes are refused (ValueError, nothing changed) for keys that aren't a
+six-digit pincode or a region key, and for timestamps more than MAX_FUTURE
+ahead of the clock: one 2099 transaction would otherwise move the pincode's
+and its regions' current day forward and freeze their day counts. Days older
+than a slot's current day count towards its totals but not its day_count.
+"""
+
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from multiprocessing import shared_memory
+from typing import Optional
+
+import numpy as np
+
+from rollup_cube import epoch_seconds, future_horizon, EPOCH, MAX_FUTURE
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process locking only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SHM_ENV = "FLU_RADAR_SHM"
+DEFAULT_CAPACITY = int(os.getenv("PINCODE_CAPACITY", 65536))
+DEFAULT_STRIPES = int(os.getenv("PINCODE_STRIPES", 64))
+
+BASELINE_ALPHA = 1 / 30  # EWMA weight per completed day, ~ a 30-day mean
+SEVERITIES = ['green', 'yellow', 'orange', 'red']
+
+MAGIC = 0x464C5531  # "FLU1"
+HEADER_DTYPE = np.dtype([('magic', np.uint32), ('capacity', np.uint32), ('stripes', np.uint32)])
+HEADER_BYTES = 64
+
+ORDINAL_1970 = datetime(1970, 1, 1).toordinal()  # days since 1970 + this = date.toordinal()
+PINCODE_MIN, PINCODE_MAX = 100000, 999999  # six digits, no leading zero
+KEY_MIN = -2 ** 31 + 1  # region keys are negative; anything below doesn't fit the int32 slot key
+
+SLOT_DTYPE = np.dtype([
+    ('pincode', np.int32),      # 0 = empty slot; negative keys are districts/states (regions.py)
+    ('severity', np.int8),      # index into SEVERITIES
+    ('day', np.int32),          # ordinal of the day day_count belongs to
+    ('day_count', np.int64),    # transactions so far on `day`
+    ('transactions', np.int64),
+    ('quantity', np.int64),
+    ('anomalies', np.int64),
+    ('baseline', np.float64),   # EWMA of completed daily counts
+    ('last_seen', np.float64),  # epoch seconds (epoch_seconds: naive taken as UTC), like the anomaly store
+    ('last_alert', np.float64),
+], align=True)
+
+def is_pincode(code: int) -> bool:
+    return PINCODE_MIN <= code <= PINCODE_MAX
+
+def _check_key(key: int):
+    if not (is_pincode(key) or KEY_MIN <= key < 0):
+        raise ValueError(f"{key} is neither a six-digit pincode nor a region key")
+
+def _check_seen(seen: int):
+    if seen > future_horizon():
+        raise ValueError(f"Timestamp {epoch_to_datetime(seen).isoformat()} is more than "
+                         f"{MAX_FUTURE} ahead of the clock")
+
+def severity_code(severity: str) -> int:
+    return SEVERITIES.index(severity) if severity in SEVERITIES else 0
+
+class PincodeState:
+    """Handle on the shared segment; one per process"""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self.shm = shm
+        self.owner = owner
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)[0]
+        if header['magic'] != MAGIC:
+            raise ValueError(f"Shared memory {shm.name} is not a pincode state segment")
+        self.capacity = int(header['capacity'])
+        self.stripes = int(header['stripes'])
+        self.block = self.capacity // self.stripes
+        self.slots = np.ndarray((self.capacity,), dtype=SLOT_DTYPE, buffer=shm.buf, offset=HEADER_BYTES)
+
+        # Slots never move once assigned, so each process can cache lookups
+        self._slot_cache = {}
+        self._lock_fd = os.open(os.path.join(tempfile.gettempdir(), f"{shm.name}.lock"),
+                                os.O_RDWR | os.O_CREAT, 0o600)
+        self._local_locks = [threading.Lock() for _ in range(self.stripes)]
+
+    @classmethod
+    def create(cls, capacity: int = DEFAULT_CAPACITY, stripes: int = DEFAULT_STRIPES,
+               name: Optional[str] = None) -> "PincodeState":
+        capacity -= capacity % stripes
+        size = HEADER_BYTES + capacity * SLOT_DTYPE.itemsize
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm.buf[:size] = bytes(size)
+        header = np.ndarray((1,), dtype=HEADER_DTYPE, buffer=shm.buf)
+        header[0] = (MAGIC, capacity, stripes)
+        logger.info(f"✓ Created pincode state {shm.name} ({capacity:,} slots, {size / 1e6:.1f} MB)")
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "PincodeState":
+        # Workers are children of the owning supervisor and share its resource
+        # tracker, so attaching doesn't schedule a second unlink
+        shm = shared_memory.SharedMemory(name=name)
+        return cls(shm, owner=False)
+
+    @classmethod
+    def from_env(cls) -> "PincodeState":
+        """Attach to the segment named in FLU_RADAR_SHM, or create a private one"""
+        name = os.getenv(SHM_ENV)
+        return cls.attach(name) if name else cls.create()
+
+    def close(self):
+        os.close(self._lock_fd)
+        self.slots = None
+        self.shm.close()
+        if self.owner:
+            self.shm.unlink()
+            try:
+                os.unlink(os.path.join(tempfile.gettempdir(), f"{self.shm.name}.lock"))
+            except OSError:
+                pass
+
+    # --- locking ---
+
+    @contextmanager
+    def _stripe_lock(self, stripe: int, exclusive: bool):
+        # The thread lock covers threads of this process (fcntl locks are per process)
+        with self._local_locks[stripe]:
+            if fcntl is not None:
+                fcntl.lockf(self._lock_fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH, 1, stripe)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._lock_fd, fcntl.LOCK_UN, 1, stripe)
+
+    # --- slot lookup ---
+
+    def _find(self, pincode: int, insert: bool) -> Optional[int]:
+        """Slot index for a pincode; caller holds the stripe lock"""
+        cached = self._slot_cache.get(pincode)
+        if cached is not None:
+            return cached
+
+        start = (pincode % self.stripes) * self.block
+        keys = self.slots['pincode']
+        for i in range(start, start + self.block):
+            if keys[i] == pincode:
+                self._slot_cache[pincode] = i
+                return i
+            if keys[i] == 0:
+                if not insert:
+                    return None
+                keys[i] = pincode
+                self._slot_cache[pincode] = i
+                return i
+        raise MemoryError(f"Pincode state stripe {pincode % self.stripes} is full")
+
+    # --- writes ---
+
+    def record_transaction(self, pincode: int, quantity: int, when: datetime, parents: tuple = ()) -> dict:
+        """
+        Count a transaction and return the features the detector needs.
+        parents are region keys (district, state) the transaction also rolls up into.
+        """
+        seen = epoch_seconds(when)
+        _check_seen(seen)
+        for key in (pincode, *parents):
+            _check_key(key)
+        day = seen // 86400 + ORDINAL_1970
+        day_count, baseline, _ = self._record(pincode, day, 1, quantity, seen)
+        for key in parents:
+            self._record(key, day, 1, quantity, seen)
+        return {'transaction_count': day_count, 'baseline_30d': baseline or float(day_count)}
+
+    def record_batch(self, pincodes: np.ndarray, quantities: np.ndarray, timestamps: np.ndarray,
+                     parents: dict) -> tuple:
+        """
+        record_transaction for parallel arrays (timestamps as naive datetime64), taking
+        each stripe lock once per (day, pincode) group rather than once per row.
+        parents maps each pincode to its region keys. Returns per-row
+        (transaction_count, baseline_30d) arrays, as if the rows arrived in day order.
+        """
+        n = len(pincodes)
+        if n:
+            _check_seen(int(timestamps.max().astype('datetime64[s]').astype(np.int64)))
+            for key in np.unique(pincodes).tolist():
+                for k in (key, *parents.get(key, ())):
+                    _check_key(k)
+        days = timestamps.astype('datetime64[D]').astype(np.int64) + ORDINAL_1970
+        order = np.lexsort((np.arange(n), pincodes, days))
+        sorted_days, sorted_keys = days[order], pincodes[order]
+        starts = np.flatnonzero(np.r_[True, (sorted_days[1:] != sorted_days[:-1]) |
+                                      (sorted_keys[1:] != sorted_keys[:-1])])
+        ends = np.r_[starts[1:], n]
+        quantity_sums = np.add.reduceat(quantities[order], starts) if n else np.array([])
+        latest = np.maximum.reduceat(timestamps[order], starts) if n else timestamps[:0]
+
+        counts = np.empty(n, dtype=np.int64)
+        baselines = np.empty(n, dtype=np.float64)
+        for start, end, quantity, last in zip(starts, ends, quantity_sums, latest):
+            key, day, size = int(sorted_keys[start]), int(sorted_days[start]), int(end - start)
+            seen = int(last.astype('datetime64[s]').astype(np.int64))
+            day_count, baseline, current = self._record(key, day, size, int(quantity), seen)
+            for parent in parents.get(key, ()):
+                self._record(parent, day, size, int(quantity), seen)
+            rows = order[start:end]
+            counts[rows] = np.arange(day_count - size + 1, day_count + 1) if current else day_count
+            baselines[rows] = baseline
+        return counts, np.where(baselines > 0, baselines, counts.astype(np.float64))
+
+    def _record(self, key: int, day: int, count: int, quantity: int, seen: float) -> tuple:
+        """Add count transactions on day to key; returns (day_count, baseline, whether day is current)"""
+        with self._stripe_lock(key % self.stripes, exclusive=True):
+            slot = self.slots[self._find(key, insert=True)]
+
+            if day > slot['day']:
+                if slot['day']:
+                    finished = float(slot['day_count'])
+                    gap = day - int(slot['day']) - 1
+                    baseline = float(slot['baseline'])
+                    baseline = finished if baseline == 0 else baseline + BASELINE_ALPHA * (finished - baseline)
+                    slot['baseline'] = baseline * (1 - BASELINE_ALPHA) ** gap
+                slot['day'] = day
+                slot['day_count'] = 0
+
+            current = day == slot['day']
+            if current:
+                slot['day_count'] += count
+            slot['transactions'] += count
+            slot['quantity'] += quantity
+            slot['last_seen'] = max(float(slot['last_seen']), seen)
+
+            return int(slot['day_count']), float(slot['baseline']), current
+
+    def set_severity(self, pincode: int, severity: str, is_anomaly: bool, when: datetime, parents: tuple = ()):
+        seen = epoch_seconds(when)
+        _check_key(pincode)
+        self._set_severity(pincode, severity_code(severity), int(is_anomaly), seen if is_anomaly else 0.0)
+        if is_anomaly:
+            # Regions only accumulate anomalies; their severity is derived from their counts
+            for key in parents:
+                self._set_severity(key, None, 1, seen)
+
+    def set_severity_batch(self, pincodes: np.ndarray, severities: np.ndarray, is_anomaly: np.ndarray,
+                           timestamps: np.ndarray, parents: dict):
+        """set_severity for parallel arrays: last severity per pincode wins, anomalies are summed"""
+        keys, inverse = np.unique(pincodes, return_inverse=True)
+        last_row = np.zeros(len(keys), dtype=np.int64)
+        np.maximum.at(last_row, inverse, np.arange(len(pincodes)))
+        anomalies = np.bincount(inverse, weights=is_anomaly, minlength=len(keys)).astype(np.int64)
+        for i, key in enumerate(keys.tolist()):
+            flagged = timestamps[(inverse == i) & is_anomaly]
+            last_alert = int(flagged.max().astype('datetime64[s]').astype(np.int64)) if len(flagged) else 0.0
+            self._set_severity(key, severity_code(severities[last_row[i]]), int(anomalies[i]), last_alert)
+            if anomalies[i]:
+                for parent in parents.get(key, ()):
+                    self._set_severity(parent, None, int(anomalies[i]), last_alert)
+
+    def _set_severity(self, key: int, code: Optional[int], anomalies: int, last_alert: float):
+        with self._stripe_lock(key % self.stripes, exclusive=True):
+            slot = self.slots[self._find(key, insert=True)]
+            if code is not None:
+                slot['severity'] = code
+            if anomalies:
+                slot['anomalies'] += anomalies
+                slot['last_alert'] = max(float(slot['last_alert']), last_alert)
+
+    # --- reads ---
+
+    @staticmethod
+    def _as_dict(row) -> dict:
+        return {
+            'key': int(row['pincode']),
+            'pincode': str(int(row['pincode'])),
+            'severity': SEVERITIES[int(row['severity'])],
+            'transactions': int(row['transactions']),
+            'quantity': int(row['quantity']),
+            'anomalies': int(row['anomalies']),
+            'today_count': int(row['day_count']),
+            'baseline': float(row['baseline']),
+            'last_seen': float(row['last_seen']),
+            'last_alert': float(row['last_alert']),
+        }
+
+    def get(self, pincode: int) -> Optional[dict]:
+        with self._stripe_lock(pincode % self.stripes, exclusive=False):
+            i = self._find(pincode, insert=False)
+            return None if i is None else self._as_dict(self.slots[i].copy())
+
+    def snapshot(self) -> list:
+        """Copy of every occupied slot, each stripe read under its shared lock"""
+        rows = []
+        for stripe in range(self.stripes):
+            start = stripe * self.block
+            with self._stripe_lock(stripe, exclusive=False):
+                block = self.slots[start:start + self.block].copy()
+            rows.extend(self._as_dict(r) for r in block[block['pincode'] != 0])
+        return rows
+
+    def __len__(self) -> int:
+        return int(np.count_nonzero(self.slots['pincode']))
+
+def epoch_to_datetime(ts: float) -> Optional[datetime]:
+    """Inverse of epoch_seconds: naive UTC, whatever the host's timezone"""
+    return EPOCH + timedelta(seconds=ts) if ts else None
@@ -0,0 +1,121 @@
+"""
+Pincode Hierarchy
+pincode -> district -> state mapping from datasets/raw/pincode_directory.csv,
+with district populations joined from census_data.csv for per-capita rates.
+
+Districts and states are aggregated in the shared pincode state next to the
+pincodes themselves, under negative keys, so every ingest rolls its counts up
+the hierarchy and any zoom level is served from maintained counters. Ids are
+assigned from the sorted directory, so every worker derives the same keys.
+"""
+
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+RAW_DIR = BASE_DIR / "datasets" / "raw"
+
+LEVELS = ['pincode', 'district', 'state']
+UNMAPPED = "Unmapped"
+STATE_KEY_BASE = 100000  # district keys are -1 .. -STATE_KEY_BASE, state keys below that
+
+# Postal circle by leading pincode digits, for pincodes missing from the directory
+STATE_PREFIXES = {'40': 'Maharashtra', '41': 'Maharashtra', '42': 'Maharashtra',
+                  '43': 'Maharashtra', '44': 'Maharashtra'}
+
+PER_CAPITA = 100_000
+
+# today's count vs baseline -> severity, for regions (pincodes get theirs from the detector)
+SEVERITY_RATIOS = [(3.0, 'red'), (2.0, 'orange'), (1.5, 'yellow')]
+
+def district_key(district_id: int) -> int:
+    return -(1 + district_id)
+
+def state_key(state_id: int) -> int:
+    return -(STATE_KEY_BASE + state_id)
+
+def ratio_severity(today: int, baseline: float) -> str:
+    if baseline > 0:
+        for ratio, severity in SEVERITY_RATIOS:
+            if today > ratio * baseline:
+                return severity
+    return 'green'
+
+class RegionIndex:
+    def __init__(self, directory: pd.DataFrame, census: pd.DataFrame):
+        directory = directory.assign(pincode=directory['pincode'].astype(int))
+        self.states = sorted(set(directory['state']) | set(STATE_PREFIXES.values())) + [UNMAPPED]
+        state_ids = {s: i for i, s in enumerate(self.states)}
+
+        # Every state gets an Unmapped district for pincodes the directory doesn't list
+        pairs = set(zip(directory['district'], directory['state'])) | {(UNMAPPED, s) for s in self.states}
+        self.districts = sorted(pairs, key=lambda p: (p[1], p[0]))  # (district, state)
+        district_ids = {p: i for i, p in enumerate(self.districts)}
+        self.district_state = [state_ids[s] for _, s in self.districts]
+
+        self.pincode_district = {
+            int(row.pincode): district_ids[(row.district, row.state)] for row in directory.itertuples()
+        }
+        self.pincode_office = dict(zip(directory['pincode'], directory['office']))
+
+        population = census.set_index('district')['population']
+        self.district_population = [
+            int(population[d]) if d in population.index else None for d, _ in self.districts
+        ]
+        self.state_population = [0] * len(self.states)
+        for district_id, pop in enumerate(self.district_population):
+            if pop is not None:
+                self.state_population[self.district_state[district_id]] += pop
+
+        self._keys = {}
+
+    @classmethod
+    def load(cls, raw_dir: Path = RAW_DIR) -> "RegionIndex":
+        directory_path = raw_dir / "pincode_directory.csv"
+        directory = pd.read_csv(directory_path) if directory_path.exists() else \
+            pd.DataFrame(columns=['pincode', 'office', 'district', 'state'])
+        census_path = raw_dir / "census_data.csv"
+        census = pd.read_csv(census_path) if census_path.exists() else pd.DataFrame(columns=['district', 'population'])
+        return cls(directory, census)
+
+    def district_of(self, pincode: int) -> int:
+        district_id = self.pincode_district.get(pincode)
+        if district_id is None:
+            state = STATE_PREFIXES.get(str(pincode)[:2], UNMAPPED)
+            district_id = self.districts.index((UNMAPPED, state))
+            self.pincode_district[pincode] = district_id
+        return district_id
+
+    def parent_keys(self, pincode: int) -> tuple:
+        """Shared-state keys of the pincode's district and state"""
+        keys = self._keys.get(pincode)
+        if keys is None:
+            district_id = self.district_of(pincode)
+            keys = self._keys[pincode] = (district_key(district_id), state_key(self.district_state[district_id]))
+        return keys
+
+    def level_of(self, key: int) -> str:
+        if key > 0:
+            return 'pincode'
+        return 'district' if key > -STATE_KEY_BASE else 'state'
+
+    def describe(self, key: int) -> dict:
+        """Name, parent and population of a shared-state key"""
+        level = self.level_of(key)
+        if level == 'pincode':
+            district_id = self.district_of(key)
+            return {'level': level, 'region': str(key), 'name': self.pincode_office.get(key, str(key)),
+                    'parent': self.districts[district_id][0], 'population': None}
+        if level == 'district':
+            district_id = -key - 1
+            name, state = self.districts[district_id]
+            return {'level': level, 'region': name, 'name': name, 'parent': state,
+                    'population': self.district_population[district_id]}
+        state_id = -key - STATE_KEY_BASE
+        return {'level': level, 'region': self.states[state_id], 'name': self.states[state_id],
+                'parent': None, 'population': self.state_population[state_id] or None}
+
+def per_capita(count: int, population: Optional[int]) -> Optional[float]:
+    return round(count * PER_CAPITA / population, 3) if population else None
@@ -0,0 +1,243 @@
+"""
+Trend Rollup Cube
+Pre-aggregated transaction counts and quantities at hour, day and week
+granularity, broken down by pincode and category (both as code-book codes).
+
+Each level is a dense array [time bucket, pincode, category, metric] where
+index 0 on the pincode and category axes holds the total over all of them.
+A trend query for any pincode/category combination is therefore a slice of
+one time row range: O(points returned), no raw rows touched. Ingest updates
+four cells per level in O(1) (amortized, the arrays grow by doubling).
+
+The arrays stay bounded whatever timestamps clients send. Each level keeps a
+retention window behind its newest bucket (older rows are dropped and the
+window slides forward). Timestamps more than MAX_FUTURE ahead of the clock
+are refused, and no level grows past MAX_LEVEL_BYTES. Transactions that
+don't fit are counted in `dropped` instead of raising.
+"""
+
+import logging
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+EPOCH = datetime(1970, 1, 1)
+ALL = -1  # pincode_id / category_id meaning "all"
+
+# granularity -> (bucket width in seconds, offset so buckets start on a boundary)
+GRANULARITIES = {
+    'hour': (3600, 0),
+    'day': (86400, 0),
+    'week': (7 * 86400, 3 * 86400),  # 1970-01-01 was a Thursday; shift so weeks start Monday
+}
+METRICS = ['transactions', 'quantity']
+
+# Days of history each level keeps behind its newest bucket
+RETENTION_DAYS = {
+    'hour': int(os.getenv("ROLLUP_HOUR_DAYS", 92)),
+    'day': int(os.getenv("ROLLUP_DAY_DAYS", 3 * 366)),
+    'week': int(os.getenv("ROLLUP_WEEK_DAYS", 10 * 366)),
+}
+MAX_FUTURE = timedelta(hours=float(os.getenv("ROLLUP_MAX_FUTURE_HOURS", 24)))
+MAX_LEVEL_BYTES = int(os.getenv("ROLLUP_MAX_LEVEL_MB", 512)) * 2 ** 20
+
+class RollupFull(Exception):
+    pass
+
+def epoch_seconds(ts: datetime) -> int:
+    """Naive timestamps are taken as-is; aware ones are converted to UTC first"""
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return int((ts - EPOCH).total_seconds())
+
+def future_horizon() -> int:
+    """Newest epoch second ingest accepts: now (UTC) plus MAX_FUTURE"""
+    return epoch_seconds(datetime.now(timezone.utc) + MAX_FUTURE)
+
+class _Level:
+    """One granularity: a growable dense [bucket, pincode+1, category+1, metric] array"""
+
+    def __init__(self, width: int, offset: int, retention_days: int, max_bytes: int = MAX_LEVEL_BYTES):
+        self.width = width
+        self.offset = offset
+        self.retention = max(1, retention_days * 86400 // width)  # buckets kept
+        self.max_bytes = max_bytes
+        self.origin = 0  # bucket number of row 0
+        self.top = None  # newest bucket seen
+        self.data = np.zeros((0, 1, 1, len(METRICS)), dtype=np.int64)
+
+    def bucket(self, seconds):
+        return (np.asarray(seconds) + self.offset) // self.width
+
+    def bucket_starts(self, first: int, n: int) -> np.ndarray:
+        seconds = (first + np.arange(n, dtype=np.int64)) * self.width - self.offset
+        return seconds.astype('datetime64[s]')
+
+    def in_window(self, buckets: np.ndarray) -> np.ndarray:
+        """Buckets still inside the retention window once the newest of them is added"""
+        top = int(buckets.max()) if self.top is None else max(self.top, int(buckets.max()))
+        return buckets > top - self.retention
+
+    def _ensure(self, lo: int, hi: int, n_pincodes: int, n_categories: int):
+        """Slide the window up to hi and grow so buckets lo..hi and the given code ranges fit"""
+        rows, p, c, m = self.data.shape
+        floor = hi - self.retention + 1
+        if rows and floor > self.origin:
+            cut = min(floor - self.origin, rows)
+            self.data = self.data[cut:]  # a view: the buffer is reused until the next grow
+            self.origin += cut
+            rows -= cut
+        if rows == 0:
+            self.origin = lo
+        new_origin = min(self.origin, lo)
+        needed_rows = max(self.origin + rows, hi + 1) - new_origin
+        if (new_origin == self.origin and needed_rows <= rows
+                and n_pincodes + 1 <= p and n_categories + 1 <= c):
+            return
+
+        def grow(current, needed):
+            return current if needed <= current else max(needed, 2 * current)
+
+        # Leave headroom on the side we're growing towards, at most one retention window of it
+        total_rows = min(grow(rows, needed_rows), max(needed_rows, 2 * self.retention))
+        front = (self.origin - new_origin) + (total_rows - needed_rows if new_origin < self.origin else 0)
+        shape = (total_rows, grow(p, n_pincodes + 1), grow(c, n_categories + 1), m)
+        if np.prod(shape) * self.data.itemsize > self.max_bytes:
+            raise RollupFull(f"{self.width}s level would need {shape}, over {self.max_bytes / 2 ** 20:.0f} MB")
+        grown = np.zeros(shape, dtype=np.int64)
+        grown[front:front + rows, :p, :c] = self.data
+        self.data = grown
+        self.origin -= front
+
+    def add(self, buckets: np.ndarray, pincodes: np.ndarray, categories: np.ndarray, values: np.ndarray) -> int:
+        """values: [n, len(METRICS)]; pincodes/categories are codes (>= 0). Returns rows added."""
+        if len(buckets) == 0:
+            return 0
+        keep = self.in_window(buckets)
+        if not keep.all():
+            buckets, pincodes, categories, values = buckets[keep], pincodes[keep], categories[keep], values[keep]
+            if len(buckets) == 0:
+                return 0
+        self._ensure(int(buckets.min()), int(buckets.max()),
+                     int(pincodes.max()) + 1, int(categories.max()) + 1)
+        self.top = int(buckets.max()) if self.top is None else max(self.top, int(buckets.max()))
+        rows = buckets - self.origin
+        p, c = pincodes + 1, categories + 1
+        zeros = np.zeros_like(p)
+        for pi, ci in ((p, c), (p, zeros), (zeros, c), (zeros, zeros)):
+            np.add.at(self.data, (rows, pi, ci), values)
+        return len(buckets)
+
+    def add_one(self, bucket: int, pincode: int, category: int, values: tuple) -> bool:
+        if self.top is not None and bucket <= self.top - self.retention:
+            return False
+        self._ensure(bucket, bucket, pincode + 1, category + 1)
+        self.top = bucket if self.top is None else max(self.top, bucket)
+        row = bucket - self.origin
+        for pi in (pincode + 1, 0):
+            for ci in (category + 1, 0):
+                self.data[row, pi, ci] += values
+        return True
+
+    def series(self, lo: int, hi: int, pincode: int, category: int) -> tuple:
+        """(first bucket, [n, metrics] values) for buckets lo..hi inclusive, zero outside the data"""
+        rows, p, c, _ = self.data.shape
+        out = np.zeros((max(hi - lo + 1, 0), len(METRICS)), dtype=np.int64)
+        pi, ci = pincode + 1, category + 1
+        if rows == 0 or pi >= p or ci >= c:
+            return lo, out
+        a, b = max(lo, self.origin), min(hi, self.origin + rows - 1)
+        if a <= b:
+            out[a - lo:b - lo + 1] = self.data[a - self.origin:b - self.origin + 1, pi, ci]
+        return lo, out
+
+class RollupCube:
+    def __init__(self, retention_days: Optional[dict] = None, max_level_bytes: int = MAX_LEVEL_BYTES):
+        retention_days = {**RETENTION_DAYS, **(retention_days or {})}
+        self.retention_days = retention_days
+        self.levels = {name: _Level(width, offset, retention_days[name], max_level_bytes)
+                       for name, (width, offset) in GRANULARITIES.items()}
+        self.latest: Optional[datetime] = None
+        self.dropped = {name: 0 for name in self.levels}  # transactions a level couldn't keep
+
+    @staticmethod
+    def _horizon() -> int:
+        return future_horizon()
+
+    def add_frame(self, df: pd.DataFrame):
+        """Bulk load; df has timestamp, pincode_id, category_id, quantity"""
+        df = df[(df['pincode_id'] >= 0) & (df['category_id'] >= 0)]
+        if df.empty:
+            return
+        timestamps = pd.to_datetime(df['timestamp'])
+        if timestamps.dt.tz is not None:
+            timestamps = timestamps.dt.tz_convert('UTC').dt.tz_localize(None)
+        seconds = timestamps.to_numpy(dtype='datetime64[s]').astype(np.int64)
+        future = seconds > self._horizon()
+        if future.any():
+            for name in self.levels:
+                self.dropped[name] += int(future.sum())
+            df, timestamps, seconds = df[~future], timestamps[~future], seconds[~future]
+            if df.empty:
+                return
+        pincodes = df['pincode_id'].to_numpy(dtype=np.int64)
+        categories = df['category_id'].to_numpy(dtype=np.int64)
+        values = np.column_stack([np.ones(len(df), dtype=np.int64),
+                                  df['quantity'].to_numpy(dtype=np.int64)])
+        for name, level in self.levels.items():
+            try:
+                self.dropped[name] += len(df) - level.add(level.bucket(seconds), pincodes, categories, values)
+            except RollupFull as e:
+                self.dropped[name] += len(df)
+                logger.error(f"Rollup {name} full, batch not counted: {e}")
+        self._seen(timestamps.max().to_pydatetime())
+
+    def add(self, ts: datetime, pincode_id: int, category_id: int, quantity: int) -> bool:
+        """Incremental ingest of one transaction; False if no level could keep it"""
+        if pincode_id < 0 or category_id < 0:
+            return False
+        seconds = epoch_seconds(ts)
+        if seconds > self._horizon():
+            for name in self.levels:
+                self.dropped[name] += 1
+            return False
+        kept = False
+        for name, level in self.levels.items():
+            try:
+                added = level.add_one(int(level.bucket(seconds)), pincode_id, category_id, (1, quantity))
+            except RollupFull as e:
+                added = False
+                logger.error(f"Rollup {name} full, transaction not counted: {e}")
+            self.dropped[name] += not added
+            kept |= added
+        if kept:
+            self._seen(ts)
+        return kept
+
+    def metrics(self) -> dict:
+        return {name: {'buckets': level.data.shape[0], 'shape': list(level.data.shape),
+                       'mb': round(level.data.nbytes / 2 ** 20, 2), 'dropped': self.dropped[name]}
+                for name, level in self.levels.items()}
+
+    def _seen(self, ts: datetime):
+        if ts.tzinfo is not None:
+            ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+        if self.latest is None or ts > self.latest:
+            self.latest = ts
+
+    def query(self, granularity: str, start: datetime, end: datetime,
+              pincode_id: int = ALL, category_id: int = ALL) -> tuple:
+        """
+        (bucket starts as datetime64[s], [n, METRICS] values) for buckets from start to end
+        inclusive, starting no earlier than the level's retention window behind end
+        """
+        level = self.levels[granularity]
+        lo, hi = (int(level.bucket(epoch_seconds(t))) for t in (start, end))
+        lo = max(lo, hi - level.retention + 1)
+        first, values = level.series(lo, hi, pincode_id, category_id)
+        return level.bucket_starts(first, len(values)), values
@@ -0,0 +1,219 @@
+"""
+Shard Router
+Thin front for a pincode-sharded deployment. Every backend (main.py with
+SHARD_NODES/SHARD_SELF set) owns a consistent-hash range of pincodes and
+keeps their counters, baselines and anomalies. The router forwards
+per-pincode calls to the owner and fans dashboard-wide reads out to all
+shards, merging the results:
+
+    POST /api/transactions            -> owner of the pincode
+    GET  /api/outbreak-status/{pin}   -> owner of the pincode
+    GET  /api/heatmap?level=...       -> all shards; pincodes concatenated, districts/states summed,
+                                         demo rows of idle shards dropped
+    GET  /api/stats                   -> all shards; counters summed
+
+Local test cluster (N backends on consecutive ports plus the router):
+
+    python scripts/router.py --spawn 3
+    python scripts/router.py --nodes http://10.0.0.5:8000,http://10.0.0.6:8000
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+import httpx
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.cors import CORSMiddleware
+
+from anomaly_store import STATE_DIR_ENV
+from pincode_state import SHM_ENV, is_pincode
+from regions import LEVELS, per_capita, ratio_severity
+from shard_ring import HashRing, SHARD_NODES_ENV, SHARD_SELF_ENV
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = Path(__file__).parent
+SHARDS_DIR = SCRIPTS_DIR.parent / "datasets" / "final" / "shards"
+SHARD_TIMEOUT = float(os.getenv("SHARD_TIMEOUT", 5.0))  # seconds per shard call
+FORWARD_HEADERS = ['content-type', 'idempotency-key']
+RETURN_HEADERS = ['retry-after']
+
+app = FastAPI(title="Flu Radar Router", description="Routes pincodes to their shard", version="1.0.0")
+app.add_middleware(CORSMiddleware, allow_origins=["*"], allow_credentials=True,
+                   allow_methods=["*"], allow_headers=["*"])
+
+ring: Optional[HashRing] = None
+client: Optional[httpx.AsyncClient] = None
+
+@app.on_event("startup")
+async def open_ring():
+    global ring, client
+    ring = HashRing.from_env()
+    if ring is None:
+        raise RuntimeError(f"Set {SHARD_NODES_ENV} to the comma-separated shard URLs")
+    client = httpx.AsyncClient(timeout=SHARD_TIMEOUT)
+    logger.info(f"✓ Routing across {len(ring.nodes)} shards: {', '.join(ring.nodes)}")
+
+@app.on_event("shutdown")
+async def close_client():
+    if client is not None:
+        await client.aclose()
+
+def owner_of(pincode) -> str:
+    pincode = str(pincode)
+    if not (pincode.isdigit() and len(pincode) == 6 and is_pincode(int(pincode))):
+        raise HTTPException(status_code=422, detail=f"Invalid pincode: {pincode}")
+    return ring.owner(int(pincode))
+
+async def forward(method: str, url: str, **kwargs) -> Response:
+    """Relay one call to a shard and its answer back as-is"""
+    try:
+        response = await client.request(method, url, **kwargs)
+    except httpx.TransportError as e:
+        raise HTTPException(status_code=502, detail=f"Shard {url} unavailable: {e}")
+    headers = {h: response.headers[h] for h in RETURN_HEADERS if h in response.headers}
+    return Response(response.content, status_code=response.status_code, headers=headers,
+                    media_type=response.headers.get('content-type'))
+
+async def fan_out(path: str, params: Optional[dict] = None) -> tuple:
+    """GET path on every shard: ({node: json}, [nodes that failed])"""
+    async def one(node):
+        response = await client.get(f"{node}{path}", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    answers = await asyncio.gather(*(one(node) for node in ring.nodes), return_exceptions=True)
+    results, missing = {}, []
+    for node, answer in zip(ring.nodes, answers):
+        if isinstance(answer, Exception):
+            logger.error(f"Shard {node} failed on {path}: {answer}")
+            missing.append(node)
+        else:
+            results[node] = answer
+    if not results:
+        raise HTTPException(status_code=502, detail="No shard answered")
+    return results, missing
+
+@app.get("/")
+async def root():
+    return {"status": "operational", "service": "Flu Radar Router", "version": "1.0.0",
+            "shards": ring.nodes}
+
+@app.get("/api/shards")
+async def get_shards():
+    """Each shard's health and the version of the model it serves"""
+    async def health(node):
+        try:
+            return {"node": node, **(await client.get(f"{node}/")).json()}
+        except Exception as e:
+            return {"node": node, "status": "unreachable", "error": str(e)}
+    return {"shards": await asyncio.gather(*(health(node) for node in ring.nodes))}
+
+@app.post("/api/transactions")
+async def add_transaction(request: Request):
+    body = await request.body()
+    try:
+        pincode = json.loads(body)['pincode']
+    except (ValueError, KeyError, TypeError):
+        raise HTTPException(status_code=422, detail="Body must be a transaction with a pincode")
+    headers = {h: request.headers[h] for h in FORWARD_HEADERS if h in request.headers}
+    return await forward("POST", f"{owner_of(pincode)}/api/transactions", content=body, headers=headers)
+
+@app.get("/api/outbreak-status/{pincode}")
+async def get_outbreak_status(pincode: str):
+    return await forward("GET", f"{owner_of(pincode)}/api/outbreak-status/{pincode}")
+
+@app.get("/api/heatmap")
+async def get_heatmap(level: str = "pincode"):
+    if level not in LEVELS:
+        raise HTTPException(status_code=422, detail=f"level must be one of {LEVELS}")
+    results, missing = await fan_out("/api/heatmap", {"level": level})
+    if level == "pincode":
+        # Each pincode is reported by its owner only; idle shards answer with demo rows, which are dropped
+        alerts = [alert for node, answer in results.items() if not answer.get('demo')
+                  for alert in answer['alerts'] if owner_of(alert['pincode']) == node]
+        alerts.sort(key=lambda a: a['anomaly_count'], reverse=True)
+    else:
+        alerts = merge_regions([answer['alerts'] for answer in results.values()])
+    return {"level": level, "alerts": alerts, "missing_shards": missing, "timestamp": datetime.now().isoformat()}
+
+def merge_regions(shard_alerts: list) -> list:
+    """Sum district/state counters across shards and recompute rates and severity"""
+    merged = {}
+    for alerts in shard_alerts:
+        for alert in alerts:
+            key = (alert['region'], alert['parent'])
+            total = merged.setdefault(key, {**alert, 'anomaly_count': 0, 'total_transactions': 0,
+                                            'today_transactions': 0, 'baseline': 0.0})
+            for field in ['anomaly_count', 'total_transactions', 'today_transactions', 'baseline']:
+                total[field] += alert[field]
+    for total in merged.values():
+        total['transactions_per_100k'] = per_capita(total['total_transactions'], total['population'])
+        total['anomalies_per_100k'] = per_capita(total['anomaly_count'], total['population'])
+        total['severity'] = ratio_severity(total['today_transactions'], total['baseline'])
+        total['baseline'] = round(total['baseline'], 3)
+    return sorted(merged.values(), key=lambda a: (a['anomaly_count'], a['total_transactions']), reverse=True)
+
+SUMMED_STATS = ['active_outbreaks', 'monitored_pincodes', 'total_transactions_24h', 'total_anomalies',
+                'critical_alerts', 'warnings', 'monitoring', 'pincodes_monitored']
+
+@app.get("/api/stats")
+@app.get("/api/dashboard/stats")
+async def get_stats():
+    # Shards count only pincodes they own, so the totals add up without overlap
+    results, missing = await fan_out("/api/stats")
+    answers = list(results.values())
+    stats = {key: sum(answer[key] for answer in answers) for key in SUMMED_STATS}
+    healthy = not missing and all(answer['system_status'] == "Operational" for answer in answers)
+    return {**stats, "system_status": "Operational" if healthy else "Degraded",
+            "shards": len(ring.nodes), "missing_shards": missing, "last_updated": datetime.now().isoformat()}
+
+def spawn_shards(count: int, host: str, base_port: int) -> tuple:
+    """
+    Start count backends on consecutive ports; returns (node URLs, processes).
+    Each keeps its anomalies and idempotency keys under SHARDS_DIR/<port> and
+    creates its own pincode state, so shards never see each other's pincodes.
+    """
+    nodes = [f"http://{host}:{base_port + i}" for i in range(count)]
+    processes = []
+    for node, port in zip(nodes, range(base_port, base_port + count)):
+        env = {k: v for k, v in os.environ.items() if k != SHM_ENV}
+        env.update({SHARD_NODES_ENV: ",".join(nodes), SHARD_SELF_ENV: node,
+                    STATE_DIR_ENV: str(SHARDS_DIR / str(port))})
+        processes.append(subprocess.Popen([sys.executable, str(SCRIPTS_DIR / "main.py"),
+                                           "--host", host, "--port", str(port)], env=env))
+    return nodes, processes
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Flu Radar shard router")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--nodes", help="Comma-separated URLs of running shards")
+    parser.add_argument("--spawn", type=int, default=0, help="Start this many local shards instead")
+    parser.add_argument("--base-port", type=int, default=8001, help="First port for --spawn")
+    args = parser.parse_args()
+
+    processes = []
+    if args.spawn:
+        nodes, processes = spawn_shards(args.spawn, "127.0.0.1", args.base_port)
+        os.environ[SHARD_NODES_ENV] = ",".join(nodes)
+    elif args.nodes:
+        os.environ[SHARD_NODES_ENV] = args.nodes
+    try:
+        uvicorn.run(app, host=args.host, port=args.port)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
@@ -0,0 +1,75 @@
+"""
+Pincode Shard Ring
+Consistent hashing of pincodes onto backend nodes. Each node gets VNODES
+points on a 64-bit ring and owns the pincodes hashing up to each of them, so
+adding or removing a node only moves the pincodes in the ranges it gains or
+gives up (about 1/N of them); everything else stays where its state is.
+
+Backends and the router (router.py) build the same ring from SHARD_NODES,
+the comma-separated node URLs, so they agree on owners without talking to
+each other. A backend also sets SHARD_SELF to its own entry.
+
+    python scripts/shard_ring.py --nodes http://a:8001,http://b:8001 --add http://c:8001
+"""
+
+import argparse
+import bisect
+import os
+from typing import Iterable, Optional
+
+from sketches import stable_hash
+
+SHARD_NODES_ENV = "SHARD_NODES"
+SHARD_SELF_ENV = "SHARD_SELF"
+VNODES = int(os.getenv("SHARD_VNODES", 128))
+
+class HashRing:
+    def __init__(self, nodes: Iterable[str], vnodes: int = VNODES):
+        self.nodes = sorted(set(nodes))
+        if not self.nodes:
+            raise ValueError("A shard ring needs at least one node")
+        points = sorted((stable_hash(f"{node}#{i}"), node) for node in self.nodes for i in range(vnodes))
+        self._hashes = [h for h, _ in points]
+        self._owners = [node for _, node in points]
+        self._cache = {}
+
+    @classmethod
+    def from_env(cls) -> Optional["HashRing"]:
+        nodes = [n.strip().rstrip('/') for n in os.getenv(SHARD_NODES_ENV, "").split(',') if n.strip()]
+        return cls(nodes) if nodes else None
+
+    def owner(self, pincode: int) -> str:
+        node = self._cache.get(pincode)
+        if node is None:
+            i = bisect.bisect_right(self._hashes, stable_hash(str(pincode))) % len(self._hashes)
+            node = self._cache[pincode] = self._owners[i]
+        return node
+
+    def moves(self, other: "HashRing", pincodes: Iterable[int]) -> dict:
+        """pincode -> (old owner, new owner) for the pincodes that change owner from self to other"""
+        return {p: (self.owner(p), other.owner(p)) for p in pincodes if self.owner(p) != other.owner(p)}
+
+def main():
+    from regions import RegionIndex
+
+    parser = argparse.ArgumentParser(description="Show which pincodes move when the shard set changes")
+    parser.add_argument("--nodes", required=True, help="Current comma-separated node URLs")
+    parser.add_argument("--add", default="", help="Nodes to add")
+    parser.add_argument("--remove", default="", help="Nodes to remove")
+    args = parser.parse_args()
+
+    split = lambda s: [n.strip() for n in s.split(',') if n.strip()]
+    before = HashRing(split(args.nodes))
+    after = HashRing(set(before.nodes) - set(split(args.remove)) | set(split(args.add)))
+    pincodes = sorted(RegionIndex.load().pincode_district)
+
+    for node in after.nodes:
+        owned = [p for p in pincodes if after.owner(p) == node]
+        print(f"{node}: {len(owned)} pincodes")
+    moved = before.moves(after, pincodes)
+    print(f"\n{len(moved)}/{len(pincodes)} pincodes change owner")
+    for pincode, (old, new) in sorted(moved.items()):
+        print(f"  {pincode}: {old} -> {new}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Streaming Sketches
+Fixed-size summaries of each pincode's transactions per day: top medicines
+(Count-Min sketch plus a small heavy-hitter candidate set), distinct
+customers (HyperLogLog) and customer age bands (histogram).
+
+Every update is O(1) in the number of transactions seen, and every sketch
+merges by elementwise sum/max, so any window of days, any set of pincodes or
+the sketches of several worker processes combine into one answer without
+touching raw rows. Hashes are stable (blake2b), not Python's per-process
+hash(), so sketches built in different processes merge correctly.
+
+The store keeps the RETENTION_DAYS days up to today (UTC). Days older than
+that, or past the clock by more than rollup_cube.MAX_FUTURE, are counted in
+`dropped` instead of being kept, so one misdated transaction can't expire the
+history of everything else.
+"""
+
+import hashlib
+import os
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from rollup_cube import future_horizon, EPOCH
+
+CM_WIDTH = int(os.getenv("SKETCH_CM_WIDTH", 512))
+CM_DEPTH = int(os.getenv("SKETCH_CM_DEPTH", 4))
+TOP_K = int(os.getenv("SKETCH_TOP_K", 10))
+HLL_P = int(os.getenv("SKETCH_HLL_P", 10))  # 2**p registers, ~1.04/sqrt(2**p) relative error
+RETENTION_DAYS = int(os.getenv("SKETCH_RETENTION_DAYS", 90))
+
+AGE_BANDS = [(0, 4, '0-4'), (5, 17, '5-17'), (18, 29, '18-29'), (30, 44, '30-44'),
+             (45, 59, '45-59'), (60, 200, '60+')]
+AGE_EDGES = np.array([lo for lo, _, _ in AGE_BANDS[1:]])
+AGE_LABELS = [label for _, _, label in AGE_BANDS] + ['unknown']
+
+def stable_hash(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'little')
+
+def age_band(age: Optional[int]) -> int:
+    return len(AGE_BANDS) if age is None or age < 0 else int(np.searchsorted(AGE_EDGES, age, side='right'))
+
+class CountMinTopK:
+    """Count-Min frequencies plus the k items with the highest estimates seen so far"""
+
+    def __init__(self, width: int = CM_WIDTH, depth: int = CM_DEPTH, k: int = TOP_K):
+        self.width, self.depth, self.k = width, depth, k
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.candidates = {}  # item -> estimate when last updated
+
+    def _columns(self, item: str) -> np.ndarray:
+        # Double hashing: depth independent-enough columns from one 64-bit hash
+        h = stable_hash(item)
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return (h1 + np.arange(self.depth, dtype=np.uint64) * h2) % self.width
+
+    def add(self, item: str, count: int = 1):
+        rows = np.arange(self.depth)
+        cols = self._columns(item).astype(np.int64)
+        self.table[rows, cols] += count
+        estimate = int(self.table[rows, cols].min())
+        if item in self.candidates or len(self.candidates) < self.k:
+            self.candidates[item] = estimate
+            return
+        weakest = min(self.candidates, key=self.candidates.get)
+        if estimate > self.candidates[weakest]:
+            del self.candidates[weakest]
+            self.candidates[item] = estimate
+
+    def estimate(self, item: str) -> int:
+        return int(self.table[np.arange(self.depth), self._columns(item).astype(np.int64)].min())
+
+    def merge(self, other: "CountMinTopK"):
+        self.table += other.table
+        pool = set(self.candidates) | set(other.candidates)
+        ranked = sorted(((self.estimate(i), i) for i in pool), reverse=True)[:self.k]
+        self.candidates = {i: e for e, i in ranked}
+
+    def top(self, n: int) -> list:
+        ranked = sorted(((self.estimate(i), i) for i in self.candidates), reverse=True)
+        return [(item, estimate) for estimate, item in ranked[:n]]
+
+class HyperLogLog:
+    def __init__(self, p: int = HLL_P):
+        self.p = p
+        self.registers = np.zeros(1 << p, dtype=np.uint8)
+
+    def add(self, value: str):
+        h = stable_hash(value)
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & 0xFFFFFFFFFFFFFFFF
+        rank = min(64 - self.p, 64 - rest.bit_length()) + 1  # leading zeros of the remaining bits + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other: "HyperLogLog"):
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def count(self) -> int:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(2.0 ** -self.registers.astype(np.float64))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * np.log(m / zeros)  # small-range correction (linear counting)
+        return int(round(estimate))
+
+class WindowSketch:
+    """Everything kept for one pincode and day"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.medicines = CountMinTopK()
+        self.customers = HyperLogLog()
+        self.customers_seen = 0  # transactions that carried a customer id
+        self.ages = np.zeros(len(AGE_LABELS), dtype=np.int64)
+
+    def add(self, medicine: str, age: Optional[int], customer: Optional[str], count: int = 1):
+        self.transactions += count
+        self.medicines.add(medicine, count)
+        self.ages[age_band(age)] += count
+        if customer:
+            self.customers.add(customer)
+            self.customers_seen += count
+
+    def merge(self, other: "WindowSketch"):
+        self.transactions += other.transactions
+        self.medicines.merge(other.medicines)
+        self.customers.merge(other.customers)
+        self.customers_seen += other.customers_seen
+        self.ages += other.ages
+
+def today() -> int:
+    """Ordinal of the current UTC day"""
+    return datetime.now(timezone.utc).date().toordinal()
+
+def horizon_day() -> int:
+    """Ordinal of the newest day ingest accepts"""
+    return (EPOCH + timedelta(seconds=future_horizon())).date().toordinal()
+
+class SketchStore:
+    """Per-process pincode -> day -> WindowSketch, keeping the RETENTION_DAYS days up to today"""
+
+    def __init__(self, retention_days: int = RETENTION_DAYS):
+        self.retention_days = retention_days
+        self.windows = {}
+        self.latest_day = 0
+        self.dropped = 0  # transactions outside the window
+        self._expired_on = 0
+        # Ingest adds on the event loop while insights merge on a worker thread
+        self._lock = threading.Lock()
+
+    def _window(self) -> tuple:
+        """(oldest, newest) day ordinals kept, expiring older days when the date has changed"""
+        now = today()
+        if now != self._expired_on:
+            self._expire(now - self.retention_days)
+            self._expired_on = now
+        return now - self.retention_days + 1, horizon_day()
+
+    def add(self, pincode: int, day: date, medicine: str, age: Optional[int] = None,
+            customer: Optional[str] = None, count: int = 1):
+        ordinal = day.toordinal()
+        with self._lock:
+            oldest, newest = self._window()
+            if not oldest <= ordinal <= newest:
+                self.dropped += count
+                return
+            window = self.windows.setdefault(pincode, {}).get(ordinal)
+            if window is None:
+                window = self.windows[pincode][ordinal] = WindowSketch()
+                self.latest_day = max(self.latest_day, ordinal)
+            window.add(medicine, age, customer, count)
+
+    def add_frame(self, df: pd.DataFrame):
+        """Bulk load; df has pincode (int), timestamp, medicine_name, customer_age and optionally customer_id"""
+        df = df.assign(day=pd.to_datetime(df['timestamp']).dt.normalize(),
+                       band=np.searchsorted(AGE_EDGES, df['customer_age'].fillna(-1), side='right'))
+        df.loc[df['customer_age'].isna() | (df['customer_age'] < 0), 'band'] = len(AGE_BANDS)
+        with self._lock:
+            self._add_frame(df)
+
+    def _add_frame(self, df: pd.DataFrame):
+        oldest, newest = self._window()
+        ordinals = df['day'].dt.date.map(date.toordinal)
+        inside = ((ordinals >= oldest) & (ordinals <= newest)).to_numpy()
+        self.dropped += int((~inside).sum())
+        df = df[inside]
+        for (pincode, day), group in df.groupby(['pincode', 'day']):
+            ordinal = day.toordinal()
+            self.latest_day = max(self.latest_day, ordinal)
+            window = self.windows.setdefault(int(pincode), {}).setdefault(ordinal, WindowSketch())
+            window.transactions += len(group)
+            for medicine, count in group['medicine_name'].value_counts().items():
+                if count:  # categorical columns also list medicines absent from this group
+                    window.medicines.add(medicine, int(count))
+            window.ages += np.bincount(group['band'], minlength=len(AGE_LABELS))
+            if 'customer_id' in group:
+                customers = group['customer_id'].dropna()
+                for customer in customers.unique():
+                    window.customers.add(str(customer))
+                window.customers_seen += len(customers)
+
+    def _expire(self, cutoff: int):
+        for days in self.windows.values():
+            for ordinal in [d for d in days if d <= cutoff]:
+                del days[ordinal]
+
+    def merged(self, pincode: Optional[int], days: int) -> tuple:
+        """
+        (first day, last day, merged WindowSketch) over the last `days` days up to
+        today (clamped to the retention window), one or all pincodes
+        """
+        days = min(max(days, 1), self.retention_days)
+        with self._lock:
+            self._window()
+            last = max(today(), self.latest_day)
+            first = last - days + 1
+            pincodes = self.windows.values() if pincode is None else [self.windows.get(pincode, {})]
+            result = WindowSketch()
+            # Stored days only: at most retention_days per pincode, whatever was asked for
+            for by_day in pincodes:
+                for ordinal, window in by_day.items():
+                    if first <= ordinal <= last:
+                        result.merge(window)
+        return date.fromordinal(first), date.fromordinal(last), result
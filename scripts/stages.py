@@ -0,0 +1,21 @@
+"""
+Pipeline Stage Loader
+Imports numbered pipeline scripts (e.g. 07_train_models.py) so later stages can reuse them.
+"""
+
+import importlib.util
+import sys
+from pathlib import Path
+
+SCRIPTS_DIR = Path(__file__).parent
+
+def load_stage(name: str):
+    """Import scripts/<name>.py as a module (names starting with digits can't use `import`)"""
+    if name in sys.modules:
+        return sys.modules[name]
+
+    spec = importlib.util.spec_from_file_location(name, SCRIPTS_DIR / f"{name}.py")
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
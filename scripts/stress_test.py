@@ -0,0 +1,188 @@
+"""
+Ingest Stress Test
+Starts the API in a subprocess, measures dashboard read latency at idle,
+then floods /api/transactions from many concurrent clients and measures it
+again. With admission control the overload is shed as 429s and read tail
+latency stays close to idle; --unbounded raises the ingest limits to
+compare against effectively unlimited queueing.
+
+    python scripts/stress_test.py
+    python scripts/stress_test.py --unbounded
+    python scripts/stress_test.py --url http://localhost:8000   # against a running server
+    python scripts/stress_test.py --flood-nice 0                 # clients compete with the API for CPU
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+import httpx
+import numpy as np
+
+SCRIPTS_DIR = Path(__file__).parent
+READ_PATHS = ["/api/heatmap", "/api/outbreak-status/400001", "/api/trends?days=7"]
+PINCODES = ["400001", "400002", "400003", "400004", "400005"]
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def start_server(port: int, unbounded: bool) -> subprocess.Popen:
+    env = dict(os.environ)
+    if unbounded:
+        env.update(INGEST_MAX_QUEUE="1000000", INGEST_QUEUE_TIMEOUT="3600")
+    return subprocess.Popen([sys.executable, str(SCRIPTS_DIR / "main.py"), "--host", "127.0.0.1",
+                             "--port", str(port)], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+async def wait_ready(client: httpx.AsyncClient, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if (await client.get("/")).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.25)
+    raise RuntimeError("API did not come up")
+
+def percentiles(samples: list) -> str:
+    if not samples:
+        return "no samples"
+    ms = np.asarray(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):7.1f} ms  p99 {np.percentile(ms, 99):7.1f} ms  max {ms.max():7.1f} ms"
+
+async def reader(client: httpx.AsyncClient, stop: asyncio.Event, latencies: list):
+    """One dashboard user polling the read endpoints"""
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.get(random.choice(READ_PATHS))
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.02)
+
+async def ingester(client: httpx.AsyncClient, stop: asyncio.Event, stats: dict):
+    """One pharmacy posting as fast as it can (ignoring Retry-After, to sustain the overload)"""
+    while not stop.is_set():
+        body = {
+            "timestamp": datetime.now().isoformat(),
+            "pincode": random.choice(PINCODES),
+            "medicine_name": "Paracetamol 500mg",
+            "category": "fever",
+            "quantity": random.randint(1, 3),
+        }
+        started = time.perf_counter()
+        try:
+            response = await client.post("/api/transactions", json=body)
+        except httpx.TransportError:
+            stats['errors'] += 1
+            continue
+        elapsed = time.perf_counter() - started
+        if response.status_code == 200:
+            stats['accepted'].append(elapsed)
+        elif response.status_code == 429:
+            stats['shed'].append(elapsed)
+            stats['retry_after'].add(response.headers.get('Retry-After'))
+        else:
+            stats['errors'] += 1
+
+async def read_phase(url: str, seconds: float, readers: int) -> list:
+    latencies, stop = [], asyncio.Event()
+    async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+        tasks = [asyncio.create_task(reader(client, stop, latencies)) for _ in range(readers)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return latencies
+
+async def flood(url: str, seconds: float, ingesters: int) -> dict:
+    stats = {'accepted': [], 'shed': [], 'retry_after': set(), 'errors': 0}
+    stop = asyncio.Event()
+    limits = httpx.Limits(max_connections=ingesters, max_keepalive_connections=ingesters)
+    async with httpx.AsyncClient(base_url=url, timeout=60.0, limits=limits) as client:
+        tasks = [asyncio.create_task(ingester(client, stop, stats)) for _ in range(ingesters)]
+        await asyncio.sleep(seconds)
+        stop.set()
+        await asyncio.gather(*tasks)
+    return stats
+
+def flood_process(url: str, seconds: float, ingesters: int, nice: int, results: multiprocessing.Queue):
+    """Load generator in its own process so its CPU use doesn't skew the read measurements"""
+    # Real pharmacies aren't on the server's cores; on a box with fewer cores than
+    # processes the generator must not outcompete the API, or the test measures the OS scheduler
+    os.nice(nice)
+    results.put(asyncio.run(flood(url, seconds, ingesters)))
+
+def run(url: str, seconds: float, readers: int, ingesters: int, flooders: int, nice: int = 10):
+    async def ready():
+        async with httpx.AsyncClient(base_url=url, timeout=60.0) as client:
+            await wait_ready(client)
+    asyncio.run(ready())
+
+    idle = asyncio.run(read_phase(url, seconds, readers))
+
+    results = multiprocessing.Queue()
+    procs = [multiprocessing.Process(target=flood_process,
+                                     args=(url, seconds + 2.0, ingesters // flooders, nice, results))
+             for _ in range(flooders)]
+    for p in procs:
+        p.start()
+    time.sleep(1.0)  # let the queue fill
+    loaded = asyncio.run(read_phase(url, seconds, readers))
+    stats = {'accepted': [], 'shed': [], 'retry_after': set(), 'errors': 0}
+    for _ in procs:
+        part = results.get()
+        for key in ('accepted', 'shed'):
+            stats[key].extend(part[key])
+        stats['retry_after'] |= part['retry_after']
+        stats['errors'] += part['errors']
+    for p in procs:
+        p.join()
+
+    metrics = httpx.get(f"{url}/api/metrics", timeout=30.0).json()
+
+    print(f"reads, idle      : {percentiles(idle)}  ({len(idle)} requests)")
+    print(f"reads, overload  : {percentiles(loaded)}  ({len(loaded)} requests)")
+    print(f"ingest accepted  : {percentiles(stats['accepted'])}  ({len(stats['accepted'])} requests)")
+    print(f"ingest shed (429): {percentiles(stats['shed'])}  ({len(stats['shed'])} requests, "
+          f"Retry-After {sorted(v for v in stats['retry_after'] if v)})")
+    print(f"transport/other errors: {stats['errors']}")
+    print(f"server metrics   : {metrics['ingest']}")
+    print(f"read lane        : {metrics.get('reads')}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Overload /api/transactions and watch read latency")
+    parser.add_argument("--url", help="Test a running server instead of starting one")
+    parser.add_argument("--unbounded", action="store_true", help="Start the server with ingest limits lifted")
+    parser.add_argument("--seconds", type=float, default=10.0, help="Duration of each measurement phase")
+    parser.add_argument("--readers", type=int, default=4)
+    parser.add_argument("--ingesters", type=int, default=200, help="Concurrent posting clients in total")
+    parser.add_argument("--flooders", type=int, default=2, help="Processes the posting clients are spread over")
+    parser.add_argument("--flood-nice", type=int, default=10,
+                        help="Scheduling niceness of the posting processes (0 lets them compete with the API)")
+    args = parser.parse_args()
+
+    server = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        url = f"http://127.0.0.1:{port}"
+        server = start_server(port, args.unbounded)
+    try:
+        run(url, args.seconds, args.readers, args.ingesters, args.flooders, args.flood_nice)
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
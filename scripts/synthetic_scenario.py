@@ -0,0 +1,9 @@
+"""
+Synthetic Outbreak Scenario
+Where and when 04_generate_synthetic.py injects its outbreak. Kept apart from the
+generator so consumers (e.g. the backtest's ground truth) don't import Faker.
+"""
+
+PINCODES = ['400001', '400002', '400003']
+OUTBREAK_PINCODE = '400001'
+OUTBREAK_DAYS = 5  # Outbreak covers the last N days of the series
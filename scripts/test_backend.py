@@ -129,7 +129,56 @@ def main():
     results['outbreak'] = test_endpoint(
         "Outbreak Status (400001)",
         f"{BASE_URL}/api/outbreak-status/400001",
-        expected_keys=['pincode', 'severity', 'confidence']
+        expected_keys=['pincode', 'severity', 'confidence', 'attributions']
+    )
+    
+    # Test 6: Served model version
+    results['models'] = test_endpoint(
+        "Model Registry",
+        f"{BASE_URL}/api/models",
+        expected_keys=['version', 'models', 'previous_version']
+    )
+    
+    # Test 7: Regional context from the COVID cube
+    results['regional'] = test_endpoint(
+        "Regional Context (Maharashtra)",
+        f"{BASE_URL}/api/regional/Maharashtra?metric=confirmed&days=7",
+        expected_keys=['state', 'as_of', 'metrics', 'series']
+    )
+    
+    # Test 8: Weekly trends for one category, served from the rollups
+    results['trends_weekly'] = test_endpoint(
+        "Weekly Fever Trends",
+        f"{BASE_URL}/api/trends?days=28&granularity=week&category=fever",
+        expected_keys=['data', 'granularity', 'start_date', 'end_date']
+    )
+    
+    # Test 9: District-level heatmap rolled up from pincodes
+    results['heatmap_district'] = test_endpoint(
+        "District Heatmap",
+        f"{BASE_URL}/api/heatmap?level=district",
+        expected_keys=['level', 'alerts', 'timestamp']
+    )
+    
+    # Test 10: Anomaly history, first page
+    results['anomalies'] = test_endpoint(
+        "Anomaly History",
+        f"{BASE_URL}/api/anomalies?limit=10&severity=red&severity=orange",
+        expected_keys=['data', 'next_cursor']
+    )
+    
+    # Test 11: Sketch-based insights for a pincode
+    results['insights'] = test_endpoint(
+        "Pincode Insights (400001)",
+        f"{BASE_URL}/api/insights/400001?days=7",
+        expected_keys=['top_medicines', 'distinct_customers', 'age_bands']
+    )
+    
+    # Test 12: Ingest queue and idempotency-filter metrics
+    results['metrics'] = test_endpoint(
+        "Ingest Metrics",
+        f"{BASE_URL}/api/metrics",
+        expected_keys=['ingest', 'idempotency']
     )
     
     # Summary
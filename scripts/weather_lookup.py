@@ -0,0 +1,120 @@
+"""
+Weather Lookup
+Dense [pincode code, day, metric] array of daily weather, forward-filled so
+a lookup returns the latest observation on or before the requested day
+(as-of). Built once by 03_feature_engineering.py; the batch feature join
+and live scoring both resolve (pincode_id, date) by index arithmetic.
+
+Row len(pincodes) holds the per-day mean over all pincodes and serves
+pincodes without their own weather. Observations older than MAX_STALE_DAYS
+(e.g. live traffic past the end of the data) fall back to that pincode's
+climatology for the day of year, so nothing silently becomes 0°C.
+"""
+
+import json
+import os
+import warnings
+from datetime import date, datetime
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = Path(__file__).parent.parent
+LOOKUP_PATH = BASE_DIR / "datasets" / "final" / "weather_lookup.npz"
+
+METRICS = ['temperature', 'humidity', 'rainfall']
+MAX_STALE_DAYS = int(os.getenv("WEATHER_MAX_STALE_DAYS", 7))
+
+def _forward_fill(values: np.ndarray) -> tuple:
+    """Forward-fill NaNs along axis 1; also returns the index of the day each value came from"""
+    observed = ~np.isnan(values)
+    days = np.arange(values.shape[1])[None, :, None]
+    source = np.maximum.accumulate(np.where(observed, days, -1), axis=1)
+    filled = np.take_along_axis(values, np.maximum(source, 0), axis=1)
+    filled[source < 0] = np.nan
+    return filled, source
+
+def _utc_naive(dates) -> pd.DatetimeIndex:
+    """Naive timestamps as-is, aware ones converted to UTC first (as rollup_cube.epoch_seconds)"""
+    values = np.asarray(dates)
+    if values.dtype == object:
+        # JSON ingest hands over datetimes with whatever offset the client sent, possibly mixed
+        values = [t.tz_convert(None) if t.tzinfo is not None else t for t in map(pd.Timestamp, values)]
+    when = pd.DatetimeIndex(values)
+    return when.tz_convert(None) if when.tz is not None else when
+
+class WeatherLookup:
+    def __init__(self, start: date, values: np.ndarray, source: np.ndarray, climatology: np.ndarray):
+        self.start = start
+        self.values = values            # [pincodes + 1, days, metrics], forward-filled
+        self.source = source            # day index each filled value was observed on, -1 if none yet
+        self.climatology = climatology  # [pincodes + 1, 366, metrics], mean per day of year
+        self.n_pincodes = values.shape[0] - 1
+
+    @classmethod
+    def build(cls, weather: pd.DataFrame) -> "WeatherLookup":
+        """weather: date, pincode_id and METRICS columns, one row per observed pincode-day"""
+        dates = pd.to_datetime(weather['date']).dt.normalize()
+        start = dates.min().date()
+        n_days = (dates.max().date() - start).days + 1
+        codes = weather['pincode_id'].to_numpy(dtype=np.int64)
+        n_pincodes = int(codes.max()) + 1 if len(codes) else 0
+
+        raw = np.full((n_pincodes + 1, n_days, len(METRICS)), np.nan, dtype=np.float64)
+        day = (dates - pd.Timestamp(start)).dt.days.to_numpy()
+        raw[codes, day] = weather[METRICS].to_numpy(dtype=np.float64)
+
+        # Day-of-year climatology; days of year never observed take the overall mean
+        doy = pd.date_range(start, periods=n_days, freq='D').dayofyear.to_numpy() - 1
+        climatology = np.full((n_pincodes + 1, 366, len(METRICS)), np.nan, dtype=np.float64)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN slices stay NaN
+            raw[n_pincodes] = np.nanmean(raw[:n_pincodes], axis=0)
+            for d in np.unique(doy):
+                climatology[:, d] = np.nanmean(raw[:, doy == d], axis=1)
+            overall = np.nanmean(raw, axis=1, keepdims=True)
+        climatology = np.where(np.isnan(climatology), overall, climatology)
+
+        values, source = _forward_fill(raw)
+        return cls(start, values, source.astype(np.int32), climatology)
+
+    def save(self, path: Path = LOOKUP_PATH):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(path.stem + ".tmp.npz")
+        np.savez(tmp, values=self.values, source=self.source, climatology=self.climatology,
+                 meta=np.array(json.dumps({'start': self.start.isoformat(), 'metrics': METRICS})))
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path: Path = LOOKUP_PATH) -> Optional["WeatherLookup"]:
+        if not path.exists():
+            return None
+        with np.load(path) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(date.fromisoformat(meta['start']), data['values'], data['source'], data['climatology'])
+
+    def lookup(self, pincode_ids, dates) -> np.ndarray:
+        """[n, METRICS] as-of weather for parallel arrays of pincode codes and dates"""
+        codes = np.asarray(pincode_ids, dtype=np.int64)
+        rows = np.where((codes >= 0) & (codes < self.n_pincodes), codes, self.n_pincodes)
+        when = _utc_naive(dates).normalize()
+        day = (when - pd.Timestamp(self.start)).days.to_numpy()
+        clipped = np.clip(day, 0, self.values.shape[1] - 1)
+
+        # A pincode with no observation yet on that day uses the all-pincode row
+        observed = self.source[rows, clipped, 0] >= 0
+        rows = np.where(observed, rows, self.n_pincodes)
+        out = self.values[rows, clipped]
+        age = day - self.source[rows, clipped, 0]
+
+        stale = (day < 0) | (age > MAX_STALE_DAYS) | np.isnan(out).any(axis=1)
+        if stale.any():
+            doy = when.dayofyear.to_numpy()[stale] - 1
+            out[stale] = self.climatology[rows[stale], doy]
+        return out
+
+    def value(self, pincode_id: int, when: datetime) -> dict:
+        """Scalar lookup for one live transaction"""
+        return dict(zip(METRICS, self.lookup([pincode_id], [when])[0].tolist()))
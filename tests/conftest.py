@@ -0,0 +1,30 @@
+"""
+Shared fixtures. The pipeline scripts import each other as top-level modules
+(see scripts/main.py), so the tests put scripts/ on the path the same way.
+"""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).parent.parent / "scripts"))
+
+@pytest.fixture
+def api(tmp_path, monkeypatch):
+    """TestClient on the API with its SQLite stores, rollups and filters private to the test"""
+    from fastapi.testclient import TestClient
+
+    import main
+    from anomaly_store import AnomalyStore
+    from idempotency import KeyStore, RotatingBloom
+    from rollup_cube import RollupCube
+    from sketches import SketchStore
+
+    monkeypatch.setattr(main, "AnomalyStore", lambda: AnomalyStore(tmp_path / "anomalies.db"))
+    monkeypatch.setattr(main, "KeyStore", lambda: KeyStore(tmp_path / "idempotency.db"))
+    monkeypatch.setattr(main, "idempotency_filter", RotatingBloom())
+    monkeypatch.setattr(main, "rollup", RollupCube())
+    monkeypatch.setattr(main, "sketches", SketchStore())
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from admission import AdmissionController
+
+def test_failed_item_does_not_fail_its_batch():
+    def handler(items):
+        return [ValueError(f"bad {item}") if item < 0 else item * 2 for item in items]
+
+    async def run():
+        gate = AdmissionController("test", handler, max_batch=8)
+        gate.start()
+        try:
+            return await asyncio.gather(*(gate.submit(i) for i in (1, -1, 3)), return_exceptions=True), gate
+        finally:
+            gate.stop()
+
+    (first, bad, last), gate = asyncio.run(run())
+    assert (first, last) == (2, 6)
+    assert isinstance(bad, ValueError)
+    assert (gate.completed, gate.failed) == (2, 1)
+
+def test_unscorable_row_is_isolated_from_the_rest(api):
+    import main
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(minutes=1)
+    def item(pincode, key):
+        txn = main.Transaction(timestamp=now, pincode=str(pincode), medicine_name="Paracetamol 500mg",
+                               category="fever", quantity=1)
+        return txn, pincode, f"txn_{key}", key, False
+
+    # Past the API's checks (as a bug elsewhere might let it be), the overflow stays with its row
+    bad, good = main.score_transactions([item(99999999999, "bad"), item(400001, "good")])
+    assert isinstance(bad, ValueError)
+    assert good["transaction_id"] == "txn_good" and not good["duplicate"]
+    assert main.pincode_state.get(400001)["transactions"] >= 1
+    # Its key was given back, the good one is kept
+    assert main.key_store.get("bad") is None and main.key_store.get("good") == "txn_good"
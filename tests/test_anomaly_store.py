@@ -0,0 +1,39 @@
+import pytest
+
+from anomaly_store import AnomalyStore
+
+TS = 1_767_225_600  # 2026-01-01
+
+@pytest.fixture
+def store(tmp_path):
+    anomalies = AnomalyStore(tmp_path / "anomalies.db")
+    yield anomalies
+    anomalies.close()
+
+def row(ts: int, pincode: int = 400001, severity: str = 'yellow') -> tuple:
+    return ts, pincode, severity, -0.6, 10.0, 4.0, 'live'
+
+def pages(store: AnomalyStore, **filters) -> list:
+    seen, cursor = [], None
+    while True:
+        items, cursor = store.page(cursor=cursor, **filters)
+        seen.append([item['id'] for item in items])
+        if cursor is None:
+            return seen
+
+def test_cursor_pages_through_equal_timestamps(store):
+    # Seven alerts in the same second straddle page boundaries
+    store.add([row(TS + 60), *(row(TS, pincode=400001 + i % 2) for i in range(7)), row(TS - 60)])
+    everything, _ = store.page(limit=100)
+    assert [item['ts'] for item in everything] == [TS + 60, *[TS] * 7, TS - 60]
+
+    by_page = pages(store, limit=3)
+    assert [len(p) for p in by_page] == [3, 3, 3]
+    assert [i for p in by_page for i in p] == [item['id'] for item in everything]
+
+    # Filters compose with the cursor
+    same_pincode = [i for p in pages(store, limit=2, pincode=400002) for i in p]
+    assert same_pincode == [item['id'] for item in everything if item['pincode'] == 400002]
+
+def test_api_rejects_a_malformed_cursor(api):
+    assert api.get("/api/anomalies", params={"cursor": "not-a-cursor"}).status_code == 400
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from columnar_ingest import ARROW_MEDIA_TYPE, write_batch
+
+ROWS = pd.DataFrame({'timestamp': pd.to_datetime(["2026-01-03T10:00:00", "2026-01-03T11:00:00"]),
+                     'pincode': [400001, 400002], 'medicine_name': "Paracetamol 500mg",
+                     'category': "fever", 'quantity': [1, 2]})
+
+def post(api, frame, **headers):
+    return api.post("/api/transactions/arrow", content=write_batch(frame),
+                    headers={"content-type": ARROW_MEDIA_TYPE, **headers})
+
+def test_empty_batch_is_received(api):
+    response = post(api, ROWS.iloc[:0])
+    assert response.status_code == 200, response.text
+    assert response.json()["status"] == "received"
+    assert response.json()["rows"] == 0
+    assert post(api, ROWS).json()["rows"] == 2
+
+def test_bad_pincodes_and_future_rows_are_rejected(api):
+    bad = ROWS.assign(pincode=[400001, 99999999999], timestamp=pd.to_datetime(["2026-01-03", "2099-01-01"]))
+    response = post(api, bad)
+    assert response.status_code == 422
+    assert {error['column'] for error in response.json()['detail']} == {'pincode', 'timestamp'}
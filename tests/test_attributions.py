@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest, RandomForestClassifier
+
+from attributions import CompiledForest
+
+rng = np.random.RandomState(0)
+X = rng.normal(size=(400, 5))
+X[:10] += 6  # a few clear outliers
+
+@pytest.mark.parametrize("max_features", [1.0, 0.6])
+def test_isolation_forest_matches_score_samples(max_features):
+    model = IsolationForest(n_estimators=50, max_samples=128, max_features=max_features, random_state=0).fit(X)
+    forest = CompiledForest.from_isolation_forest(model)
+    outputs, contributions = forest.explain(X)
+
+    np.testing.assert_allclose(outputs, forest.bias + contributions.sum(axis=1))
+    np.testing.assert_allclose(forest.anomaly_scores(outputs, model.max_samples_), model.score_samples(X),
+                               rtol=0, atol=1e-12)
+
+def test_classifier_matches_predict_proba():
+    y = (X[:, 0] + X[:, 1] > 0.5).astype(int)
+    model = RandomForestClassifier(n_estimators=30, max_depth=6, random_state=0).fit(X, y)
+    outputs, contributions = CompiledForest.from_classifier(model).explain(X)
+
+    np.testing.assert_allclose(outputs, model.predict_proba(X)[:, 1], rtol=0, atol=1e-12)
+    # Most of the credit for the outbreak class goes to the features that define it
+    assert set(np.abs(contributions).mean(axis=0).argsort()[-2:]) == {0, 1}
@@ -0,0 +1,34 @@
+import pandas as pd
+
+from codebook import UNKNOWN, CodeBook, decode_columns, encode_columns, load_codebooks, save_codebooks
+
+def test_codes_round_trip_through_disk(tmp_path):
+    book = CodeBook("pincode", directory=tmp_path)
+    codes = book.encode(["400001", "400002", " 400001 "], add=True)
+    assert codes.tolist() == [0, 1, 0]
+    book.save()
+
+    # Appending after a reload keeps earlier codes; CSV-read ints match their strings
+    reloaded = CodeBook.load("pincode", tmp_path)
+    assert reloaded.encode([400002, 400003], add=True).tolist() == [1, 2]
+    assert reloaded.code(400001) == reloaded.code("400001") == 0
+    assert reloaded.decode([2, 0]).tolist() == ["400003", "400001"]
+
+def test_unknown_values_and_codes(tmp_path):
+    book = CodeBook("category", ["fever", "cough"], directory=tmp_path)
+    assert book.encode(["cough", "rash"]).tolist() == [1, UNKNOWN]
+    assert book.code("rash") == UNKNOWN
+    assert len(book) == 2  # lookups without add never grow the book
+    assert book.decode([UNKNOWN, 0]).tolist() == [None, "fever"]
+    assert book.value(UNKNOWN) is None and book.value(2) is None
+
+def test_frame_columns_round_trip(tmp_path):
+    books = load_codebooks(tmp_path)
+    df = pd.DataFrame({'pincode': [400001, 400002], 'medicine_name': ["Paracetamol 650", "Dolo"],
+                       'category': ["fever", "fever"], 'quantity': [1, 2]})
+    encoded = encode_columns(df.copy(), books, add=True)
+    assert list(encoded.columns) == ['pincode_id', 'medicine_id', 'category_id', 'quantity']
+    save_codebooks(books)
+
+    decoded = decode_columns(encoded, load_codebooks(tmp_path))
+    assert decoded.assign(pincode=decoded['pincode'].astype(int)).equals(df)
@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from covid_cube import CovidCube
+from stages import load_stage
+
+builder = load_stage("10_build_covid_cube")
+
+@pytest.fixture
+def cube(tmp_path, monkeypatch):
+    raw = tmp_path / "raw"
+    raw.mkdir()
+    pd.DataFrame({'Date': ["2020-06-10", "2020-06-10", "2020-06-11", "2020-06-11", "2020-06-11"],
+                  'State/UnionTerritory': ["Dadra and Nagar Haveli", "Daman & Diu",
+                                           "Dadra and Nagar Haveli and Daman and Diu", "Karnataka", "Karanataka"],
+                  'Confirmed': [20, 2, 26, 100, 90], 'Cured': 0, 'Deaths': 0}).to_csv(raw / "covid_india.csv", index=False)
+    pd.DataFrame({'Date': ["2020-06-10"], 'State': ["Karnataka"], 'TotalSamples': [1000], 'Negative': [900],
+                  'Positive': [100]}).to_csv(raw / "covid_testing.csv", index=False)
+    doses = {'Total Doses Administered': [50, 70, 200], 'First Dose Administered': 0,
+             'Second Dose Administered': 0, 'Sessions': 0, 'Sites': 0, 'Total Individuals Vaccinated': 0}
+    pd.DataFrame({'Updated On': "11/06/2020", 'State': ["Karnataka", "Dadra and Nagar Haveli and Daman and Diu",
+                                                         "India"], **doses}).to_csv(raw / "covid_vaccine.csv", index=False)
+    monkeypatch.setattr(builder, "RAW_DIR", raw)
+    monkeypatch.setattr(builder, "CUBE_DIR", tmp_path / "cube")
+    builder.build_cube()
+    return CovidCube.open(tmp_path / "cube")
+
+def test_national_rows_stay_off_the_state_axis(cube):
+    assert "India" not in cube.states
+    # Any sum over states counts each dose once; the national total is its own series
+    assert cube.data[-1, :, cube.metric_index('total_doses')].sum() == 120
+    assert cube.value("2020-06-11", "India", 'total_doses') == 200
+    assert cube.state_name("India") == "India"
+
+def test_merged_territories_add_up_and_respellings_do_not(cube):
+    assert cube.states == ["Dadra and Nagar Haveli and Daman and Diu", "Karnataka"]
+    assert cube.series("Daman & Diu", 'confirmed').tolist() == [22, 26]
+    assert cube.value("2020-06-11", "Karnataka", 'confirmed') == 100
@@ -0,0 +1,49 @@
+import pandas as pd
+import pytest
+
+import data_quality
+from data_quality import InRange, Member, MaxNullRate, Required, Stage, Typed
+
+HEADER = "date,pincode,temperature\n"
+
+@pytest.fixture
+def paths(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_quality, "QUARANTINE_DIR", tmp_path / "quarantine")
+    output = tmp_path / "out.csv"
+    output.write_text("previous\n")
+    return tmp_path / "raw.csv", output
+
+def weather_stage(source, output, dataset_rules=None) -> Stage:
+    return Stage("weather", source, output, columns=['date', 'pincode', 'temperature'],
+                 rules=[Required('date', 'pincode'),
+                        Typed('pincode', 'numeric'),
+                        InRange('temperature', 15, 45),
+                        Member('pincode', lambda: [400001, 400002], 'directory')],
+                 dataset_rules=dataset_rules)
+
+def test_malformed_cells_are_quarantined(paths):
+    source, output = paths
+    source.write_text(HEADER + "2022-01-01,400001,25.5\n2022-01-02,400001, 32C\n"
+                               "2022-01-03,40000x,22.0\n2022-01-04,400002,30.0\n")
+    report = weather_stage(source, output).run()
+
+    assert (report['kept'], report['quarantined'], report['promoted']) == (2, 2, True)
+    assert pd.read_csv(output)['temperature'].tolist() == [25.5, 30.0]
+    rejected = pd.read_csv(data_quality.QUARANTINE_DIR / "weather.csv", dtype=str)
+    assert rejected['failed_rules'].tolist() == ["range:temperature", "type:pincode:numeric"]
+
+def test_failed_dataset_rule_keeps_previous_output(paths):
+    source, output = paths
+    source.write_text(HEADER + "2022-01-01,400001,\n2022-01-02,400001,25.0\n")
+    report = weather_stage(source, output, [MaxNullRate('temperature', 0.1)]).run()
+
+    assert not report['passed'] and not report['promoted']
+    assert output.read_text() == "previous\n"
+
+def test_nothing_kept_is_not_promoted(paths):
+    source, output = paths
+    source.write_text(HEADER + "2022-01-01,999999,25.0\n")
+    report = weather_stage(source, output).run()
+
+    assert (report['kept'], report['promoted']) == (0, False)
+    assert output.read_text() == "previous\n"
@@ -0,0 +1,20 @@
+import time
+
+import pandas as pd
+
+from stages import load_stage
+
+train_models = load_stage("07_train_models")
+
+def frame(n: int) -> pd.DataFrame:
+    return pd.DataFrame({c: range(n) for c in train_models.FEATURE_COLUMNS + ['purchase_spike']})
+
+def test_cache_keeps_only_the_most_recently_used_entries(tmp_path):
+    first = train_models.build_feature_matrix(frame(3), tmp_path, keep=2)
+    for n in (4, 3, 5):  # n=3 is a hit, which keeps it ahead of n=4 for eviction
+        time.sleep(0.01)  # coarse filesystem clocks
+        paths = train_models.build_feature_matrix(frame(n), tmp_path, keep=2)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == sorted(p.name for p in first + paths)
+    X, y = train_models.load_feature_matrix(*first)
+    assert X.shape == (3, len(train_models.FEATURE_COLUMNS)) and y.tolist() == [0, 1, 2]
@@ -0,0 +1,81 @@
+from idempotency import KeyStore, RotatingBloom
+
+TRANSACTION = {"timestamp": "2026-01-03T10:00:00", "pincode": "400001", "medicine_name": "Paracetamol 500mg",
+               "category": "fever", "quantity": 2}
+
+def test_release_only_drops_the_matching_claim(tmp_path):
+    store = KeyStore(tmp_path / "keys.db")
+    assert store.claim([("a", "txn_a"), ("b", "txn_b")]) == [None, None]
+    store.release([("a", "txn_a"), ("b", "txn_other")])
+    assert store.get("a") is None
+    assert store.get("b") == "txn_b"
+    assert store.claim([("a", "txn_a")]) == [None]
+
+def test_retry_after_failed_scoring_is_scored(api, monkeypatch):
+    import main
+
+    detect, calls = main.detect_anomalies, []
+    def flaky(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("scoring failed")
+        return detect(batch)
+    monkeypatch.setattr(main, "detect_anomalies", flaky)
+
+    headers = {"Idempotency-Key": "gateway-42"}
+    assert api.post("/api/transactions", json=TRANSACTION, headers=headers).status_code == 500
+    retry = api.post("/api/transactions", json=TRANSACTION, headers=headers)
+    assert retry.status_code == 200
+    assert retry.json()["status"] == "received"
+    assert api.post("/api/transactions", json=TRANSACTION, headers=headers).json()["status"] == "duplicate"
+    assert len(calls) == 2
+
+def test_retry_after_failure_past_the_counters_is_a_duplicate(api, monkeypatch):
+    import main
+
+    counted, calls = main.score_counted, []
+    def flaky(*args):
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError("anomaly store down")
+        return counted(*args)
+    monkeypatch.setattr(main, "score_counted", flaky)
+
+    headers = {"Idempotency-Key": "gateway-43"}
+    before = (main.pincode_state.get(400001) or {}).get("transactions", 0)
+    assert api.post("/api/transactions", json=TRANSACTION, headers=headers).status_code == 500
+    retry = api.post("/api/transactions", json=TRANSACTION, headers=headers)
+    assert retry.json()["status"] == "duplicate"
+    # Counted once, by the attempt that failed afterwards
+    assert main.pincode_state.get(400001)["transactions"] == before + 1
+
+def test_bloom_misses_skip_the_exact_claim(api, monkeypatch):
+    import main
+    from pincode_state import SHM_ENV
+
+    monkeypatch.delenv(SHM_ENV, raising=False)
+    claims = []
+    claim = main.key_store.claim
+    monkeypatch.setattr(main.key_store, "claim", lambda rows: claims.append(rows) or claim(rows))
+
+    for n in range(3):
+        response = api.post("/api/transactions", json=TRANSACTION, headers={"Idempotency-Key": f"new-{n}"})
+        assert response.json()["status"] == "received"
+    assert claims == []
+    # Recorded keys are found before and after they are written
+    assert main.key_store.get("new-0") == "txn_new-0"
+    main.key_store.flush()
+    assert main.key_store.metrics()["pending_keys"] == 0
+    assert main.key_store.get("new-0") == "txn_new-0"
+    assert api.post("/api/transactions", json=TRANSACTION,
+                    headers={"Idempotency-Key": "new-0"}).json()["status"] == "duplicate"
+
+def test_filter_is_warmed_from_the_store(tmp_path):
+    store = KeyStore(tmp_path / "keys.db")
+    store.record([("before-restart", "txn_1")])
+    store.close()
+
+    bloom = RotatingBloom(memory_mb=0.01)
+    bloom.warm(KeyStore(tmp_path / "keys.db").keys())
+    assert bloom.check_and_add("before-restart")
+    assert not bloom.check_and_add("never-seen")
@@ -0,0 +1,58 @@
+import threading
+import time
+
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import IsolationForest
+from sklearn.preprocessing import StandardScaler
+
+from model_registry import DETECTOR_FEATURES, ModelRegistry, current_version, publish_version
+
+X = pd.DataFrame(np.random.RandomState(0).rand(64, 5), columns=DETECTOR_FEATURES)
+
+def artifacts(n_estimators: int) -> dict:
+    return {'anomaly_detector': IsolationForest(n_estimators=n_estimators, random_state=0).fit(X.to_numpy()),
+            'scaler': StandardScaler().fit(X)}
+
+def test_hot_swap_under_concurrent_reads(tmp_path):
+    for name, obj in artifacts(3).items():  # baseline files from 07_train_models.py
+        joblib.dump(obj, tmp_path / f"{name}.pkl")
+    registry = ModelRegistry(tmp_path)
+    assert registry.reload()
+    assert registry.active.version == "baseline"
+
+    published, seen, errors = [], [], []
+    done = threading.Event()
+
+    def read():
+        last = None
+        while not done.is_set():
+            bundle = registry.active
+            try:
+                # A request's bundle is one whole version, and versions only move forward
+                assert bundle.models['anomaly_detector'].n_estimators == bundle.metrics.get('n_estimators', 3)
+                assert last is None or seen.index(bundle.version) >= seen.index(last)
+            except Exception as e:
+                errors.append(e)
+                return
+            last = bundle.version
+            time.sleep(0.001)
+
+    readers = [threading.Thread(target=read) for _ in range(4)]
+    seen.append("baseline")
+    for t in readers:
+        t.start()
+    for n in range(4, 9):
+        version = publish_version(artifacts(n), {'n_estimators': n}, tmp_path)
+        seen.append(version)
+        published.append(version)
+        assert registry.reload()
+    done.set()
+    for t in readers:
+        t.join()
+
+    assert not errors, errors[0]
+    assert registry.active.version == current_version(tmp_path) == published[-1]
+    assert registry.previous.version == published[-2]
+    assert not registry.reload()  # CURRENT unchanged
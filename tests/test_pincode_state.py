@@ -0,0 +1,46 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from pincode_state import PincodeState
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+@pytest.fixture
+def state():
+    shared = PincodeState.create(capacity=256, stripes=4)
+    yield shared
+    shared.close()
+
+def test_future_timestamp_leaves_the_day_alone(state):
+    today = utcnow()
+    state.record_transaction(400001, 1, today, parents=(-1,))
+    with pytest.raises(ValueError):
+        state.record_transaction(400001, 1, datetime(2099, 1, 1), parents=(-1,))
+    with pytest.raises(ValueError):
+        state.record_batch(np.array([400001]), np.array([1]), np.array(['2099-01-01'], dtype='datetime64[us]'),
+                           {400001: (-1,)})
+
+    assert state.record_transaction(400001, 1, today, parents=(-1,))['transaction_count'] == 2
+    assert state.get(400001)['transactions'] == state.get(-1)['transactions'] == 2
+
+def test_older_day_does_not_touch_the_current_count(state):
+    today = utcnow()
+    state.record_transaction(400001, 1, today)
+    assert state.record_transaction(400001, 1, today - timedelta(days=3))['transaction_count'] == 1
+    assert state.record_transaction(400001, 1, today)['transaction_count'] == 2
+    assert state.get(400001)['transactions'] == 3
+
+def test_keys_that_dont_fit_a_slot_are_refused(state):
+    with pytest.raises(ValueError):
+        state.record_transaction(99999999999, 1, utcnow())
+    assert len(state) == 0
+
+@pytest.mark.parametrize("body", [{"pincode": "99999999999"}, {"pincode": "4000"},
+                                  {"timestamp": "2099-01-01T00:00:00"}])
+def test_api_rejects_bad_pincodes_and_future_timestamps(api, body):
+    transaction = {"timestamp": utcnow().isoformat(), "pincode": "400001",
+                   "medicine_name": "Paracetamol 500mg", "category": "fever", "quantity": 1}
+    assert api.post("/api/transactions", json={**transaction, **body}).status_code == 422
@@ -0,0 +1,44 @@
+from datetime import datetime, timezone
+
+import pandas as pd
+
+from regions import UNMAPPED, RegionIndex
+
+DIRECTORY = pd.DataFrame({'pincode': [400001, 400002, 400050, 400601],
+                          'office': ["Mumbai GPO", "Kalbadevi", "Bandra West", "Thane West"],
+                          'district': ["Mumbai City", "Mumbai City", "Mumbai Suburban", "Thane"],
+                          'state': "Maharashtra"})
+CENSUS = pd.DataFrame({'district': ["Mumbai City", "Mumbai Suburban", "Thane"],
+                       'population': [3_000_000, 9_000_000, 11_000_000]})
+
+def test_pincodes_roll_up_to_their_district_and_state():
+    index = RegionIndex(DIRECTORY, CENSUS)
+    city, state = index.parent_keys(400001)
+    assert index.parent_keys(400002) == (city, state)
+    assert index.parent_keys(400601)[1] == state != index.parent_keys(400601)[0]
+    assert index.describe(city)['region'] == "Mumbai City" and index.describe(city)['parent'] == "Maharashtra"
+    assert index.describe(state)['population'] == 23_000_000
+
+    # Unlisted pincodes land in the Unmapped district of their postal circle's state
+    unlisted = index.parent_keys(400099)
+    assert index.describe(unlisted[0])['region'] == UNMAPPED and unlisted[1] == state
+    assert index.describe(index.parent_keys(110001)[1])['region'] == UNMAPPED
+
+def test_heatmap_region_totals_add_up(api):
+    now = datetime.now(timezone.utc).replace(tzinfo=None).isoformat()
+    sent = {"400001": 2, "400002": 1, "400050": 1, "400601": 3, "400099": 1}
+    for pincode, n in sent.items():
+        for _ in range(n):
+            response = api.post("/api/transactions", json={
+                "timestamp": now, "pincode": pincode, "medicine_name": "Paracetamol 500mg",
+                "category": "fever", "quantity": 2})
+            assert response.status_code == 200, response.text
+
+    districts = {a['region']: a for a in api.get("/api/heatmap", params={"level": "district"}).json()['alerts']}
+    assert {name: a['total_transactions'] for name, a in districts.items()} == {
+        "Mumbai City": 3, "Mumbai Suburban": 1, "Thane": 3, UNMAPPED: 1}
+    assert all(a['today_transactions'] == a['total_transactions'] for a in districts.values())
+
+    states = api.get("/api/heatmap", params={"level": "state"}).json()['alerts']
+    assert [(a['region'], a['total_transactions']) for a in states] == [("Maharashtra", sum(sent.values()))]
+    assert states[0]['anomaly_count'] == sum(a['anomaly_count'] for a in districts.values())
@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from rollup_cube import RollupCube, RollupFull, _Level
+
+def frame(timestamps, pincode_id=0, category_id=0) -> pd.DataFrame:
+    return pd.DataFrame({'timestamp': pd.to_datetime(timestamps), 'pincode_id': pincode_id,
+                         'category_id': category_id, 'quantity': 1})
+
+def test_old_timestamp_does_not_grow_the_cube():
+    cube = RollupCube()
+    cube.add_frame(frame(pd.date_range("2026-01-01", periods=48, freq="h")))
+    rows = cube.levels['hour'].data.shape[0]
+
+    assert not cube.add(datetime(1995, 1, 5), 0, 0, 1)
+    assert cube.levels['hour'].data.shape[0] == rows
+    assert cube.dropped == {'hour': 1, 'day': 1, 'week': 1}
+
+def test_window_slides_instead_of_growing():
+    cube = RollupCube(retention_days={'hour': 2})
+    start = datetime(2026, 1, 1)
+    for hour in range(24 * 10):
+        cube.add(start + timedelta(hours=hour), 0, 0, 1)
+
+    hour = cube.levels['hour']
+    assert hour.data.shape[0] <= 2 * hour.retention
+    end = start + timedelta(hours=24 * 10 - 1)
+    _, recent = cube.query('hour', end - timedelta(hours=47), end)
+    assert recent[:, 0].tolist() == [1] * 48
+    # Days keep their longer history
+    _, days = cube.query('day', start, end)
+    assert days[:, 0].tolist() == [24] * 10
+
+def test_far_future_timestamp_is_refused():
+    cube = RollupCube()
+    assert not cube.add(datetime.now() + timedelta(days=30), 0, 0, 1)
+    assert cube.latest is None
+    cube.add_frame(frame([datetime.now() + timedelta(days=30), "2026-01-01"]))
+    assert cube.latest == datetime(2026, 1, 1)
+
+def test_new_codes_past_the_byte_budget_are_dropped_not_raised():
+    cube = RollupCube(max_level_bytes=64 * 2 ** 10)
+    cube.add(datetime(2026, 1, 1), 0, 0, 1)
+    assert not cube.add(datetime(2026, 1, 1), 5000, 0, 1)
+    assert cube.dropped['hour'] == 1
+
+    level = _Level(3600, 0, 1, max_bytes=1024)
+    try:
+        level.add_one(0, 100, 100, (1, 1))
+    except RollupFull:
+        pass
+    else:
+        raise AssertionError("expected RollupFull")
+    assert level.data.size == 0
+
+def test_out_of_range_timestamp_and_new_categories_over_http(api, monkeypatch):
+    import main
+
+    hour_rows = main.rollup.levels['hour'].data.shape[0]
+    response = api.post("/api/transactions", json={
+        'timestamp': "1995-01-05T10:00:00", 'pincode': "400001", 'medicine_name': "Paracetamol 500mg",
+        'category': "fever", 'quantity': 1})
+    assert response.status_code == 200
+    assert main.rollup.levels['hour'].data.shape[0] == hour_rows
+
+    book = main.codebooks['category']
+    monkeypatch.setattr(main, "TREND_MAX_CATEGORIES", len(book) + 1)
+    for name in ["novel-1", "novel-2", "novel-3"]:
+        response = api.post("/api/transactions", json={
+            'timestamp': "2026-01-15T10:00:00", 'pincode': "400001", 'medicine_name': "X",
+            'category': name, 'quantity': 1})
+        assert response.status_code == 200
+    assert book.code("novel-1") >= 0
+    assert book.code("novel-2") < 0 and book.code("novel-3") < 0
+    _, other = main.rollup.query('day', datetime(2026, 1, 15), datetime(2026, 1, 15),
+                                 category_id=book.code(main.OTHER_CATEGORY))
+    assert other[0, 0] == 2
+    assert api.get("/api/metrics").json()['rollup']['hour']['dropped'] >= 1
+
+def test_trend_days_are_validated_and_clamped(api):
+    import main
+
+    main.rollup.add(datetime.now() - timedelta(hours=1), 0, 0, 1)
+    assert api.get("/api/trends", params={"days": 99_999_999}).status_code == 422
+    assert api.get("/api/trends", params={"days": 0}).status_code == 422
+    response = api.get("/api/trends", params={"days": 3000, "granularity": "hour"})
+    assert response.status_code == 200
+    assert response.json()["days"] == main.rollup.retention_days['hour']
+    assert response.json()["total_points"] <= main.rollup.levels['hour'].retention
+
+def test_trends_are_capped_without_max_points(api):
+    import main
+
+    start = datetime.now() - timedelta(days=80)
+    main.rollup.add_frame(frame(pd.date_range(start, periods=80 * 24, freq="h")))
+
+    response = api.get("/api/trends", params={"days": 80, "granularity": "hour"}).json()
+    assert response["total_points"] > main.TREND_DEFAULT_POINTS
+    assert len(response["data"]) == main.TREND_DEFAULT_POINTS
+    assert api.get("/api/trends", params={"max_points": 10 ** 6}).status_code == 422
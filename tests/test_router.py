@@ -0,0 +1,28 @@
+import asyncio
+
+import router
+from anomaly_store import STATE_DIR_ENV
+from shard_ring import HashRing
+
+def test_pincode_heatmap_drops_demo_rows(monkeypatch):
+    ring = HashRing(["http://a", "http://b"])
+    pincode = next(p for p in range(400001, 400100) if ring.owner(p) == "http://a")
+    demo = {"pincode": "400001", "district": "Mumbai City", "anomaly_count": 15,
+            "total_transactions": 150, "severity": "red"}
+    live = {**demo, "pincode": str(pincode), "anomaly_count": 2}
+
+    async def fan_out(path, params=None):
+        return {"http://a": {"alerts": [live]}, "http://b": {"alerts": [demo], "demo": True}}, []
+    monkeypatch.setattr(router, "ring", ring)
+    monkeypatch.setattr(router, "fan_out", fan_out)
+
+    assert asyncio.run(router.get_heatmap("pincode"))["alerts"] == [live]
+
+def test_spawned_shards_get_their_own_state(monkeypatch):
+    started = []
+    monkeypatch.setattr(router.subprocess, "Popen", lambda args, env: started.append(env))
+    router.spawn_shards(2, "127.0.0.1", 9001)
+
+    dirs = [env[STATE_DIR_ENV] for env in started]
+    assert len(set(dirs)) == 2
+    assert all(dir.endswith(str(port)) for dir, port in zip(dirs, (9001, 9002)))
@@ -0,0 +1,51 @@
+import time
+from datetime import date, timedelta
+
+import sketches
+from sketches import SketchStore, WindowSketch
+
+def test_windows_merge_by_sum_and_max():
+    a, b = WindowSketch(), WindowSketch()
+    for n in range(30):
+        a.add("Paracetamol 500mg", 34, f"customer-{n}")
+    for n in range(20, 40):
+        b.add("Dolo 650", 70, f"customer-{n}")
+    b.add("Paracetamol 500mg", None, None)
+    a.merge(b)
+
+    assert a.transactions == 51
+    assert a.medicines.top(1) == [("Paracetamol 500mg", 31)]
+    assert abs(a.customers.count() - 40) <= 4
+    assert a.ages.sum() == 51
+
+def test_future_day_neither_lands_nor_expires_history():
+    store = SketchStore(retention_days=30)
+    today = date.fromordinal(sketches.today())
+    for back in range(10):
+        store.add(400001, today - timedelta(days=back), "Paracetamol 500mg")
+    store.add(400001, date(2099, 1, 1), "Paracetamol 500mg")
+
+    assert store.dropped == 1
+    _, last, merged = store.merged(400001, 30)
+    assert merged.transactions == 10
+    store.add(400001, today, "Paracetamol 500mg")
+    assert store.merged(None, 30)[2].transactions == 11
+
+def test_days_expire_against_the_clock(monkeypatch):
+    store = SketchStore(retention_days=7)
+    now = sketches.today()
+    store.add(400001, date.fromordinal(now - 10), "Paracetamol 500mg")
+    store.add(400001, date.fromordinal(now - 3), "Paracetamol 500mg")
+    assert store.dropped == 1
+
+    monkeypatch.setattr(sketches, "today", lambda: now + 5)
+    monkeypatch.setattr(sketches, "horizon_day", lambda: now + 6)
+    store.add(400001, date.fromordinal(now + 5), "Paracetamol 500mg")
+    assert list(store.windows[400001]) == [now + 5]
+
+def test_long_window_is_clamped_and_cheap(api):
+    started = time.perf_counter()
+    response = api.get("/api/insights/all", params={"days": 30_000_000})
+    assert response.status_code == 200
+    assert time.perf_counter() - started < 2.0
+    assert api.get("/api/insights/all", params={"days": 0}).status_code == 422
@@ -0,0 +1,63 @@
+import asyncio
+import os
+import random
+
+import pandas as pd
+import pytest
+
+from stages import load_stage
+
+uploader = load_stage("05_upload_to_db")
+
+ROWS = 250
+BATCH = 20
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "transactions.csv"
+    pd.DataFrame({'transaction_id': [f"t{i}" for i in range(ROWS)], 'pincode': "400001",
+                  'category': "fever", 'quantity': 1}).to_csv(path, index=False)
+    return path
+
+def upload(path, server, **kwargs):
+    return asyncio.run(uploader.upload_async(path, 'transactions', server.url, "test", batch_size=BATCH,
+                                             checkpoint_dir=path.parent, **kwargs))
+
+def checkpoint_for(path):
+    return uploader.Checkpoint(path.parent / f"transactions__{path.stem}.json", path)
+
+def test_sequential_and_pipelined_uploads_send_every_row(csv_path):
+    with uploader.StandInRestServer(latency=0) as server:
+        uploader.upload_sequential(csv_path, 'transactions', server.url, "test", batch_size=BATCH)
+        assert len(server.rows) == ROWS
+    for in_flight in (1, 4):
+        with uploader.StandInRestServer(latency=0) as server:
+            stats = upload(csv_path, server, in_flight=in_flight)
+        assert stats['rows'] == ROWS and len(server.rows) == ROWS
+        assert server.requests == -(-ROWS // BATCH)
+
+def test_transient_failures_are_retried_and_replays_upsert(csv_path):
+    random.seed(0)
+    with uploader.StandInRestServer(latency=0, fail_rate=0.2) as server:
+        upload(csv_path, server, resume=False)
+        upload(csv_path, server, resume=False)
+    assert server.failures > 0
+    assert len(server.rows) == ROWS
+
+def test_interrupted_upload_resumes_at_the_checkpoint(csv_path):
+    checkpoint = checkpoint_for(csv_path)
+    checkpoint.commit(0, 5 * BATCH)
+    with uploader.StandInRestServer(latency=0) as server:
+        stats = upload(csv_path, server)
+    assert stats['rows'] == ROWS - 5 * BATCH
+    assert sorted(server.rows, key=lambda t: int(t[1:]))[0] == f"t{5 * BATCH}"
+    assert not checkpoint.path.exists()  # cleared once the upload completes
+
+def test_checkpoint_is_dropped_when_the_source_changes(csv_path):
+    checkpoint = checkpoint_for(csv_path)
+    checkpoint.commit(0, ROWS // 2)
+    stat = csv_path.stat()
+    os.utime(csv_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # regenerated: same rows, new mtime
+    with uploader.StandInRestServer(latency=0) as server:
+        stats = upload(csv_path, server)
+    assert stats['rows'] == ROWS and len(server.rows) == ROWS
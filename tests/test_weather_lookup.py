@@ -0,0 +1,33 @@
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+import pytest
+
+from weather_lookup import WeatherLookup
+
+IST = timezone(timedelta(hours=5, minutes=30))
+
+@pytest.fixture
+def lookup() -> WeatherLookup:
+    days = pd.date_range("2026-01-01", periods=5, freq="D")
+    return WeatherLookup.build(pd.DataFrame({'date': days, 'pincode_id': 0, 'temperature': range(5),
+                                             'humidity': 60.0, 'rainfall': 0.0}))
+
+def test_aware_timestamps_resolve_by_utc_day(lookup):
+    # 01:00 IST on the 3rd is still the 2nd in UTC; mixed offsets and naive values in one batch
+    out = lookup.lookup([0, 0, 0], [datetime(2026, 1, 3, 10, tzinfo=timezone.utc),
+                                    datetime(2026, 1, 3, 1, tzinfo=IST),
+                                    datetime(2026, 1, 3, 1)])
+    assert out[:, 0].tolist() == [2.0, 1.0, 2.0]
+    assert lookup.value(0, datetime(2026, 1, 4, 12, tzinfo=IST))['temperature'] == 3.0
+
+def test_offset_timestamps_are_scored(api, lookup, monkeypatch):
+    import main
+
+    monkeypatch.setattr(main, "weather", lookup)
+    for stamp in ("2026-01-03T10:00:00Z", "2026-01-03T15:30:00+05:30"):
+        response = api.post("/api/transactions", json={
+            "timestamp": stamp, "pincode": "400001", "medicine_name": "Paracetamol 500mg",
+            "category": "fever", "quantity": 2})
+        assert response.status_code == 200, response.text
+        assert response.json()["status"] == "received"